@@ -0,0 +1,255 @@
+"""
+Compare the table driven decoders in hoymiles.decoders, looked up per
+model the way hoymiles.reassembly.Response does, with the former if/elif
+chain of on_receive (reproduced below, decoding part only). Fragments the
+old code could not decode are reported, not timed; the totals cover the
+others.
+
+    $ python3 benchmarks/bench_decoders.py [-n NUMBER]
+"""
+import os
+import sys
+import struct
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hoymiles.decoders import decoders
+
+
+def frame(hexstr):
+    return bytes.fromhex(hexstr)
+
+
+def synth(cmd, data):
+    """ Build a 0x95 fragment for inverter 74608145 around raw data bytes. """
+    p = b'\x95' + bytes.fromhex('74608145') * 2 + bytes([cmd]) + data
+    return p + b'\x00'
+
+
+# taken from example-logs/example.log (HM-600), the others are synthesized
+FRAMES = [
+    ('HM-600', 0x01, frame('95 74 60 81 45 74 60 81 45 01 00 01 01 20 00 22 00 62 01 23 00 29 00 78 00 00 87')),
+    ('HM-600', 0x02, frame('95 74 60 81 45 74 60 81 45 02 32 2f 00 00 37 b6 06 7b 06 7e 09 36 13 87 00 cd 68')),
+    ('HM-600', 0x83, frame('95 74 60 81 45 74 60 81 45 83 00 00 00 05 03 e8 01 0a 00 06 10 35 d0')),
+    ('HM-600', 0x03, synth(0x03, bytes(range(16)))),
+    ('HM-1200', 0x01, synth(0x01, struct.pack('>HHHHHHLH', 1, 288, 34, 41, 98, 120, 12345, 1))),
+    ('HM-1200', 0x02, synth(0x02, struct.pack('>LHHHHHHH', 54321, 200, 210, 291, 34, 41, 99, 0))),
+    ('HM-1200', 0x03, synth(0x03, struct.pack('>HLLHHHH', 119, 2222, 3333, 220, 230, 2351, 0))),
+    ('HM-1200', 0x84, synth(0x84, struct.pack('>HHHHHH', 4998, 425, 0, 181, 354, 311))),
+    ('HM-300', 0x01, synth(0x01, struct.pack('>HHHHLHH', 0, 288, 34, 98, 4567, 120, 2351))),
+    ('HM-300', 0x82, synth(0x82, struct.pack('>HHHHHHHH', 4998, 95, 0, 41, 0, 311, 0, 0))),
+]
+
+
+def legacy_decode(invType, cmd, p):
+    """
+    The decoding branches of on_receive in the last ahoy.py before the
+    decoder table, copied as they were minus the debug output. The values
+    meant to carry over between fragments are locals there (no `global`),
+    so HM-600 0x02 and HM-1200 0x02/0x03 raise, like they did in ahoy.py.
+    """
+    d = {}
+    dd = {}
+    if True:
+        if invType=="HM-1200": # based on lumapu  https://www.mikrocontroller.net/topic/525778?page=single#7038756
+            d["infos"]=[dd]
+
+            if cmd==1:
+                dd['name'] = 'emeter-dc'  # guess voltages are dc like with hm-600 and total power is long
+                uk1, u1, i1, i2, p1, p2, ptotal1, uk8 = struct.unpack('>HHHHHHLH', p[10:28])
+
+                dd['1/voltage'] = u1/10
+                dd['1/current'] = i1/100
+                dd['2/current'] = i2/10
+                dd['1/power'] = p1/10
+                dd['2/power'] = p2/10
+                dd['1/totalenergy'] = ptotal1
+
+                dd['_uk1'] = uk1
+                dd['_uk8'] = uk8
+                _hm1200_ptotal2hb=uk8*65536
+
+            elif cmd==2:
+                dd['name'] = 'emeter-dc'  # guess voltages are dc like with hm-600
+                ptotal2, pday1, pday2, u2, i3, i4, p3, uk8 = struct.unpack('>LHHHHHHH', p[10:28])
+
+                dd['2/voltage'] = u2/10
+                dd['3/current'] = i3/100
+                dd['4/current'] = i4/10
+                _hm1200_i4=i4/10
+                if i4==0:
+                    dd['4/voltage'] = 0
+                    dd['4/power'] = 0
+                elif _hm1200_p4!=0:
+                    dd['4/voltage'] = _hm1200_p4/_hm1200_i4
+
+                dd['3/power'] = p3/10
+                dd['3/voltage'] = (p3/10)/(i3/100)  # hack where is it
+
+                dd['2/totalenergy'] = ptotal2+_hm1200_ptotal2hb
+                dd['1/todaysenergy'] = pday1
+                dd['2/todaysenergy'] = pday2
+
+                dd['_uk8'] = uk8
+
+            elif cmd==3:
+                dd['name'] = 'emeter-dc'  # guess voltages are dc like with hm-600
+                p4, ptotal3, ptotal4, pday3, pday4, u, uk7 = struct.unpack('>HLLHHHH', p[10:28])
+
+                dd['4/power'] = p4/10    # where is voltage channel 2+3, 3 cannot be calculated with single message
+                _hm1200_p4=p4/10
+                if p4==0:
+                    dd['4/voltage'] = 0
+                    dd['4/current'] = 0
+                elif _hm1200_i4!=0:
+                    dd['4/voltage'] = _hm1200_p4/_hm1200_i4
+
+                dd['3/totalenergy'] = ptotal3
+                dd['4/totalenergy'] = ptotal4
+                dd['4/todaysenergy'] = pday3
+                dd['4/todaysenergy'] = pday4
+
+                dd={}
+                d["infos"].append(dd)
+                dd['name'] = 'emeter'
+                dd['0/voltageAC'] = u/10
+
+                dd['_uk7'] = uk7
+
+            elif cmd==132: #0x84
+                freq, p, uk3, i, pctload, t = struct.unpack('>HHHHHH', p[10:22])
+                dd['name'] = 'emeter'
+                dd['0/frequency'] = freq/100
+                dd['0/powerAC'] = p/10
+                dd['0/currentAC'] = i/100
+                dd['0/voltageAC'] = (p/10)/(i/100)
+                dd['0/pctload'] = pctload/10
+                dd['0/temperature'] = t/10
+
+                dd['_uk3'] = uk3
+
+
+        if invType=="HM-600":       # original petersilie ahoy.py with renaming
+            d["infos"]=[dd]
+            if cmd==1:
+                dd['name'] = 'emeter-dc'
+                uk1, u1, i1, p1, u2, i2, p2, uk8 = struct.unpack(
+                    '>HHHHHHHH', p[10:26])
+                dd['1/voltage'] = u1/10
+                dd['1/current'] = i1/100
+                dd['1/power'] = p1/10
+                dd['2/voltage'] = u2/10
+                dd['2/current'] = i2/100
+                dd['2/power'] = p2/10
+                p=p1+p2
+
+                dd={}
+                d["infos"].append(dd)
+                dd['name'] = 'emeter'
+                dd['0/powerAC'] = p
+                dd['_uk1'] = uk1
+                dd['_uk8'] = uk8
+
+                _hm600_ptotal1hb=uk8*65536
+
+            elif cmd==2:
+                dd['name'] = 'emeter'
+                ptotal1, ptotal2, pday1, pday2, u, f, p = struct.unpack(
+                    '>HLHHHHH', p[10:26])
+                dd['0/voltageAC'] = u/10
+                dd['0/frequency'] = f/100
+                dd['0/powerAC'] = p/10
+                dd['0/currentAC'] = i/100
+
+                dd={}
+                d["infos"].append(dd)
+                dd['name'] = 'emeter-dc'
+                dd['1/totalenergy'] = ptotal1+_hm600_ptotal1hb                # just 16 bit?, is info in 2/uknown8 ?
+                dd['2/totalenergy'] = ptotal2
+                dd['1/todaysenergy'] = pday1
+                dd['2/todaysenergy'] = pday2
+
+            elif cmd==3:  # 0x03
+                uk1, uk2, uk3, uk4, uk5, uk6, uk7, uk8 = struct.unpack(
+                    '>HHHHHHHH', p[10:26])
+
+                dd['name'] = 'error3'
+
+                dd['_uk1'] = uk1
+                dd['_uk2'] = uk2
+                dd['_uk3'] = uk3
+                dd['_uk4'] = uk4
+                dd['_uk5'] = uk5
+                dd['_uk6'] = uk6
+                dd['_uk7'] = uk7
+                dd['_uk8'] = uk8
+
+            # 0x04 .. 0x07 and 0x84 like 0x03
+
+            elif cmd==131:  # 0x83
+                dd['name'] = 'emeter'
+                uk1, i, uk3, t, uk5, uk6 = struct.unpack('>HHHHHH', p[10:22])
+                dd['0/currentAC'] = i/100
+                dd['0/temperature'] = t/10
+                dd['_uk1'] = uk1
+                dd['_uk3'] = uk3
+                dd['_uk5'] = uk5
+                dd['_uk6'] = uk6
+
+        elif invType=="HM-300":
+            d["infos"]=[dd]
+            if cmd==1:
+                uk0, u1, i1, p1, ptotal, pday, u  = struct.unpack('>HHHHLHH', p[10:26])
+                dd['name'] = 'emeter-dc'
+                dd['1/voltage'] = u1/10
+                dd['1/current'] = i1/100
+                dd['1/power'] = p1/10
+                dd['1/totalenergy'] = ptotal
+                dd['1/todaysenergy'] = pday
+
+                dd={}
+                d["infos"].append(dd)
+                dd['name'] = 'emeter'
+                dd['0/voltageAC'] = u/10
+
+            # 0x02 .. 0x07 and 0x81: eight unknown words
+
+            elif cmd==130:  # 0x82
+                freq, p, uk0, i, uk1, t,  uk2, uk3  = struct.unpack('>HHHHHHHH', p[10:26])
+
+                dd['name'] = 'emeter'
+                dd['0/frequency'] = freq/100
+                dd['0/powerAC'] = p/10
+                dd['0/currentAC'] = i/100
+                dd['0/temperature'] = t/10
+
+    return d["infos"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='decoder benchmark')
+    parser.add_argument('-n', dest='number', type=int, default=20000, help='iterations per frame')
+    args = parser.parse_args()
+
+    state = {}
+    print(f"{'model':8s} {'cmd':>4s} {'legacy ns':>10s} {'table ns':>10s} {'speedup':>8s}")
+    tot_old = tot_new = 0
+    for model, cmd, p in FRAMES:
+        table = decoders(model)
+        t_new = min(timeit.repeat(lambda: table.get(p[9])(p, state), number=args.number, repeat=3))
+        try:
+            legacy_decode(model, cmd, p)
+        except Exception as e:
+            print(f"{model:8s} 0x{cmd:02x} {type(e).__name__:>10s} {t_new/args.number*1e9:10.0f}")
+            continue
+        t_old = min(timeit.repeat(lambda: legacy_decode(model, cmd, p), number=args.number, repeat=3))
+        tot_old += t_old
+        tot_new += t_new
+        print(f"{model:8s} 0x{cmd:02x} {t_old/args.number*1e9:10.0f} {t_new/args.number*1e9:10.0f} {t_old/t_new:7.2f}x")
+    print(f"{'all':8s} {'':4s} {tot_old/args.number*1e9:10.0f} {tot_new/args.number*1e9:10.0f} {tot_old/tot_new:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
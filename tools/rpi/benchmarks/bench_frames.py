@@ -0,0 +1,109 @@
+"""
+Compare hoymiles.frames.FrameBuilder with the former compose_0x80_msg of
+ahoy.py (reproduced below), for 0x80 requests and refetch frames, and check
+that both build the same bytes.
+
+    $ python3 benchmarks/bench_frames.py [-n NUMBER]
+"""
+import os
+import sys
+import struct
+import timeit
+import argparse
+
+import crcmod
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hoymiles.frames import FrameBuilder, crc16, crc8
+
+f_crc_m = crcmod.predefined.mkPredefinedCrcFun('modbus')
+f_crc8 = crcmod.mkCrcFun(0x101, initCrc=0, xorOut=0)
+
+DTU = '99978563412'
+INVERTERS = ['114174608145', '116111111111', '112122222222']
+
+
+def ser_to_hm_addr(s):
+    bcd = int(str(s)[-8:], base=16)
+    return struct.pack('>L', bcd)
+
+
+def ser_to_esb_addr(s):
+    air_order = ser_to_hm_addr(s)[::-1] + b'\x01'
+    return air_order[::-1]
+
+
+def compose_0x80_msg(dst_ser_no=72220200, src_ser_no=72220200, ts=None, messageType=b'\x80', subtype=b'\x0b', refetch=None):
+    if not ts:
+        ts = 0x623C8ECF
+    p = b''
+    p = p + b'\x15'
+    p = p + ser_to_hm_addr(dst_ser_no)
+    p = p + ser_to_hm_addr(src_ser_no)
+    if refetch is not None:
+        p = p + refetch
+        crc8 = f_crc8(p)
+        p = p + struct.pack('B', crc8)
+        return p
+    p = p + messageType
+    pp = subtype + b'\x00'
+    pp = pp + struct.pack('>L', ts)
+    pp = pp + b'\x00\x00\x00\x05\x00\x00\x00\x00'
+    crc_m = f_crc_m(pp)
+    p = p + pp
+    p = p + struct.pack('>H', crc_m)
+    crc8 = f_crc8(p)
+    p = p + struct.pack('B', crc8)
+    return p
+
+
+def check(builder):
+    for data in (b'', b'\x0b\x00', bytes(range(256))):
+        assert crc16(data) == f_crc_m(data) and crc8(data) == f_crc8(data)
+    for serial in INVERTERS:
+        for ts in (0x623C8ECF, 1650000000, 1650000001):
+            assert bytes(builder.request(serial, ts)) == compose_0x80_msg(serial, DTU, ts)
+        for n in range(1, 5):
+            assert builder.refetch(serial, n) == compose_0x80_msg(serial, DTU, refetch=bytes([0x80 + n]))
+        assert builder.esb_addr(serial) == ser_to_esb_addr(serial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', dest='number', type=int, default=50000, help='iterations per case')
+    args = parser.parse_args()
+
+    builder = FrameBuilder(DTU)
+    for serial in INVERTERS:
+        builder.add(serial)
+    check(builder)
+
+    serial = INVERTERS[0]
+    ts = [1650000000]
+
+    def new_ts():
+        # a new time stamp for every request, the worst case for the builder
+        ts[0] += 1
+        return ts[0]
+
+    cases = (
+        ('request, same ts',
+         lambda: (compose_0x80_msg(serial, DTU, 1650000000), ser_to_esb_addr(serial)),
+         lambda: (builder.request(serial, 1650000000), builder.esb_addr(serial))),
+        ('request, new ts',
+         lambda: (compose_0x80_msg(serial, DTU, new_ts()), ser_to_esb_addr(serial)),
+         lambda: (builder.request(serial, new_ts()), builder.esb_addr(serial))),
+        ('refetch',
+         lambda: (compose_0x80_msg(serial, DTU, refetch=struct.pack('B', 0x82)), ser_to_esb_addr(serial)),
+         lambda: (builder.refetch(serial, 2), builder.esb_addr(serial))),
+    )
+    print(f"{'case':18s} {'legacy ns':>10s} {'builder ns':>10s} {'speedup':>8s}")
+    for name, old, new in cases:
+        t_old = min(timeit.repeat(old, number=args.number, repeat=3))
+        t_new = min(timeit.repeat(new, number=args.number, repeat=3))
+        print(f"{name:18s} {t_old/args.number*1e9:10.0f} {t_new/args.number*1e9:10.0f} {t_old/t_new:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Benchmark suite for the hot path, no radio or broker needed.
+
+    $ python3 benchmarks/suite.py [-k FILTER] [--json FILE] [--compare BASELINE]
+
+Times request and refetch frames, CRC-8 and CRC-16, decoding per model and
+cmd, and whole polling cycles as the output side of ahoy handles them
+(reassemble, check, decode, format the output line, build the MQTT
+messages) for 1, 50 and 500 inverters. The HM-600 frames are real ones
+from example-logs/example.log, the HM-300 and HM-1200 ones come from the
+simulator.
+
+--json writes the results (ns per operation) with the Python version and
+machine; --compare prints them next to such a file and exits with status 1
+if a case got slower by more than --threshold (default 10 %). To check a
+change:
+
+    $ python3 benchmarks/suite.py --json base.json
+    ... change ...
+    $ python3 benchmarks/suite.py --compare base.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hoymiles.models import ser_to_type
+from hoymiles.frames import FrameBuilder, crc8, crc16, hm_addr, esb_addr
+from hoymiles.decoders import decode
+from hoymiles.reassembly import Response
+from hoymiles.mqtt import Publisher
+from hoymiles.simulator import SimulatedInverter
+from hoymiles.app import Ahoy, parse_args
+from hoymiles import logs
+
+EXAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example-logs', 'example.log')
+EXAMPLE_SERIAL = '114174608145'
+DTU = '99978563412'
+PREFIXES = {'HM-300': '1121', 'HM-600': '1141', 'HM-1200': '1161'}
+FLEETS = (1, 50, 500)
+
+
+def example_frames(path=EXAMPLE_LOG):
+    """
+    The 0x95 fragments received in the example log, in order.
+    """
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith('Received'):
+                frames.append(bytes.fromhex(line.split(':', 1)[1]))
+    return frames
+
+
+def example_responses(frames):
+    """
+    The complete responses (with a matching CRC-16) in the example log.
+    """
+    responses = []
+    response = Response(EXAMPLE_SERIAL, 'HM-600', 3)
+    for p in frames:
+        if p[9] == 0x01:
+            response.reset()
+        response.add(p)
+        if response.crc_ok():
+            responses.append([response.fragments[n]['p'] for n in sorted(response.fragments)])
+            response.reset()
+    return responses
+
+
+def fleet(n, seed=1):
+    """
+    n simulated inverters, the models taking turns; one response each.
+    :return: [(serial, fragments)]
+    """
+    rng = random.Random(seed)
+    models = list(PREFIXES)
+    inverters = []
+    for i in range(n):
+        serial = f'{PREFIXES[models[i % len(models)]]}{20000000 + i:08d}'
+        inverters.append((serial, SimulatedInverter(serial, rng).respond(1000.0, hm_addr(DTU))))
+    return inverters
+
+
+class _Sink:
+    """
+    Stands in for MqttOutput: keeps the last message only.
+    """
+    def __init__(self):
+        self.count = 0
+        self.last = None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.count += 1
+        self.last = (topic, payload)
+
+
+def make_app(serials, modes):
+    """
+    The ahoy application set up for output only: metrics and MQTT
+    messages built for a sink.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = Ahoy(parse_args(['-c', os.devnull, '-m', '0']))
+    app.open_metrics()
+    app.publisher = Publisher(_Sink(), modes)
+    for serial in serials:
+        app.register_inverter(serial)
+    return app
+
+
+def cycle_case(app, inverters):
+    """
+    One polling cycle of every inverter, as it comes out of the radio loop.
+    """
+    now = datetime.now()
+    dt = now.strftime("%Y-%m-%d %H:%M:%S.%f")
+    cycles = []
+    for serial, fragments in inverters:
+        details = [{'p': p, 'ch_rx': 3, 'ch_tx': 40, 'time_rx': now, 'latency': 5000000 + 2000000 * i}
+                   for i, p in enumerate(fragments)]
+        stats = {'lag_ns': 1000, 'requested': len(fragments), 'refetches': 0,
+                 'receptions': [(3, d['latency']) for d in details]}
+        cycles.append(('radio', serial, details, dt, 40, [3] * len(fragments), [p[9] for p in fragments], stats))
+    output_cycle = app.output_cycle
+
+    def run():
+        for cycle in cycles:
+            output_cycle(*cycle)
+    return run
+
+
+def cases(modes):
+    """
+    :return: [(name, items per call, function)]
+    """
+    out = []
+
+    builder = FrameBuilder(DTU)
+    builder.add(EXAMPLE_SERIAL)
+    ts = [1650000000]
+
+    def request():
+        ts[0] += 1
+        return builder.request(EXAMPLE_SERIAL, ts[0])
+
+    out.append(('frames/request', 1, request))
+    out.append(('frames/refetch', 1, lambda: builder.refetch(EXAMPLE_SERIAL, 2)))
+    out.append(('frames/addresses', 1, lambda: (hm_addr(EXAMPLE_SERIAL), esb_addr(EXAMPLE_SERIAL))))
+
+    frames = example_frames()
+    request = bytes(builder.request(EXAMPLE_SERIAL, ts[0]))
+    out.append(('crc8/request', 1, lambda: crc8(request[:-1])))
+    out.append(('crc8/fragment', 1, lambda: crc8(frames[0][:-1])))
+    out.append(('crc16/request', 1, lambda: crc16(request[10:24])))
+    responses = example_responses(frames)
+    payload = b''.join(p[10:-1] for p in responses[0])[:-2]
+    out.append(('crc16/response', 1, lambda: crc16(payload)))
+
+    samples = {}
+    for p in frames:
+        samples.setdefault(('HM-600', p[9]), p)
+    for serial, fragments in fleet(3):
+        model = ser_to_type(serial)[0]
+        if model != 'HM-600':
+            for p in fragments:
+                samples[(model, p[9])] = p
+    for (model, cmd), p in sorted(samples.items(), key=lambda kv: kv[0]):
+        state = {}
+        out.append((f'decode/{model}/0x{cmd:02x}', 1, lambda model=model, cmd=cmd, p=p, state=state:
+                    decode(model, cmd, p, state)))
+
+    app = make_app([EXAMPLE_SERIAL], modes)
+    out.append(('cycle/example', 1, cycle_case(app, [(EXAMPLE_SERIAL, responses[0])])))
+    for n in FLEETS:
+        inverters = fleet(n)
+        app = make_app([serial for serial, fragments in inverters], modes)
+        out.append((f'cycle/{n}', n, cycle_case(app, inverters)))
+    return out
+
+
+def measure(fn, repeat):
+    """
+    :return: best time per call in ns, over repeat runs of about 0.2 s
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def compare(results, baseline, threshold):
+    """
+    Print results next to baseline.
+    :return: names of the cases that got slower by more than threshold
+    """
+    slower = []
+    print(f"{'case':28s} {'base ns':>12s} {'now ns':>12s} {'change':>8s}")
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            print(f"{name:28s} {'':>12s} {r['ns']:12.0f}      new")
+            continue
+        change = r['ns'] / b['ns'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  slower'
+            slower.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:28s} {b['ns']:12.0f} {r['ns']:12.0f} {100*change:+7.1f}%{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='filter', default='', help='only cases whose name contains FILTER')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs per case, the best counts')
+    parser.add_argument('--mqtt-mode', default='json', help='MQTT modes for the cycle cases, default json')
+    parser.add_argument('--json', dest='json_out', default='', help='write the results to this file')
+    parser.add_argument('--compare', default='', help='compare with the results in this file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    # cycle lines are formatted by the logging thread, as in ahoy
+    devnull = open(os.devnull, 'w')
+    listener = logs.setup('INFO', 'text', devnull)
+    results = {}
+    for name, items, fn in cases(args.mqtt_mode.replace(' ', '').split(',')):
+        if args.filter not in name:
+            continue
+        ns = measure(fn, args.repeat)
+        results[name] = {'ns': ns, 'items': items}
+        if not args.compare:
+            per_item = f" {ns/items:10.0f} ns per inverter" if items > 1 else ''
+            print(f"{name:28s} {ns:12.0f} ns{per_item}", flush=True)
+    listener.stop()
+    devnull.close()
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'node': platform.node(), 'time': time.time(), 'results': results}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"baseline: Python {baseline['python']} on {baseline['machine']} ({baseline['node']})")
+        slower = compare(results, baseline['results'], args.threshold)
+        if slower:
+            print(f"{len(slower)} slower: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+Protocol helpers for talking to Hoymiles micro inverters.
+
+Everything in this package is free of side effects on import, so it can
+be used by the application (hoymiles.app, run by ahoy.py or the `ahoy`
+command) as well as by offline tools and benchmarks.
+"""
@@ -0,0 +1,245 @@
+"""
+Reports over archived readings (see hoymiles.archive), computed with NumPy
+over all inverters and DC channels at once:
+
+- daily yield per inverter, from the total energy counters (with counter
+  resets and 16 bit high word glitches taken care of) and, as a cross-check,
+  from the daily energy counters
+- peak AC power per inverter and day
+- yield per string (DC channel) over the whole period and its ratio to the
+  median string of the fleet; strings below --threshold are reported as
+  under-performing
+
+    $ python3 ahoy.py analyze --archive arc --from 2022-04-01 --to 2022-04-30
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import date
+
+import numpy as np
+
+from .archive import Segment, segments, segment_rows, MISSING_UINT
+
+CHANNELS = 4
+HIGH_WORD = 65536
+
+
+class Readings:
+    """
+    The rows of all inverters, stacked in (inverter, time) order:
+    ts (ns), inv (index into serials), day (local date, datetime64[D]),
+    ac_power (n,), and (n, CHANNELS) arrays power, total and today,
+    float64 with NaN where a value is missing.
+    """
+
+    def __init__(self, serials, ts, inv, day, ac_power, power, total, today):
+        self.serials = serials
+        self.ts = ts
+        self.inv = inv
+        self.day = day
+        self.ac_power = ac_power
+        self.power = power
+        self.total = total
+        self.today = today
+        self._increments = None
+
+    def __len__(self):
+        return len(self.ts)
+
+    def increments(self):
+        """
+        Energy per row and channel from the total counters, see increments().
+        """
+        if self._increments is None:
+            start = np.ones(len(self), dtype=bool)
+            start[1:] = self.inv[1:] != self.inv[:-1]
+            self._increments = increments(self.total, start)
+        return self._increments
+
+
+def load(directory, serials=None, first=None, last=None):
+    """
+    Load the archived readings between the days first and last (inclusive,
+    'YYYY-MM-DD'). Every segment is mapped once and copied column by column
+    into preallocated arrays (segments are opened one at a time, so the
+    number of open files stays small).
+    """
+    if serials is None:
+        serials = sorted(s for s in os.listdir(directory) if os.path.isdir(os.path.join(directory, s)))
+    paths = []
+    for i, serial in enumerate(serials):
+        for path in segments(directory, serial):
+            name = os.path.basename(path)[:-4]
+            if (first is None or name >= first) and (last is None or name <= last):
+                paths.append((i, name, path))
+    rows = [segment_rows(path) for i, name, path in paths]
+    n = sum(rows)
+    readings = Readings(list(serials), np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int32),
+                        np.empty(n, dtype='datetime64[D]'), np.full(n, np.nan),
+                        *(np.full((n, CHANNELS), np.nan) for _ in range(3)))
+    pos = 0
+    for (i, name, path), count in zip(paths, rows):
+        seg = Segment(path)
+        _copy(readings, slice(pos, pos + count), i, name, seg.to_numpy()[:count])
+        seg.close()
+        pos += count
+    # missing energy counters were stored as MISSING_UINT
+    for counter in (readings.total, readings.today):
+        counter[counter == MISSING_UINT] = np.nan
+    return readings
+
+
+def _copy(readings, rows, inv, name, data):
+    readings.ts[rows] = data['ts']
+    readings.inv[rows] = inv
+    readings.day[rows] = np.datetime64(name)
+    names = data.dtype.names
+    if '0/powerAC' in names:
+        readings.ac_power[rows] = data['0/powerAC']
+    for ch in range(CHANNELS):
+        for target, key in ((readings.power, 'power'), (readings.total, 'totalenergy'),
+                            (readings.today, 'todaysenergy')):
+            key = f'{ch + 1}/{key}'
+            if key in names:
+                target[rows, ch] = data[key]
+
+
+def _fill_forward(values, start):
+    """
+    Carry the last valid value down every column, but not across rows where
+    start is set (the first row of an inverter).
+    """
+    rows = np.arange(len(values))[:, None]
+    keep = ~np.isnan(values) | start[:, None]
+    idx = np.maximum.accumulate(np.where(keep, rows, 0), axis=0)
+    return np.take_along_axis(values, idx, axis=0)
+
+
+def increments(counter, start, wrap=HIGH_WORD, max_step=1000.0):
+    """
+    Energy between consecutive rows of (n, channels) counter readings.
+
+    - a change by about a multiple of `wrap` (within max_step) is a high
+      word that went missing or came back, e.g. HM-600 1/totalenergy without
+      the high word of the 0x01 fragment (ptotal1hb), or the 16 bit low word
+      rolling over; only the remainder counts
+    - any other decrease is a counter reset; the new reading counts
+    - rows where start is set, or with a missing value, count 0
+    """
+    v = _fill_forward(counter, start)
+    d = np.zeros_like(v)
+    d[1:] = v[1:] - v[:-1]
+    k = np.round(d / wrap)
+    r = d - k * wrap
+    rollover = (k != 0) & (np.abs(r) <= max_step)
+    d = np.where(rollover, np.maximum(r, 0), d)
+    d = np.where(d < 0, v, d)
+    d[start] = 0
+    return np.nan_to_num(d, nan=0.0)
+
+
+def _runs(keys):
+    """
+    :return: start index of every run of equal keys
+    """
+    change = np.ones(len(keys), dtype=bool)
+    change[1:] = keys[1:] != keys[:-1]
+    return np.nonzero(change)[0]
+
+
+def daily(readings):
+    """
+    Per inverter and day: yield from the total counters (Wh), yield from the
+    daily counters (Wh) and peak AC power (W). Rows are in (inverter, day)
+    order, so every inverter-day is one run of rows, reduced with reduceat.
+    """
+    day = readings.day.astype(np.int64)
+    starts = _runs(readings.inv.astype(np.int64) << 32 | (day - day.min() if len(day) else day))
+    e_total = np.add.reduceat(readings.increments().sum(axis=1), starts)
+    e_today = np.nansum(np.fmax.reduceat(readings.today, starts, axis=0), axis=1)
+    peak = np.fmax.reduceat(readings.ac_power, starts)
+    return [{'serial': readings.serials[i], 'day': str(d), 'yield': float(e),
+             'yield_daily_counters': float(t), 'peak_power': None if np.isnan(p) else float(p)}
+            for i, d, e, t, p in zip(readings.inv[starts], readings.day[starts], e_total, e_today, peak)]
+
+
+def string_energy(readings):
+    """
+    :return: (energy, present), (inverters, CHANNELS) arrays with the yield
+             of every string over the whole period (Wh) and whether the
+             string has any readings
+    """
+    energy = np.zeros((len(readings.serials), CHANNELS))
+    present = np.zeros((len(readings.serials), CHANNELS), dtype=bool)
+    starts = _runs(readings.inv)
+    inv = readings.inv[starts]
+    energy[inv] = np.add.reduceat(readings.increments(), starts, axis=0)
+    present[inv] = np.logical_or.reduceat(~np.isnan(readings.total), starts, axis=0)
+    return energy, present
+
+
+def strings(serials, energy, present, threshold=0.8):
+    """
+    Ratio of every string's yield to the median yield of all strings with
+    readings; strings below threshold are flagged.
+    """
+    median = np.median(energy[present]) if present.any() else 0.0
+    ratio = energy / median if median > 0 else np.zeros_like(energy)
+    inv, ch = np.nonzero(present)
+    return [{'serial': serials[i], 'channel': int(c) + 1, 'yield': float(energy[i, c]),
+             'ratio': float(ratio[i, c]), 'low': bool(ratio[i, c] < threshold)}
+            for i, c in zip(inv, ch)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ahoy analyze', description='reports over archived readings')
+    parser.add_argument('-a', '--archive', required=True, help='archive directory (ahoy.py -a)')
+    parser.add_argument('--from', dest='first', help='first day, YYYY-MM-DD')
+    parser.add_argument('--to', dest='last', help='last day, YYYY-MM-DD')
+    parser.add_argument('-s', '--serial', action='append', help='inverter serial (repeatable), default all')
+    parser.add_argument('--threshold', type=float, default=0.8,
+                        help='flag strings below this ratio to the median string, default 0.8')
+    parser.add_argument('--chunk', type=int, default=64,
+                        help='inverters loaded at a time (bounds the memory use), default 64')
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    args = parser.parse_args(argv)
+    for d in (args.first, args.last):
+        if d is not None:
+            date.fromisoformat(d)
+
+    serials = args.serial or sorted(s for s in os.listdir(args.archive)
+                                    if os.path.isdir(os.path.join(args.archive, s)))
+    report = {'daily': [], 'strings': []}
+    energy = []
+    present = []
+    for i in range(0, len(serials), args.chunk):
+        readings = load(args.archive, serials[i:i + args.chunk], args.first, args.last)
+        report['daily'] += daily(readings)
+        e, p = string_energy(readings)
+        energy.append(e)
+        present.append(p)
+        del readings
+    if not report['daily']:
+        print('no readings in', args.archive, file=sys.stderr)
+        return 1
+    report['strings'] = strings(serials, np.concatenate(energy), np.concatenate(present), args.threshold)
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return 0
+
+    print(f"{'serial':12s} {'day':10s} {'yield Wh':>10s} {'(daily) Wh':>10s} {'peak W':>8s}")
+    for r in report['daily']:
+        peak = '' if r['peak_power'] is None else f"{r['peak_power']:.1f}"
+        print(f"{r['serial']:12s} {r['day']:10s} {r['yield']:10.0f} {r['yield_daily_counters']:10.0f} {peak:>8s}")
+    print()
+    print(f"{'serial':12s} {'ch':>2s} {'yield Wh':>10s} {'ratio':>6s}")
+    for r in report['strings']:
+        print(f"{r['serial']:12s} {r['channel']:2d} {r['yield']:10.0f} {r['ratio']:6.2f}" +
+              ('  under-performing' if r['low'] else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+HTTP/JSON API with the latest readings, on http://<host>:<port>/api/...
+
+    GET /api/inverters                  latest complete reading of every inverter
+    GET /api/inverters/<serial>         ... of one
+    GET /api/history/<serial>/<key>?resolution=900&since=<unix time>
+                                        rollups of one value (see hoymiles.rollup)
+
+A reading looks like the MQTT 'json' documents, plus serial and model:
+{"serial": "114174608145", "model": "HM-600", "ts": 1650000000.0,
+ "emeter": {"0/powerAC": 21.7, ...}, "emeter-dc": {"1/voltage": 28.8, ...}}
+
+Snapshots is updated by the output loop once per complete cycle, which
+serializes the reading to JSON bytes right away; requests only send
+those bytes (the document of all inverters is put together from them once
+after a change). Every body has an ETag, a request with a matching
+If-None-Match gets 304 Not Modified. The server runs in daemon threads and
+never waits for the radio or output loops.
+"""
+import json
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = 'application/json'
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def _matches(header, etag):
+    """
+    Whether an If-None-Match header lists etag (weak or not) or is '*'.
+    """
+    for tag in (header or '').split(','):
+        tag = tag.strip()
+        if tag == etag or tag == '*' or tag == 'W/' + etag:
+            return True
+    return False
+
+
+class Snapshots:
+    def __init__(self):
+        self._bodies = {}       # serial -> (etag, body)
+        self._version = 0
+        self._all = (-1, None, None)
+
+    def update(self, serial, model, ts, groups):
+        """
+        Take the reading of a complete cycle.
+        :param groups: {group: {key: value}}, see hoymiles.mqtt.emeter_groups
+        """
+        doc = {'serial': serial, 'model': model, 'ts': ts}
+        doc.update(groups)
+        body = _dumps(doc).encode()
+        self._bodies[serial] = (_etag(body), body)
+        self._version += 1
+
+    def get(self, serial=None):
+        """
+        :return: (etag, body) of one inverter or all of them, None for an
+                 unknown serial
+        """
+        if serial is not None:
+            return self._bodies.get(serial)
+        version, etag, body = self._all
+        if version != self._version:
+            version = self._version
+            # sorted() copies the dict in one C call, safe against updates
+            bodies = sorted(self._bodies.items())
+            body = b'{' + b','.join(json.dumps(serial).encode() + b':' + one for serial, (tag, one) in bodies) + b'}'
+            etag = _etag(body)
+            self._all = (version, etag, body)
+        return etag, body
+
+
+class ApiServer:
+    """
+    Serves snapshots (and rollups, if given) from a daemon thread.
+    """
+
+    def __init__(self, snapshots, rollups=None, port=8080, host=''):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                url = urlsplit(handler.path)
+                parts = [unquote(p) for p in url.path.strip('/').split('/')]
+                if parts[:2] == ['api', 'inverters'] and len(parts) <= 3:
+                    found = snapshots.get(parts[2] if len(parts) == 3 else None)
+                    if found is None:
+                        handler.send_error(404, 'unknown inverter')
+                        return
+                    etag, body = found
+                elif parts[:2] == ['api', 'history'] and len(parts) >= 4 and rollups is not None:
+                    query = parse_qs(url.query)
+                    try:
+                        width = int(query.get('resolution', [rollups.resolutions[0][0]])[0])
+                        since = float(query['since'][0]) if 'since' in query else None
+                    except ValueError:
+                        handler.send_error(400, 'resolution and since must be numbers')
+                        return
+                    if width not in dict(rollups.resolutions):
+                        handler.send_error(400, f'resolution is one of {", ".join(str(w) for w, n in rollups.resolutions)}')
+                        return
+                    serial, key = parts[2], '/'.join(parts[3:])
+                    rows = rollups.query(serial, key, width, since)
+                    body = _dumps({'serial': serial, 'key': key, 'resolution': width,
+                                   'columns': ['start', 'min', 'max', 'mean', 'last', 'count'],
+                                   'buckets': rows}).encode()
+                    etag = _etag(body)
+                else:
+                    handler.send_error(404)
+                    return
+                if _matches(handler.headers.get('If-None-Match'), etag):
+                    handler.send_response(304)
+                    handler.send_header('ETag', etag)
+                    handler.end_headers()
+                    return
+                handler.send_response(200)
+                handler.send_header('Content-Type', CONTENT_TYPE)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.send_header('ETag', etag)
+                handler.send_header('Cache-Control', 'no-cache')
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='api', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
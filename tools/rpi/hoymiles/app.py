@@ -0,0 +1,1024 @@
+"""
+The ahoy application: poll the inverters over one or more radios and
+output what they answer (console, file, MQTT, archive, metrics).
+
+Importing this module does nothing but define Ahoy and main(). Settings
+are parsed by main(); the outputs are opened by Ahoy.run() and the radios
+only when polling starts, not for --replay. The MQTT client (paho) and the
+radio driver (RF24) are imported when they are used, so tools that only
+need the protocol pieces (hoymiles.models, .frames, .decoders,
+.reassembly) or a replay never load them.
+
+    $ ahoy -c ahoy.conf            (or python3 ahoy.py -c ahoy.conf)
+    $ ahoy analyze -a arc          (see hoymiles.analyze)
+"""
+import asyncio
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import struct
+import json
+import logging
+from datetime import datetime
+from configparser import ConfigParser
+
+from .models import ser_to_type
+from .scheduler import Scheduler
+from .engine import RxEngine, GpioIrq, PollingReady
+from .radio import RF24Radio
+from .capture import CaptureWriter, CaptureReader, FrameRing, KIND_TX, KIND_RX, KIND_SEGMENT
+from .mqtt import Publisher, MqttOutput, Spool, Deadband, emeter_groups
+from .archive import ArchiveWriter
+from .logfile import LogFile
+from .frames import FrameBuilder, hm_addr, esb_addr, crc8
+from .reassembly import Response
+from .channels import HopPlanner
+from .arq import RttEstimator, SelectiveRepeat, REQUEST, TRIES
+from .metrics import Registry, MetricsServer
+from .timing import Profiler, NULL
+from .shards import Shards
+from .sun import Daylight
+from .rollup import Rollups, DEFAULT_RESOLUTIONS
+from .api import Snapshots, ApiServer
+from . import logs
+from .logs import Hex
+
+log = logging.getLogger('ahoy')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='ahoy', description='monitor homiles')
+    parser.add_argument('-c', dest='configName', action='store', default='ahoy.conf',help='config file with settings')
+    parser.add_argument('-m', dest='mqttMode', action='store', default='1',help='mqtt mode, default 1')
+    parser.add_argument('-d', dest='debugMode', action='store', default='0',help='debug output, default 0')
+    parser.add_argument('-i', dest='pollingInterval', action='store', default='10',help='per inverter polling inverval, default 60')
+    parser.add_argument('-f', dest='file', action='store', default='',help='file output, default none')
+    parser.add_argument('-e', dest='endtime', action='store', default='',help='endtime in HH24:MI, default none')
+    parser.add_argument('--capture', dest='capture', action='store', default='',help='append all radio frames to a binary capture file')
+    parser.add_argument('--replay', dest='replay', action='store', default='',help='process a capture file instead of using the radio')
+    parser.add_argument('--speed', dest='speed', action='store', default='1',help='replay speed factor or max, default 1')
+    parser.add_argument('-a', '--archive', dest='archive', action='store', default='',help='archive directory for decoded readings, default none')
+    parser.add_argument('--profile', dest='profile', action='store', nargs='?', const='', default=None,help='print where the time goes every minute, optionally also as Chrome trace to the given file')
+    return vars(parser.parse_args(argv))
+
+
+def print_addr(a):
+    print(f"ser# {a} ", end='')
+    print(f" -> HM  {' '.join([f'{x:02x}' for x in hm_addr(a)])}", end='')
+    print(f" -> ESB {' '.join([f'{x:02x}' for x in esb_addr(a)])}")
+
+
+class Ahoy:
+    def __init__(self, args):
+        """
+        Read the settings; nothing is opened or started yet.
+        :param args: the options, as returned by parse_args()
+        """
+        self.args = args
+
+        self.mqttMode=int(args['mqttMode'])>0
+        print("mqttMode",self.mqttMode)
+
+        self.debugMode=int(args['debugMode'])>0
+        print("debugMode",self.debugMode)
+
+        self.minRefreshSeconds=int(args['pollingInterval'])
+        print("inverter polling interval in seconds:",self.minRefreshSeconds)
+
+        configName=args['configName']
+        print("using config from",configName)
+
+        self.cfg = cfg = ConfigParser()
+        cfg.read(configName)
+
+        # console output goes through a background thread: level from [logging]
+        # (debug with -d 1), format 'text' or 'json'
+        self.log_level = 'DEBUG' if self.debugMode else cfg.get('logging', 'level', fallback='INFO')
+        self.log_format = cfg.get('logging', 'format', fallback='text')
+        self.log_listener = None
+
+        # the last frames sent and received, written to a capture file on SIGUSR1
+        self.ring_size = cfg.getint('logging', 'ring', fallback=1000)
+        self.ring = None
+        self.dump_dir = cfg.get('logging', 'dump_dir', fallback='.')
+
+        self.fileName=args['file']
+        if self.fileName!="":
+            print("using output file:",self.fileName)
+
+        self.endTime=args['endtime']
+        if self.endTime=="":
+            self.endTime="ZZ:ZZ"
+        else:
+            print("will terminate at:",self.endTime)
+
+        self.replayName=args['replay']
+        self.replaySpeed=args['speed']
+        if self.replayName!="":
+            print("replaying",self.replayName,"at speed",self.replaySpeed)
+
+        if args['capture']!="":
+            print("capturing radio frames to",args['capture'])
+
+        if args['profile'] is not None:
+            print("profiling" + (f", trace in {args['profile']}" if args['profile'] else ""))
+
+        if args['archive']!="":
+            print("archiving readings to",args['archive'])
+
+        # the first radio is set up in [radio], more in [radio.<name>] sections,
+        # which take what they don't set themselves from [radio]
+        self.radio_sections = ['radio'] + [s for s in cfg.sections() if s.startswith('radio.')]
+        if cfg.has_section('radio'):
+            for section in self.radio_sections[1:]:
+                for key, value in cfg.items('radio'):
+                    if key != 'serial' and not cfg.has_option(section, key):
+                        cfg.set(section, key, value)
+
+        # Master Address ('DTU')
+        self.dtu_ser = cfg.get('dtu', 'serial', fallback='99978563412')  # identical to fc22's
+
+        # inverter serial numbers
+        inv_ser = cfg.get('inverter', 'serial', fallback='444473104619')  # my inverter
+
+        self.l_inv_ser=inv_ser.strip().split(",")
+
+        # with [sun] latitude and longitude, polling slows down after sunset
+        # and the radios are off at night
+        self.daylight = None
+        if cfg.has_option('sun', 'latitude'):
+            self.daylight = Daylight(cfg.getfloat('sun', 'latitude'), cfg.getfloat('sun', 'longitude'),
+                dawn=cfg.getfloat('sun', 'dawn', fallback=30)*60,
+                dusk=cfg.getfloat('sun', 'dusk', fallback=60)*60,
+                slowdown=cfg.getfloat('sun', 'slowdown', fallback=20)*60)
+            sunrise, sunset = self.daylight.times(datetime.utcnow().date())
+            if sunrise is not None:
+                print("sunrise",datetime.fromtimestamp(sunrise).strftime("%H:%M"),
+                      "sunset",datetime.fromtimestamp(sunset).strftime("%H:%M"))
+
+        # inverters listed in a radio section stay with that radio, the others are
+        # spread over all radios ('static') or follow the best link ('quality')
+        self.shards = Shards(self.radio_sections, self.l_inv_ser,
+            {ser: section for section in self.radio_sections
+             for ser in cfg.get(section, 'serial', fallback='').replace(' ','').split(',') if ser},
+            quality=cfg.get('radio', 'sharding', fallback='static')=='quality')
+
+        # min, max, mean and last of every value over the last minutes, hours
+        # and days, in memory: [rollup] resolutions are bucket width:count
+        self.rollups = None
+        if cfg.has_section('rollup'):
+            resolutions = [r.split(':') for r in cfg.get('rollup', 'resolutions', fallback='').replace(' ','').split(',') if r]
+            fields = [f for f in cfg.get('rollup', 'fields', fallback='').replace(' ','').split(',') if f]
+            self.rollups = Rollups(resolutions or DEFAULT_RESOLUTIONS, fields or None)
+
+        # every radio runs its own receive loop in a thread. On multi-core machines
+        # these threads run in a process of their own ([radio] process), so that
+        # decoding and output in the main process can't delay the next request.
+        # Polling cycles go to the output as raw fragments through this queue.
+        self.radio_process = cfg.getboolean('radio', 'process', fallback=(os.cpu_count() or 1)>1)
+        self.mp = multiprocessing.get_context('fork')
+        self.cycles = queue.Queue()
+        self.stopping = threading.Event()
+        self.radios = {}
+        self.radio_threads = []
+        self.radio_proc = None
+
+        # opened by run() and open_radios(), the capture by the radio loops' process
+        self.outFile = None
+        self.capture = None
+        self.archive = None
+        self.profiler = NULL
+        self.mqtt_output = None
+        self.publisher = None
+        self.metrics_server = None
+        self.snapshots = None
+        self.api_server = None
+
+        self.mType={}
+        self.mFullSer={}
+        self.mState={}
+        self.mResponse={}
+
+    def open_outputs(self):
+        """
+        Start logging and open the file, archive, MQTT and metrics outputs.
+        """
+        cfg = self.cfg
+        args = self.args
+        self.log_listener = logs.setup(self.log_level, self.log_format)
+
+        if self.fileName!="":
+            self.outFile=LogFile(self.fileName,
+                commit_interval=cfg.getfloat('file', 'commit_interval', fallback=5.0),
+                batch_lines=cfg.getint('file', 'batch_lines', fallback=100),
+                durability=cfg.get('file', 'durability', fallback='os'),
+                max_bytes=cfg.getint('file', 'max_mb', fallback=0)*1024*1024,
+                daily=cfg.getboolean('file', 'daily', fallback=False),
+                compress=cfg.getboolean('file', 'compress', fallback=True),
+                keep=cfg.getint('file', 'keep', fallback=0))
+
+        if args['profile'] is not None:
+            self.profiler=Profiler(trace=args['profile'] or None)
+
+        if args['archive']!="":
+            self.archive=ArchiveWriter(args['archive'])
+
+        if self.mqttMode:
+            self.open_mqtt()
+
+        self.open_metrics()
+
+        # latest readings (and rollups) as JSON, if [api] has a port
+        api_port = cfg.getint('api', 'port', fallback=0)
+        if api_port:
+            print("serving the API on port",api_port)
+            self.snapshots = Snapshots()
+            self.api_server = ApiServer(self.snapshots, self.rollups, api_port, cfg.get('api', 'bind', fallback=''))
+            self.api_server.start()
+
+    def open_mqtt(self):
+        import paho.mqtt.client
+        cfg = self.cfg
+        mqtt_host = cfg.get('mqtt', 'host', fallback='192.168.1.1')
+        mqtt_port = cfg.getint('mqtt', 'port', fallback=1883)
+        mqtt_user = cfg.get('mqtt', 'user', fallback='')
+        mqtt_password = cfg.get('mqtt', 'password', fallback='')
+        mqtt_modes = cfg.get('mqtt', 'mode', fallback='json').replace(' ','').split(',')
+        mqtt_qos = cfg.getint('mqtt', 'qos', fallback=0)
+        mqtt_retain = cfg.getboolean('mqtt', 'retain', fallback=False)
+
+        mqtt_client = paho.mqtt.client.Client()
+        mqtt_client.username_pw_set(mqtt_user, mqtt_password)
+        # connects and reconnects in the background, never blocks the radio
+        mqtt_spool = cfg.get('mqtt', 'spool', fallback='ahoy-mqtt.spool')
+        self.mqtt_output = MqttOutput(mqtt_client, mqtt_host, mqtt_port,
+            queue_size=cfg.getint('mqtt', 'queue_size', fallback=1000),
+            spool=Spool(mqtt_spool) if mqtt_spool else None,
+            drain_rate=cfg.getfloat('mqtt', 'drain_rate', fallback=50))
+        self.mqtt_output.start()
+        # with [mqtt.deadband], values are only published again once they moved
+        # by more than their band, and all of them every keyframe seconds
+        deadband = None
+        if cfg.has_section('mqtt.deadband'):
+            deadband = Deadband(dict(cfg.items('mqtt.deadband', raw=True)),
+                keyframe=cfg.getfloat('mqtt', 'keyframe', fallback=300))
+        self.publisher = Publisher(self.mqtt_output, mqtt_modes, mqtt_qos, mqtt_retain, deadband=deadband)
+
+    def open_metrics(self):
+        """
+        Radio and pipeline health, served for Prometheus if [metrics] has a port.
+        """
+        self.metrics = metrics = Registry()
+        self.m_polls = metrics.counter('ahoy_polls_total', 'Polling cycles started', ('inverter',))
+        self.m_cycles = metrics.counter('ahoy_cycles_total', 'Polling cycles by result (complete, partial, empty)', ('inverter', 'result'))
+        self.m_requested = m_requested = metrics.counter('ahoy_fragments_requested_total', 'Response fragments asked for by requests and refetches', ('inverter',))
+        self.m_expected = m_expected = metrics.counter('ahoy_fragments_expected_total', 'Response fragments polling cycles were to bring, once per cycle', ('inverter',))
+        self.m_received = m_received = metrics.counter('ahoy_fragments_received_total', 'Response fragments received (not counting duplicates)', ('inverter',))
+        self.m_refetches = metrics.counter('ahoy_refetches_total', 'Refetch requests sent', ('inverter',))
+        self.m_rx_frames = metrics.counter('ahoy_rx_frames_total', 'Response frames received per RX channel', ('channel',))
+        self.m_latency = metrics.histogram('ahoy_response_latency_seconds', 'Time from the last transmission to a received frame', ('inverter',))
+        self.m_decode = metrics.histogram('ahoy_decode_seconds', 'Time to decode a response', ('model',))
+        self.m_lag = metrics.gauge('ahoy_scheduler_lag_seconds', 'How late the last polling cycle started', ('radio',))
+        metrics.gauge('ahoy_fragment_loss_ratio', 'Share of the fragments of the polling cycles that did not arrive', ('inverter',),
+            fn=lambda: {k: 1 - min(1, m_received.values.get(k, 0) / v) for k, v in list(m_expected.values.items()) if v})
+        mqtt_output = self.mqtt_output
+        if mqtt_output is not None:
+            metrics.gauge('ahoy_mqtt_queue_depth', 'Messages waiting to be published', fn=lambda: mqtt_output.queue_depth())
+            metrics.counter('ahoy_mqtt_sent_total', 'Messages handed to the broker', fn=lambda: mqtt_output.sent)
+            metrics.counter('ahoy_mqtt_dropped_total', 'Messages dropped because the queue was full', fn=lambda: mqtt_output.dropped)
+            metrics.counter('ahoy_mqtt_superseded_total', 'Retained messages not sent because a newer one was published', fn=lambda: mqtt_output.superseded)
+        out_file = self.outFile
+        if out_file is not None:
+            metrics.counter('ahoy_logfile_dropped_lines_total', 'Lines lost because the output file could not be written', fn=lambda: out_file.dropped)
+        deadband = self.publisher.deadband if self.publisher is not None else None
+        if deadband is not None:
+            metrics.counter('ahoy_mqtt_suppressed_total', 'Messages not published because nothing moved past its deadband', fn=lambda: deadband.suppressed)
+
+        metrics_port = self.cfg.getint('metrics', 'port', fallback=0)
+        if metrics_port:
+            print("serving metrics on port",metrics_port)
+            self.metrics_server = MetricsServer(metrics, metrics_port, self.cfg.get('metrics', 'bind', fallback=''))
+            self.metrics_server.start()
+
+    def make_radio(self, section='radio', index=0):
+        """
+        Radio backend from a radio section: 'rf24' (default) or 'simulator'.
+        """
+        cfg = self.cfg
+        backend = cfg.get(section, 'backend', fallback='rf24')
+        if backend == 'simulator':
+            from .simulator import SimulatedRadio
+            return SimulatedRadio(self.l_inv_ser,
+                loss=cfg.getfloat(section, 'loss', fallback=0.0),
+                latency=cfg.getfloat(section, 'latency', fallback=4)/1000,
+                gap=cfg.getfloat(section, 'gap', fallback=3)/1000,
+                seed=cfg.getint(section, 'seed', fallback=0)+index)
+        return RF24Radio(cfg.getint(section, 'ce_pin', fallback=22),
+                         cfg.getint(section, 'spi_device', fallback=0),
+                         cfg.getint(section, 'spi_speed', fallback=1000000))
+
+    def open_radios(self):
+        """
+        Set up and check the radios, and what the radio loops share with the output.
+        """
+        if self.radio_process:
+            self.cycles = self.mp.Queue()
+            self.stopping = self.mp.Event()
+        if self.ring_size:
+            self.ring = FrameRing(self.ring_size)
+        self.radios = {section: self.make_radio(section, i) for i, section in enumerate(self.radio_sections)}
+        for name, radio in self.radios.items():
+            if not radio.begin():
+                raise RuntimeError(f"radio hardware is not responding ({name})")
+            if len(self.radios)>1:
+                print(name,"polls",",".join(self.shards.owned(name)))
+
+        # radio.rf24.printDetails();  # (smaller) function that prints raw register values
+        # radio.rf24.printPrettyDetails();  # (larger) function that prints human readable data
+
+    def on_receive(self, p=None, ctr=None, ch_rx=None, ch_tx=None, time_rx=datetime.now(), latency=None, infos=None):
+        """
+        Callback: get's invoked whenever a Noridc ESB packet has been received.
+        :param p: Payload of the received packet.
+        :param infos: its decoded content (see hoymiles.reassembly.Response.decode)
+        """
+
+        d = {}
+
+        ts = datetime.utcnow()
+        ts_unixtime = ts.timestamp()
+        size=len(p)
+        d['ts_unixtime'] = ts_unixtime
+        d['isodate'] = ts.isoformat()
+        d['trans_id'] = ctr
+
+        log.debug("Received %d b  %2d to channel %2d after tx %10d ns: %s", size, ch_tx, ch_rx, latency, Hex(p),
+            extra={'fields': {'event': 'rx', 'ch_tx': ch_tx, 'ch_rx': ch_rx, 'latency_ns': latency, 'frame': Hex(p)}})
+        # check crc8
+        crc = crc8(p[:-1])
+        d['crc8_valid'] = True if crc==p[-1] else False
+
+        if self.debugMode:
+            d['rawdata'] = " ".join([f"{b:02x}" for b in p])
+            ws='H'*int((size-1-10)/2)
+            pw=struct.unpack('>B'+ws, p[9:size-1])
+            log.debug("Recwords %d b  %2d to channel %2d after tx %10d ns:       crc: %d            %s",
+                size, ch_tx, ch_rx, latency, crc==p[-1], " ".join([f"{b:05d}" for b in pw]))
+
+
+        # interpret content
+        mid = p[0]
+        d['mid'] = mid
+        d['response_time_ns'] = latency
+        d['ch_rx'] = ch_rx
+        d['ch_tx'] = ch_tx
+        d['src'] = 'src_unkn'
+        d['name'] = 'name_unkn'
+        d['infos'] = []
+
+        if mid == 0x95:
+            src, dst, cmd = struct.unpack('>LLB', p[1:10])
+            inv_id=f'{src:08x}'
+            d['src'] = f'{src:08x}'
+            d['dst'] = f'{dst:08x}'
+            d['cmd'] = cmd
+            log.debug('MSG src=%s, dst=%s, cmd=%d:', d["src"], d["dst"], cmd)
+
+            if inv_id not in self.mType:
+                log.warning("UNKWOWN source %s", inv_id)
+                return
+            d['fullsrc']=self.mFullSer[inv_id]
+
+            if infos is None:
+                log.warning('unknown cmd %d', cmd)
+                infos=[]
+            d["infos"]=infos
+
+        else:
+            log.warning('unknown frame id %d', p[0])
+
+        # output to stdout
+        if self.debugMode and d:
+            log.debug("%s", json.dumps(d))
+
+        return d
+
+    def polling_interval(self, ser):
+        """
+        Polling interval of one inverter in seconds: [inverter.<serial>] wins over
+        the first [group.<name>] listing the serial, which wins over -i.
+        """
+        cfg=self.cfg
+        section=f'inverter.{ser}'
+        if cfg.has_option(section, 'interval'):
+            return cfg.getfloat(section, 'interval')
+        for section in cfg.sections():
+            if section.startswith('group.') and ser in cfg.get(section, 'serial', fallback='').replace(' ','').split(','):
+                return cfg.getfloat(section, 'interval', fallback=self.minRefreshSeconds)
+        return self.minRefreshSeconds
+
+    def shutdown(self):
+        """
+        Stop the radio loops, output what they still had and close the outputs.
+        """
+        self.stopping.set()
+        if self.radio_proc is not None:
+            # keep taking cycles, the radio process can't exit before all it
+            # sent went through the queue
+            t_end=time.monotonic()+5
+            while self.radio_proc.is_alive() and time.monotonic()<t_end:
+                self.drain(0.1)
+            self.radio_proc.join(1)
+        else:
+            self.stop_radios()
+        self.drain(0.1)
+        if self.archive is not None:
+            self.archive.close()
+        if self.outFile is not None:
+            self.outFile.close()
+        if self.mqtt_output is not None:
+            self.mqtt_output.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.api_server is not None:
+            self.api_server.stop()
+        self.profiler.close()
+        if self.log_listener is not None:
+            self.log_listener.stop()
+
+    async def wait_until(self, due_ns):
+        """
+        Radio silence until due_ns, or until shutting down.
+        """
+        timeLeft=(due_ns-time.monotonic_ns())/1e9
+        while timeLeft>0 and not self.stopping.is_set():
+            await asyncio.sleep(min(timeLeft,1))
+            timeLeft=(due_ns-time.monotonic_ns())/1e9
+
+    def readiness(self, radio, section='radio'):
+        """
+        How the receive path learns about new frames: the nRF24 IRQ pin if one
+        is configured in the radio's section, the backend's own source if it
+        has one, otherwise a fast timer on the event loop.
+        """
+        irq_pin = self.cfg.getint(section, 'irq', fallback=None)
+        if irq_pin is not None:
+            return GpioIrq(radio, irq_pin, self.cfg.get(section, 'gpiochip', fallback='/dev/gpiochip0'))
+        return radio.readiness() or PollingReady(radio)
+
+    def register_inverter(self, inv_ser):
+        (type,radioKey,nrPakets)=ser_to_type(inv_ser)
+        self.mType[radioKey]=type
+        self.mFullSer[radioKey]=inv_ser
+        self.mState[radioKey]={}
+        self.mResponse[radioKey]=Response(inv_ser, type, nrPakets)
+
+    def process_cycle(self, inv_ser, response, dt, tx_channel, receivingChannels, receivingOrder):
+        """
+        Decode and output the fragments received from one inverter in one
+        polling cycle, collected in response (a hoymiles.reassembly.Response).
+        Complete responses are decoded only if their CRC-16 matches; the
+        fragments of incomplete ones are decoded as far as they go.
+        """
+        profiler=self.profiler
+        complete=response.crc_ok()
+        decoded={}
+        if complete or not response.complete():
+            t_decode=time.perf_counter()
+            decoded=response.decode(self.mState[inv_ser[4:]], profiler)
+            self.m_decode.observe(time.perf_counter()-t_decode, response.model)
+        else:
+            log.warning("CRC-16 error in response of %s", inv_ser)
+        mFileInfo={}
+        for n in sorted(response.fragments.keys()):
+            mFileInfo[n]=self.on_receive(**response.fragments[n], infos=decoded.get(n))
+        if self.publisher is not None and mFileInfo:
+            infos=[info for cmd in sorted(mFileInfo.keys()) for info in mFileInfo[cmd]["infos"]]
+            t0=profiler.start()
+            self.publisher.publish_cycle(inv_ser, infos, mFileInfo[min(mFileInfo)]['ts_unixtime'], complete)
+            profiler.stop('mqtt publish', t0)
+
+        if complete and (self.archive is not None or self.rollups is not None or self.snapshots is not None):
+            groups=emeter_groups(info for d in mFileInfo.values() for info in d["infos"])
+            values={}
+            for group in groups.values():
+                values.update(group)
+            t_rx=response.fragments[1]['time_rx'].timestamp()
+            if self.snapshots is not None:
+                self.snapshots.update(inv_ser, response.model, t_rx, groups)
+            if self.archive is not None:
+                t0=profiler.start()
+                self.archive.append(inv_ser, self.mType[inv_ser[4:]], int(t_rx*1e9), values)
+                self.archive.flush()
+                profiler.stop('archive write', t0)
+            if self.rollups is not None:
+                t0=profiler.start()
+                self.rollups.add(inv_ser, t_rx, values)
+                profiler.stop('rollup', t0)
+
+        if complete:
+            header = inv_ser+f" channel: {tx_channel:2d} rx: "+",".join([f"{b:02d}" for b in receivingChannels])+" order: "+",".join([f"{b:02x}" for b in receivingOrder])
+            lTiming=[]
+            mDC={}
+            mAC={}
+            for cmd in sorted(mFileInfo.keys()):
+                d=mFileInfo[cmd]
+                responseTime=d['response_time_ns']
+                lTiming.append(f"{responseTime:010d}")
+                for info in d["infos"]:
+                    if "name" in info:
+                        if "emeter" in info["name"]:
+                            if "dc" in info["name"]:
+                                for key in sorted(info.keys()):
+                                    if key!="name" and not key.startswith("_"):
+                                        mDC[key]=info[key]
+                            else:
+                                for key in sorted(info.keys()):
+                                    if key!="name" and not key.startswith("_"):
+                                        newKey=key.replace("0/","")
+                                        mAC[newKey]=info[key]
+
+
+            header=header+" ts: "+",".join(lTiming)+" "
+
+            infoAC=""
+            for key in mAC:
+                infoAC=infoAC+key+": "+str(mAC[key])+" "
+            infoDC=""
+            for key in mDC:
+                infoDC=infoDC+key+": "+str(mDC[key])+" "
+
+            message=header+infoAC+infoDC.strip()
+            log.info("%s", message, extra={'fields': {'event': 'cycle', 'inverter': inv_ser, 'start': dt, 'ac': mAC, 'dc': mDC}})
+            if self.outFile is not None:
+                t0=profiler.start()
+                self.outFile.write(f"{dt} {message}")
+                profiler.stop('file write', t0)
+
+    async def radio_loop(self, name, radio):
+        """
+        Keep receiving on channel 3. Every once in a while, transmit a request
+        to one of the inverters of this radio's shard on channel 40, now and
+        then to one of another radio (see hoymiles.shards). The fragments
+        received go to the output as they are, with the cycle's statistics.
+        """
+        profiler=self.profiler
+        shards=self.shards
+        stopping=self.stopping
+        capture=self.capture
+        ring=self.ring
+
+        sched=Scheduler()
+        frames=FrameBuilder(self.dtu_ser)
+        # per radio: another radio may probe the same inverter at the same time
+        responses={}
+        rtts={}
+        for inv_ser in self.l_inv_ser:
+            (model,radioKey,nrPakets)=ser_to_type(inv_ser)
+            responses[inv_ser]=Response(inv_ser, model, nrPakets)
+            frames.add(inv_ser)
+            rtts[inv_ser]=RttEstimator()
+        shard_version=None
+        daylight=self.daylight
+        dawn=False      # woken up, waiting for the first answer
+
+        ctr = 1
+
+        ts = int(time.time())  # see what happens if we always send one and the same (constant) time!
+
+        rx_channels = [3,23,61,75,83]
+        #rx_channels = [3,75]  # in case of tx channel 40 this leads to basically no packet loss for me
+        rx_channel = rx_channels[0]
+        hopDwell = 0.005
+        # learn which RX channels deliver, per inverter and TX channel, or sweep
+        # the start channel with a fixed dwell
+        hopping = self.cfg.get(name, 'hopping', fallback='learned')
+        planner = HopPlanner(rx_channels, hopDwell) if hopping=='learned' else None
+        # transmissions of the request and of every refetch before a cycle is given up
+        tries = self.cfg.getint(name, 'tries', fallback=TRIES)
+
+        tx_channels = [40]
+        #tx_channels = [3,23,61,75,40]
+        tx_channel_id = 0
+        tx_channel = tx_channels[tx_channel_id]
+
+        radio.setChannel(rx_channel)
+        radio.configure(pa_level='low')
+        #radio.configure(pa_level='max')
+        radio.openReadingPipe(1,esb_addr(self.dtu_ser))
+
+        engine=RxEngine(radio, self.readiness(radio, name), profiler)
+        engine.start()
+        engine.tune(rx_channel)
+
+        while not stopping.is_set():
+            if shards.version != shard_version:
+                shard_version = shards.version
+                owned = shards.owned(name)
+                for inv_ser in owned:
+                    if inv_ser not in sched.inverters:
+                        sched.add(inv_ser, self.polling_interval(inv_ser))
+                for inv_ser in [s for s in sched.inverters if s not in owned]:
+                    sched.remove(inv_ser)
+
+            if daylight is not None:
+                phase, value = daylight.phase(time.time())
+                if phase == 'night':
+                    log.info("%s off until %s", name, datetime.fromtimestamp(value).strftime("%H:%M"),
+                        extra={'fields': {'event': 'night', 'radio': name, 'until': value}})
+                    radio.powerDown()
+                    await self.wait_until(time.monotonic_ns()+int((value-time.time())*1e9))
+                    if stopping.is_set():
+                        break
+                    radio.powerUp()
+                    engine.tune(rx_channels[0])
+                    sched.scale = 1
+                    sched.wake()
+                    dawn = True
+                    log.info("%s on again", name, extra={'fields': {'event': 'dawn', 'radio': name}})
+                    continue
+                sched.scale = value
+
+            probe = shards.probe(name)
+            if probe is not None:
+                inv_ser = probe
+            else:
+                top = sched.next()
+                if top is None:
+                    # nothing (left) to poll for this radio
+                    await self.wait_until(time.monotonic_ns()+int(1e9))
+                    continue
+                inv_ser, due_ns = top
+                t0=profiler.start()
+                await self.wait_until(due_ns)
+                profiler.stop('schedule wait', t0)
+                if stopping.is_set():
+                    break
+
+            radio.flush_rx()
+            radio.flush_tx()
+            response = responses[inv_ser]
+            response.reset()
+
+            tx_channel_id = tx_channel_id + 1
+            if tx_channel_id >= len(tx_channels):
+                tx_channel_id = 0
+            tx_channel = tx_channels[tx_channel_id]
+
+            if planner is not None:
+                hop_channels, hop_dwell = planner.plan(inv_ser, tx_channel)
+            else:
+                hop_channels, hop_dwell = rx_channels[ctr % len(rx_channels):] + rx_channels[:ctr % len(rx_channels)], hopDwell
+
+            # Transmit
+            t_cycle = profiler.start()
+            ts = int(time.time())
+            payload = frames.request(inv_ser, ts)
+            dt = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+            tx_status = engine.transmit(tx_channel, frames.esb_addr(inv_ser), payload)  # will always yield 'True' because auto-ack is disabled
+            t_last_tx = time.monotonic_ns()
+            profiler.span('tx', t_cycle, t_last_tx)
+            if capture is not None:
+                capture.tx(t_last_tx, tx_channel, inv_ser, payload)
+            if ring is not None:
+                ring.tx(t_last_tx, tx_channel, inv_ser, payload)
+            requested = response.total()
+            refetches = 0
+            engine.exposure()
+            engine.hop(hop_channels, hop_dwell)
+
+            if log.isEnabledFor(logging.DEBUG):
+                # the request buffer is reused, log a copy
+                log.debug("Transmit %8d:   channel %2d len=%3d ack=%-7s   | %s to: %s",
+                    ctr, tx_channel, len(payload), tx_status, Hex(bytes(payload)), inv_ser)
+            ctr = ctr + 1
+
+            # Receive loop: wakes up on every frame; what to refetch and when is
+            # up to the selective repeat logic, within one second at most
+            t_end = time.monotonic_ns()+1e9*1
+            arq = SelectiveRepeat(response, rtts[inv_ser], t_last_tx/1e9, tries=tries)
+            receivingChannels=[]
+            receivingOrder=[]
+            receptions=[]
+            while (t_now:=time.monotonic_ns()) < t_end:
+                if response.complete():
+                    log.debug("all packets received count %d", len(response.fragments))
+                    break
+                resend, t_wake = arq.due(t_now/1e9)
+                if t_wake is None:
+                    missing = response.missing()
+                    log.info("%s giving up, missing %s", inv_ser,
+                        ",".join(str(ii+1) for ii in range(response.total()) if missing>>ii & 1),
+                        extra={'fields': {'event': 'give up', 'inverter': inv_ser, 'missing': missing}})
+                    break
+                for ii in resend:
+                    if ii==REQUEST:
+                        payload = frames.request(inv_ser, ts)
+                        log.debug("no answer, repeating request on %d", tx_channel)
+                        requested += response.total()
+                    else:
+                        payload = frames.refetch(inv_ser, ii)
+                        log.debug("missing %d sending %d byes on %d is %s", ii, len(payload), tx_channel, Hex(payload))
+                        refetches += 1
+                        requested += 1
+                    t0=profiler.start()
+                    tx_status = engine.transmit(tx_channel, frames.esb_addr(inv_ser), payload)
+                    t_last_tx=time.monotonic_ns()  # later packets could appear earlier..
+                    profiler.span('tx' if ii==REQUEST else 'refetch', t0, t_last_tx)
+                    arq.transmitted(ii, t_last_tx/1e9)
+                    if capture is not None:
+                        capture.tx(t_last_tx, tx_channel, inv_ser, payload)
+                    if ring is not None:
+                        ring.tx(t_last_tx, tx_channel, inv_ser, payload)
+
+                rx = await engine.receive(max(0, min(t_end, t_wake*1e9)-time.monotonic_ns())/1e9)
+                if rx is None:
+                    continue
+                payload, rx_channel = rx
+                t_rx = time.monotonic_ns()
+                size = len(payload)
+                if capture is not None:
+                    capture.rx(t_rx, tx_channel, rx_channel, inv_ser, payload)
+                if ring is not None:
+                    ring.rx(t_rx, tx_channel, rx_channel, inv_ser, payload)
+                if size>=10 and payload[0]==0x95:
+                    receivingChannels.append(rx_channel)
+                    receivingOrder.append(payload[9])
+                    receptions.append((rx_channel, t_rx-t_last_tx))
+                    if response.add(payload, ch_rx=rx_channel, ch_tx=tx_channel,
+                                    time_rx=datetime.now(), latency=t_rx-t_last_tx):
+                        arq.received(payload[9] & 0x7f, t_rx/1e9)
+            engine.stop_hopping()
+            if planner is not None:
+                planner.update(inv_ser, tx_channel, engine.exposure(), receptions)
+
+            profiler.stop('receive', t_cycle)
+
+            # Process receive buffer outside the radio loop
+            stats = {'lag_ns': sched.lag_ns if probe is None else None, 'requested': requested,
+                     'refetches': refetches, 'receptions': receptions}
+            self.cycles.put((name, inv_ser, list(response.fragments.values()), dt, tx_channel,
+                             receivingChannels, receivingOrder, stats))
+
+            moved = shards.report(name, inv_ser, len(response.fragments)/response.total())
+            if moved is not None:
+                log.info("inverter %s moves to %s", inv_ser, moved)
+            if probe is None:
+                sched.done(inv_ser, len(response.fragments)>0)
+            if dawn and response.fragments:
+                # the first inverter is up, the others won't be far behind
+                dawn = False
+                sched.wake()
+
+            if capture is not None:
+                capture.flush()
+
+        engine.stop()
+
+    def run_radios(self):
+        """
+        Start a thread with a radio loop for every radio.
+        """
+        if self.args['capture']!="":
+            self.capture=CaptureWriter(self.args['capture'])
+        for name, radio in self.radios.items():
+            thread=threading.Thread(target=asyncio.run, args=(self.radio_loop(name, radio),), name=name, daemon=True)
+            self.radio_threads.append(thread)
+            thread.start()
+
+    def stop_radios(self):
+        """
+        Wait for the radio loops to end after stopping was set, power down the
+        radios.
+        """
+        for thread in self.radio_threads:
+            thread.join(2)
+        for radio in self.radios.values():
+            radio.powerDown()
+        if self.capture is not None:
+            self.capture.close()
+
+    def radio_main(self):
+        """
+        The radio process: radio loops only, until the main process sets stopping.
+        """
+        self.radio_proc=None     # set by the parent before forking; we are it
+        # Ctrl-C goes to the whole process group; the main process stops us
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.log_listener=logs.setup(self.log_level, self.log_format)
+        if self.args['profile'] is not None:
+            trace=self.args['profile']
+            if trace:
+                root, ext=os.path.splitext(trace)
+                trace=f"{root}-radio{ext}"
+            self.profiler=Profiler(trace=trace or None)
+        self.run_radios()
+        while any(thread.is_alive() for thread in self.radio_threads):
+            self.radio_threads[0].join(1)
+            self.profiler.report()
+        self.stop_radios()
+        self.profiler.close()
+        self.log_listener.stop()
+
+    def start_radios(self):
+        """
+        Start the radio loops: in a forked process, which run() does before
+        open_outputs(), so that no thread of the outputs (logging, MQTT,
+        HTTP servers, file flusher) holds a lock or socket the child would
+        inherit; or in threads of this process, after open_outputs().
+        """
+        if self.radio_process:
+            if threading.active_count()>1:
+                raise RuntimeError("the radio process must be forked before any thread is started")
+            # don't hand what's buffered to the child, it would print it again
+            sys.stdout.flush()
+            self.radio_proc=self.mp.Process(target=self.radio_main, name='radio')
+            self.radio_proc.start()
+        else:
+            self.run_radios()
+
+    def dump_frames(self, signum=None, frame=None):
+        """
+        SIGUSR1: write the frame ring buffer to a capture file in dump_dir
+        (the radio process does this, if there is one).
+        """
+        if self.radio_proc is not None:
+            os.kill(self.radio_proc.pid, signal.SIGUSR1)
+            return
+        if self.ring is None:
+            log.warning("no frames kept, set ring in [logging]")
+            return
+        path=os.path.join(self.dump_dir, datetime.now().strftime("frames-%Y%m%d-%H%M%S.cap"))
+        log.info("dumped %d frames to %s", self.ring.dump(path), path)
+
+    def radios_alive(self):
+        if self.radio_proc is not None:
+            return self.radio_proc.is_alive()
+        return any(thread.is_alive() for thread in self.radio_threads)
+
+    def output_cycle(self, name, inv_ser, fragments, dt, tx_channel, receivingChannels, receivingOrder, stats):
+        """
+        Reassemble, account for, decode and output a polling cycle of a radio loop.
+        """
+        response=self.mResponse[inv_ser[4:]]
+        response.reset()
+        for details in fragments:
+            response.add(**details)
+        self.m_polls.inc(inv_ser)
+        self.m_cycles.inc(inv_ser, 'complete' if response.complete() else 'partial' if response.fragments else 'empty')
+        self.m_requested.inc(inv_ser, amount=stats['requested'])
+        # repeated requests and refetches ask for the same fragments again
+        self.m_expected.inc(inv_ser, amount=response.total())
+        self.m_received.inc(inv_ser, amount=len(response.fragments))
+        if stats['refetches']:
+            self.m_refetches.inc(inv_ser, amount=stats['refetches'])
+        for rx_channel, latency in stats['receptions']:
+            self.m_rx_frames.inc(rx_channel)
+            self.m_latency.observe(latency/1e9, inv_ser)
+        if stats['lag_ns'] is not None:
+            self.m_lag.set(stats['lag_ns']/1e9, name)
+        self.process_cycle(inv_ser, response, dt, tx_channel, receivingChannels, receivingOrder)
+
+    def drain(self, wait):
+        """
+        Output the cycles in the queue until there was none for wait seconds.
+        """
+        while True:
+            try:
+                cycle=self.cycles.get(timeout=wait)
+            except queue.Empty:
+                return
+            self.output_cycle(*cycle)
+
+    def output_loop(self):
+        """
+        Output the polling cycles of all radios, until the end time or until
+        all radio loops ended.
+        """
+        while True:
+            try:
+                cycle=self.cycles.get(timeout=30)
+            except queue.Empty:
+                cycle=None
+            if cycle is not None:
+                t0=self.profiler.start()
+                self.output_cycle(*cycle)
+                self.profiler.stop('process', t0)
+                self.profiler.report()
+            HHMM=datetime.now().strftime("%H:%M")
+            if HHMM==self.endTime:
+                log.info("shutting down")
+                return
+            if cycle is None and not self.radios_alive():
+                return
+
+    async def replay(self, fileName, speed):
+        """
+        Feed a capture file through the same processing as radio_loop: every
+        0x80 request starts a new cycle, refetches and responses belong to it.
+        :param speed: replay speed factor, or None to go as fast as possible
+        """
+        reader=CaptureReader(fileName)
+        cycle=None
+        t_first=None
+        t_start=time.monotonic_ns()
+        nFrames=0
+
+        def finish(cycle):
+            inv_ser, response, dt, tx_channel, receivingChannels, receivingOrder = cycle
+            t0=self.profiler.start()
+            self.process_cycle(inv_ser, response, dt, tx_channel, receivingChannels, receivingOrder)
+            self.profiler.stop('process', t0)
+
+        for rec in reader:
+            if rec.kind==KIND_SEGMENT:
+                # a later run appended to the file: its last cycle ended with
+                # the run before, and the time between the runs is not replayed
+                if cycle is not None:
+                    finish(cycle)
+                    cycle=None
+                t_first=None
+                t_start=time.monotonic_ns()
+                continue
+            nFrames+=1
+            if speed is not None:
+                if t_first is None:
+                    t_first=rec.t_ns
+                delay=(t_start+(rec.t_ns-t_first)/speed-time.monotonic_ns())/1e9
+                if delay>0:
+                    await asyncio.sleep(delay)
+            if rec.serial[4:] not in self.mType:
+                self.register_inverter(rec.serial)
+            time_rx=datetime.fromtimestamp(reader.wall_ns(rec.t_ns)/1e9)
+            if rec.kind==KIND_TX:
+                if len(rec.payload)>9 and rec.payload[9]==0x80:
+                    if cycle is not None:
+                        finish(cycle)
+                    response=self.mResponse[rec.serial[4:]]
+                    response.reset()
+                    cycle=(rec.serial, response, time_rx.strftime("%Y-%m-%d %H:%M:%S.%f"), rec.ch_tx, [], [])
+                t_last_tx=rec.t_ns
+            elif rec.kind==KIND_RX and cycle is not None:
+                p=rec.payload
+                if len(p)>=10 and p[0]==0x95:
+                    cycle[1].add(p, ch_rx=rec.ch_rx, ch_tx=rec.ch_tx,
+                                 time_rx=time_rx, latency=rec.t_ns-t_last_tx)
+                    cycle[4].append(rec.ch_rx)
+                    cycle[5].append(p[9])
+        if cycle is not None:
+            finish(cycle)
+        dt=(time.monotonic_ns()-t_start)/1e9
+        log.info("replayed %d frames in %.3f s", nFrames, dt)
+
+    def run(self):
+        """
+        Replay, or poll until the end time; the outputs are closed when done.
+        """
+        if self.replayName!="":
+            self.open_outputs()
+            asyncio.run(self.replay(self.replayName, None if self.replaySpeed=="max" else float(self.replaySpeed)))
+            self.shutdown()
+            return
+
+        for inv_ser in self.l_inv_ser:
+            self.register_inverter(inv_ser)
+            print_addr(inv_ser)
+        print_addr(self.dtu_ser)
+
+        self.open_radios()
+
+        signal.signal(signal.SIGUSR1, self.dump_frames)
+        if self.radio_process:
+            self.start_radios()
+            self.open_outputs()
+        else:
+            self.open_outputs()
+            self.start_radios()
+        self.output_loop()
+        self.shutdown()
+
+
+def main(argv=None):
+    """
+    Console entry point (`ahoy`): `ahoy [options]` polls the inverters,
+    `ahoy analyze ...` reports over an archive (see hoymiles.analyze).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['analyze']:
+        from .analyze import main as analyze
+        return analyze(argv[1:])
+
+    app = Ahoy(parse_args(argv))
+    try:
+        app.run()
+    except KeyboardInterrupt:
+        print(" Keyboard Interrupt detected. Exiting...")
+        app.shutdown()
+    return 0
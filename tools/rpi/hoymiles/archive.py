@@ -0,0 +1,248 @@
+"""
+Columnar archive of decoded readings.
+
+Every inverter gets a directory, every day a segment file in it:
+
+    <archive>/<serial>/<YYYY-MM-DD>.ahc     rows of fixed width
+    <archive>/<serial>/<YYYY-MM-DD>.idx     time index
+
+A segment starts with a header (magic, header size, row size, JSON list of
+[key, type] columns), padded to a multiple of 64 bytes. Then follows one
+row per completed polling cycle: the wall clock time as int64 ns, then one
+little endian float32 ('f') or uint32 ('I', energy counters) per column.
+Missing values are NaN or 0xffffffff; counters that do not fit below
+0xffffffff are written as missing. Files are append-only; rows arrive in
+time order. A writer reopening a segment (after a restart, or a crash in
+the middle of a row) first cuts it and its index back to whole rows.
+
+The index holds (time ns, row number) for every INDEX_EVERY-th row, so a
+reader can mmap the segment, find a time range with a bisect over the index
+and a short scan, and use the rows in place (as a NumPy structured array,
+or through struct) without any parsing.
+"""
+import os
+import json
+import mmap
+import struct
+import bisect
+from datetime import datetime
+
+from .decoders import measurement_keys
+
+MAGIC = b'AHOYARC1'
+_head = struct.Struct('<8sHHH')
+_index = struct.Struct('<qQ')
+_ts = struct.Struct('<q')
+
+INDEX_EVERY = 64
+MISSING_UINT = 0xffffffff
+NAN = float('nan')
+
+
+def column_type(key):
+    return 'I' if key.endswith('energy') else 'f'
+
+
+def segment_name(ts_ns):
+    return datetime.fromtimestamp(ts_ns / 1e9).strftime('%Y-%m-%d')
+
+
+class SegmentWriter:
+    def __init__(self, path, keys):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rb') as f:
+                columns, header_size, self.row_size = _read_header(f.read(4096), path)
+            self.keys = [k for k, t in columns]
+            self.types = ''.join(t for k, t in columns)
+        else:
+            self.keys = list(keys)
+            self.types = ''.join(column_type(k) for k in self.keys)
+        self._row = struct.Struct('<q' + self.types)
+        self.row_size = self._row.size
+        self._missing = tuple(MISSING_UINT if t == 'I' else NAN for t in self.types)
+        self._file = open(path, 'ab')
+        self._idx = open(path[:-4] + '.idx', 'ab')
+        if not exists:
+            schema = json.dumps([[k, t] for k, t in zip(self.keys, self.types)]).encode()
+            header_size = -(-(_head.size + len(schema)) // 64) * 64
+            head = _head.pack(MAGIC, header_size, self.row_size, len(schema)) + schema
+            self._file.write(head.ljust(header_size, b'\0'))
+            self._file.flush()
+            header_size = self._file.tell()
+        self._header_size = header_size
+        self.rows = (self._file.tell() - header_size) // self.row_size
+        if exists:
+            self._trim()
+
+    def _trim(self):
+        """
+        Drop a partly written last row and the index entries past the rows.
+        """
+        size = self._header_size + self.rows * self.row_size
+        if self._file.tell() > size:
+            self._file.truncate(size)
+        idx_size = self._idx.tell() // _index.size * _index.size
+        if idx_size:
+            with open(self._idx.name, 'rb') as f:
+                entries = f.read(idx_size)
+            while idx_size and _index.unpack_from(entries, idx_size - _index.size)[1] >= self.rows:
+                idx_size -= _index.size
+        if self._idx.tell() > idx_size:
+            self._idx.truncate(idx_size)
+
+    def append(self, ts_ns, values):
+        row = [ts_ns]
+        for key, missing in zip(self.keys, self._missing):
+            v = values.get(key)
+            if v is None:
+                v = missing
+            elif missing == MISSING_UINT:
+                # out of range (or NaN) would wrap, or read as missing anyway
+                v = int(v) if 0 <= v < MISSING_UINT else MISSING_UINT
+            row.append(v)
+        self._file.write(self._row.pack(*row))
+        if self.rows % INDEX_EVERY == 0:
+            self._idx.write(_index.pack(ts_ns, self.rows))
+        self.rows += 1
+
+    def flush(self):
+        self._file.flush()
+        self._idx.flush()
+
+    def close(self):
+        self._file.close()
+        self._idx.close()
+
+
+class ArchiveWriter:
+    """
+    Appends one row per inverter and completed cycle, switching to a new
+    segment at midnight (local time).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._segments = {}     # serial -> (day, SegmentWriter)
+
+    def append(self, serial, model, ts_ns, values):
+        day = segment_name(ts_ns)
+        current = self._segments.get(serial)
+        if current is None or current[0] != day:
+            if current is not None:
+                current[1].close()
+            folder = os.path.join(self.directory, serial)
+            os.makedirs(folder, exist_ok=True)
+            keys = measurement_keys(model) or sorted(values)
+            current = self._segments[serial] = (day, SegmentWriter(os.path.join(folder, day + '.ahc'), keys))
+        current[1].append(ts_ns, values)
+
+    def flush(self):
+        for day, seg in self._segments.values():
+            seg.flush()
+
+    def close(self):
+        for day, seg in self._segments.values():
+            seg.close()
+        self._segments = {}
+
+
+def _read_header(data, path):
+    magic, header_size, row_size, schema_size = _head.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not an ahoy archive segment')
+    columns = json.loads(bytes(data[_head.size:_head.size + schema_size]))
+    return [tuple(c) for c in columns], header_size, row_size
+
+
+class Segment:
+    """
+    Read access to one segment through mmap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.columns, self.header_size, self.row_size = _read_header(self._mm, path)
+        self.keys = [k for k, t in self.columns]
+        self.row = struct.Struct('<q' + ''.join(t for k, t in self.columns))
+        self.rows = (len(self._mm) - self.header_size) // self.row_size
+        idx_path = path[:-4] + '.idx'
+        self._index = []
+        if os.path.exists(idx_path):
+            with open(idx_path, 'rb') as f:
+                self._index = [e for e in _index.iter_unpack(f.read())]
+
+    def close(self):
+        self._mm.close()
+
+    def ts(self, row):
+        return _ts.unpack_from(self._mm, self.header_size + row * self.row_size)[0]
+
+    def _first_row_at(self, ts_ns):
+        # bisect the sparse index, then the rows of one index block
+        i = bisect.bisect_right([e[0] for e in self._index], ts_ns) - 1
+        lo = self._index[i][1] if i >= 0 else 0
+        hi = self._index[i + 1][1] if i + 1 < len(self._index) else self.rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts(mid) < ts_ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def row_range(self, t0_ns=None, t1_ns=None):
+        """
+        :return: (first, end) row numbers of t0_ns <= time < t1_ns
+        """
+        first = 0 if t0_ns is None else self._first_row_at(t0_ns)
+        end = self.rows if t1_ns is None else self._first_row_at(t1_ns)
+        return first, max(first, end)
+
+    def iter_rows(self, t0_ns=None, t1_ns=None):
+        """
+        Rows as tuples (time ns, value, ...) in column order.
+        """
+        first, end = self.row_range(t0_ns, t1_ns)
+        view = memoryview(self._mm)[self.header_size + first * self.row_size:
+                                    self.header_size + end * self.row_size]
+        return self.row.iter_unpack(view)
+
+    def to_numpy(self, t0_ns=None, t1_ns=None):
+        """
+        Rows as a NumPy structured array ('ts' plus one field per key),
+        backed by the mmap without copying.
+        """
+        import numpy as np
+        first, end = self.row_range(t0_ns, t1_ns)
+        dtype = np.dtype([('ts', '<i8')] + [(k, '<f4' if t == 'f' else '<u4') for k, t in self.columns])
+        return np.frombuffer(self._mm, dtype=dtype, count=end - first,
+                             offset=self.header_size + first * self.row_size)
+
+
+def segment_rows(path):
+    """
+    Number of complete rows in a segment, from its header and size.
+    """
+    with open(path, 'rb') as f:
+        columns, header_size, row_size = _read_header(f.read(4096), path)
+        return (os.fstat(f.fileno()).st_size - header_size) // row_size
+
+
+def segments(directory, serial, t0_ns=None, t1_ns=None):
+    """
+    Paths of the segments of one inverter that may hold rows in the range,
+    in time order.
+    """
+    folder = os.path.join(directory, serial)
+    if not os.path.isdir(folder):
+        return []
+    first = None if t0_ns is None else segment_name(t0_ns)
+    last = None if t1_ns is None else segment_name(t1_ns)
+    return [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+            if name.endswith('.ahc')
+            and (first is None or name[:-4] >= first)
+            and (last is None or name[:-4] <= last)]
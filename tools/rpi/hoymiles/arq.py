@@ -0,0 +1,150 @@
+"""
+Selective repeat retransmission of response fragments.
+
+RttEstimator follows an inverter's response times the way TCP does
+(smoothed round trip time and its mean deviation, RFC 6298), plus the gap
+between consecutive fragments of a response. It only learns from
+unambiguous samples: the first fragment after a request or refetch that
+was sent once (Karn's rule).
+
+SelectiveRepeat drives one polling cycle. After the 0x80 request it waits
+until the whole response should have arrived, then asks for every missing
+fragment (including a missing tail, see Response.missing()), up to
+`window` at a time, each with its own timeout. A request without any
+answer is repeated, with the same number of tries as a fragment; the
+cycle is given up as soon as the request or a fragment has used up its
+tries, so a cycle that cannot complete does not wait for the overall
+deadline. The timeouts do not back off: a lost fragment is mostly a
+fragment sent on another channel than the one listened on, not a
+congested link, and waiting longer only leaves fewer tries for the cycle.
+"""
+
+REQUEST = 0     # "fragment number" of the full 0x80 request
+TRIES = 20
+
+
+class RttEstimator:
+    def __init__(self, rtt=0.01, gap=0.005, min_rto=0.005, max_rto=0.25):
+        self.srtt = None
+        self.rttvar = None
+        self.initial = rtt
+        self.gap = gap
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) / 4
+            self.srtt += (rtt - self.srtt) / 8
+
+    def sample_gap(self, gap):
+        self.gap += (gap - self.gap) / 8
+
+    def rto(self):
+        """
+        Time to wait for the first fragment of an answer, in seconds.
+        """
+        if self.srtt is None:
+            return min(self.max_rto, 3 * self.initial)
+        return min(self.max_rto, max(self.min_rto, self.srtt + 4 * self.rttvar))
+
+    def response_time(self, fragments):
+        """
+        Time to wait for a whole response of `fragments` fragments.
+        """
+        return self.rto() + (fragments - 1) * self.gap
+
+
+class SelectiveRepeat:
+    def __init__(self, response, rtt, t_request, window=3, tries=TRIES):
+        """
+        :param response: the inverter's hoymiles.reassembly.Response, already reset
+        :param rtt: the inverter's RttEstimator
+        :param t_request: time (s) the 0x80 request was sent
+        :param tries: transmissions of the request, and of every refetch,
+                      before the cycle is given up
+        """
+        self.response = response
+        self.rtt = rtt
+        self.window = window
+        self.tries = tries
+        self.sent = {REQUEST: [t_request]}      # fragment number -> send times
+        self.failed = False
+        self._last_rx = None                    # (fragment number, time) within the first burst
+
+    def due(self, now):
+        """
+        What to send now and when to look again.
+        :return: (fragment numbers to (re)send, REQUEST for the full request,
+                  time of the next check); the time is None if the cycle
+                  is complete or given up
+        """
+        response = self.response
+        if response.complete():
+            return [], None
+        rtt = self.rtt
+        t_request = self.sent[REQUEST][-1]
+        if not response.fragments:
+            wait = t_request + rtt.response_time(response.total())
+            if now < wait:
+                return [], wait
+            if len(self.sent[REQUEST]) >= self.tries:
+                self.failed = True
+                return [], None
+            return [REQUEST], now + rtt.response_time(response.total())
+
+        # fragments of the first burst may still be on their way
+        burst_end = t_request + rtt.response_time(response.total())
+        if now < burst_end:
+            return [], burst_end
+        send = []
+        wake = None
+        outstanding = 0
+        missing = response.missing()
+        n = 0
+        while missing:
+            n += 1
+            bit = missing & 1
+            missing >>= 1
+            if not bit:
+                continue
+            sent = self.sent.get(n)
+            if sent:
+                deadline = sent[-1] + rtt.rto()
+                if now < deadline:
+                    outstanding += 1
+                    wake = deadline if wake is None else min(wake, deadline)
+                    continue
+                if len(sent) >= self.tries:
+                    self.failed = True
+                    return [], None
+            if outstanding + len(send) < self.window:
+                send.append(n)
+        if send:
+            # the answers to a burst of refetches come back about a gap apart
+            deadline = now + rtt.rto() + (len(send) - 1) * rtt.gap
+            wake = deadline if wake is None else min(wake, deadline)
+        return send, wake
+
+    def transmitted(self, n, t):
+        self.sent.setdefault(n, []).append(t)
+
+    def received(self, n, t):
+        """
+        A new fragment n arrived at time t (s): learn from unambiguous samples.
+        """
+        sent = self.sent.get(n)
+        if sent is not None and n != REQUEST:
+            if len(sent) == 1:
+                self.rtt.sample(t - sent[0])
+            return
+        if len(self.sent[REQUEST]) == 1 and len(self.sent) == 1:
+            # part of the first burst
+            if self._last_rx is None:
+                self.rtt.sample(max(0.0, t - self.sent[REQUEST][0] - (n - 1) * self.rtt.gap))
+            elif n == self._last_rx[0] + 1:
+                self.rtt.sample_gap(t - self._last_rx[1])
+            self._last_rx = (n, t)
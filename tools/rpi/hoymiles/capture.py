@@ -0,0 +1,139 @@
+"""
+Binary capture of radio traffic.
+
+A capture file starts with an 24 byte header (magic, wall clock and
+monotonic clock at the start of the capture, both in ns) and then holds one
+record per TX or RX frame:
+
+    <H  length of the frame
+    <Q  monotonic time in ns
+    <B  kind (KIND_TX, KIND_RX, KIND_SEGMENT)
+    <B  TX channel
+    <B  RX channel (NO_CHANNEL for TX frames)
+    <Q  inverter serial number (as decimal integer)
+        frame bytes
+
+Records are appended through a buffered file; flush() or close() makes
+them durable. A run appending to an existing capture starts with a
+KIND_SEGMENT record instead of the header: its payload is wall clock and
+monotonic clock at the start of that run (<QQ), and the times of the
+records after it are relative to those. The monotonic clocks of two runs
+have nothing to do with each other (there may have been a reboot), so
+readers take the anchors of the segment a record is in.
+
+FrameRing keeps only the most recent frames in memory, and writes them to
+a capture file when asked to (dump()).
+"""
+import mmap
+import struct
+import time
+from collections import namedtuple, deque
+
+MAGIC = b'AHOYCAP1'
+_header = struct.Struct('<8sQQ')
+_record = struct.Struct('<HQBBBQ')
+_segment = struct.Struct('<QQ')
+
+KIND_TX = 0
+KIND_RX = 1
+KIND_SEGMENT = 2
+NO_CHANNEL = 0xff
+
+Record = namedtuple('Record', 't_ns kind ch_tx ch_rx serial payload')
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self._file = open(path, 'ab', buffering=64 * 1024)
+        self._pack = _record.pack
+        wall_ns, mono_ns = time.time_ns(), time.monotonic_ns()
+        if self._file.tell() == 0:
+            self._file.write(_header.pack(MAGIC, wall_ns, mono_ns))
+        else:
+            self._file.write(self._pack(_segment.size, mono_ns, KIND_SEGMENT, NO_CHANNEL, NO_CHANNEL, 0)
+                             + _segment.pack(wall_ns, mono_ns))
+
+    def tx(self, t_ns, ch_tx, serial, payload):
+        self._file.write(self._pack(len(payload), t_ns, KIND_TX, ch_tx, NO_CHANNEL, int(serial)) + payload)
+
+    def rx(self, t_ns, ch_tx, ch_rx, serial, payload):
+        self._file.write(self._pack(len(payload), t_ns, KIND_RX, ch_tx, ch_rx, int(serial)) + payload)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class FrameRing:
+    """
+    The last `size` frames, with the interface of CaptureWriter.
+    """
+
+    def __init__(self, size=1000):
+        self._frames = deque(maxlen=size)
+
+    def tx(self, t_ns, ch_tx, serial, payload):
+        # request buffers are reused, keep a copy
+        self._frames.append((t_ns, KIND_TX, ch_tx, NO_CHANNEL, serial, bytes(payload)))
+
+    def rx(self, t_ns, ch_tx, ch_rx, serial, payload):
+        self._frames.append((t_ns, KIND_RX, ch_tx, ch_rx, serial, bytes(payload)))
+
+    def __len__(self):
+        return len(self._frames)
+
+    def dump(self, path):
+        """
+        Write the frames to a new capture file.
+        :return: number of frames written
+        """
+        frames = list(self._frames)     # one C call, while radio threads go on appending
+        writer = CaptureWriter(path)
+        for t_ns, kind, ch_tx, ch_rx, serial, payload in frames:
+            if kind == KIND_TX:
+                writer.tx(t_ns, ch_tx, serial, payload)
+            else:
+                writer.rx(t_ns, ch_tx, ch_rx, serial, payload)
+        writer.close()
+        return len(frames)
+
+
+class CaptureReader:
+    """
+    Iterates over the records of a capture file. The KIND_SEGMENT record at
+    the start of every appended run is passed on too (time spans end
+    there), and wall_ns() follows the anchors of the segment the iteration
+    is in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, self.wall_start_ns, self.mono_start_ns = _header.unpack(f.read(_header.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an ahoy capture file')
+
+    def wall_ns(self, t_ns):
+        """
+        Wall clock time (ns since the epoch) of a record timestamp.
+        """
+        return self.wall_start_ns + t_ns - self.mono_start_ns
+
+    def __iter__(self):
+        size = _record.size
+        unpack = _record.unpack_from
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = _header.size
+            end = len(data)
+            while pos + size <= end:
+                length, t_ns, kind, ch_tx, ch_rx, serial = unpack(data, pos)
+                pos += size
+                if pos + length > end:
+                    break   # truncated last record, e.g. after a crash
+                payload = data[pos:pos + length]
+                if kind == KIND_SEGMENT:
+                    self.wall_start_ns, self.mono_start_ns = _segment.unpack(payload)
+                yield Record(t_ns, kind, ch_tx, ch_rx, str(serial), payload)
+                pos += length
@@ -0,0 +1,99 @@
+"""
+Learned RX channel hopping.
+
+For every inverter and TX channel, HopPlanner keeps
+- per RX channel: fragments received and seconds spent listening there,
+  i.e. an estimate of how many fragments per second that channel delivers
+- the delay between request and first fragment
+
+plan() orders the channels for the next request by a random draw from
+each channel's rate estimate (Thompson sampling: channels with good
+results come first most of the time, rarely tried ones still get a turn),
+gives each a dwell time in proportion to its rate, and stays on the first
+channel until the response is expected to start. update() feeds back what
+a polling cycle saw; older observations fade out with `decay`, so the
+planner follows changing conditions.
+"""
+import random
+import statistics
+from collections import deque
+
+
+class _Stats:
+    __slots__ = ('hits', 'time', 'latency', 'wait')
+
+    def __init__(self, channels):
+        self.hits = dict.fromkeys(channels, 0.0)
+        self.time = dict.fromkeys(channels, 0.0)
+        self.latency = deque(maxlen=32)     # seconds from request to first fragment
+        self.wait = (None, 0.0)             # (channel, seconds) spent waiting for the response
+
+
+class HopPlanner:
+    def __init__(self, channels, dwell=0.005, min_dwell=0.002, max_dwell=0.02, decay=0.95,
+                 prior_hits=1.0, prior_time=0.05, seed=None):
+        """
+        :param dwell: dwell time of a channel with average rate
+        :param prior_hits, prior_time: what every channel is assumed to have
+                                       delivered before anything is known
+        """
+        self.channels = list(channels)
+        self.dwell = dwell
+        self.min_dwell = min_dwell
+        self.max_dwell = max_dwell
+        self.decay = decay
+        self.prior_hits = prior_hits
+        self.prior_time = prior_time
+        self.rng = random.Random(seed)
+        self._stats = {}
+
+    def _get(self, serial, tx_channel):
+        stats = self._stats.get((serial, tx_channel))
+        if stats is None:
+            stats = self._stats[(serial, tx_channel)] = _Stats(self.channels)
+        return stats
+
+    def rates(self, serial, tx_channel):
+        """
+        Expected fragments per second of listening, per RX channel.
+        """
+        s = self._get(serial, tx_channel)
+        return {ch: (s.hits[ch] + self.prior_hits) / (s.time[ch] + self.prior_time) for ch in self.channels}
+
+    def plan(self, serial, tx_channel):
+        """
+        :return: (channels, dwells) for RxEngine.hop()
+        """
+        s = self._get(serial, tx_channel)
+        gamma = self.rng.gammavariate
+        draw = {ch: gamma(s.hits[ch] + self.prior_hits, 1.0) / (s.time[ch] + self.prior_time)
+                for ch in self.channels}
+        order = sorted(self.channels, key=draw.get, reverse=True)
+        mean = sum(draw.values()) / len(draw)
+        dwells = [min(self.max_dwell, max(self.min_dwell, self.dwell * draw[ch] / mean)) for ch in order]
+        wait = statistics.median(s.latency) if s.latency else 0.0
+        dwells[0] += wait
+        s.wait = (order[0], wait)
+        return order, dwells
+
+    def update(self, serial, tx_channel, exposure, received):
+        """
+        :param exposure: {rx channel: seconds listened} during the cycle
+        :param received: (rx channel, latency ns) of every fragment received
+        """
+        s = self._get(serial, tx_channel)
+        decay = self.decay
+        # nothing can arrive before the response starts, don't count that
+        # time against the first channel
+        first, wait = s.wait
+        for ch in self.channels:
+            t = exposure.get(ch, 0.0)
+            if ch == first:
+                t = max(0.0, t - wait)
+            s.hits[ch] *= decay
+            s.time[ch] = s.time[ch] * decay + t
+        for ch, latency in received:
+            if ch in s.hits:
+                s.hits[ch] += 1
+        if received:
+            s.latency.append(min(latency for ch, latency in received) / 1e9)
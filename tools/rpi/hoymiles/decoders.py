@@ -0,0 +1,300 @@
+"""
+Table driven decoders for the 0x95 response fragments.
+
+Every known (model, cmd) pair maps to a Layout: a precompiled struct.Struct
+for the data words starting at byte 10 of the fragment, plus one Field per
+word saying where the (scaled) value ends up. Values that can only be
+calculated from more than one fragment are handled by small hook functions
+working on the decoded infos and a per inverter state dict.
+
+decoders(model) gives the decode functions of one model by cmd byte, for
+callers that decode many fragments of the same inverter (see
+hoymiles.reassembly.Response); decode() looks them up each time.
+
+The output has the same shape on_receive has always produced: a list of
+dicts ('infos'), each carrying a 'name' ('emeter', 'emeter-dc', ...) and
+keys like '1/voltage' or '0/powerAC'. Keys starting with '_' are raw
+words whose meaning is not yet known.
+"""
+import struct
+import linecache
+from collections import namedtuple
+
+# group: name of the info dict the value goes to (None: dict without name)
+# name:  measurement name, e.g. 'voltage', or '_uk1' for unknown words
+# channel: 0 = AC side, 1..4 = DC inputs, None for unknown words
+# scale: divisor applied to the raw word, None to keep the raw integer
+Field = namedtuple('Field', 'group name channel scale', defaults=(None, None))
+
+DATA_OFFSET = 10
+
+
+def field_key(f):
+    return f.name if f.channel is None else f'{f.channel}/{f.name}'
+
+
+class Layout:
+    """
+    Precompiled decoder for one (model, cmd) fragment.
+
+    The decode method is generated once from the field table, so decoding a
+    fragment is a single unpack_from() plus dict displays, without walking
+    the table again for every packet (a loop over the fields is slower than
+    the if/elif chain this replaced, see benchmarks/bench_decoders.py). The
+    generated code is kept in `source` and shows up in tracebacks under
+    the file name '<decoder MODEL 0xCMD>'.
+    """
+
+    __slots__ = ('name', 'struct', 'groups', 'fields', 'hook', 'derived', 'source', 'decode')
+
+    def __init__(self, fmt, groups, fields, hook=None, derived=(), name='layout'):
+        self.name = name
+        self.struct = struct.Struct(fmt)
+        if len(fields) != len(self.struct.unpack(bytes(self.struct.size))):
+            raise ValueError(f'{fmt} does not match {len(fields)} fields')
+        self.fields = fields
+        self.hook = hook
+        self.derived = derived
+        self.groups = tuple(
+            (name, tuple((i, field_key(f), f.scale)
+                         for i, f in enumerate(fields) if f is not None and f.group == name))
+            for name in groups)
+        self.decode = self._compile()
+
+    def _compile(self):
+        words = ', '.join(f'w{i}' for i in range(len(self.fields)))
+        dicts = []
+        for name, fields in self.groups:
+            items = [] if name is None else [f"'name': {name!r}"]
+            for i, key, scale in fields:
+                items.append(f'{key!r}: w{i}' if scale is None else f'{key!r}: w{i} / {scale!r}')
+            dicts.append('{' + ', '.join(items) + '}')
+        lines = ['def decode(p, state):']
+        if words:
+            lines.append(f'    {words}, = _unpack(p, {DATA_OFFSET})')
+        lines.append(f"    infos = [{', '.join(dicts)}]")
+        if self.hook is not None:
+            lines.append('    _hook(infos, state)')
+        lines.append('    return infos')
+        self.source = '\n'.join(lines) + '\n'
+        filename = f'<decoder {self.name}>'
+        linecache.cache[filename] = (len(self.source), None, self.source.splitlines(True), filename)
+        namespace = {'_unpack': self.struct.unpack_from, '_hook': self.hook}
+        exec(compile(self.source, filename, 'exec'), namespace)
+        return namespace['decode']
+
+
+REGISTRY = {}
+_DECODERS = {}      # model -> {cmd: decode function}
+_NONE = {}
+
+
+def register(model, cmd, fmt, groups, fields, hook=None, derived=()):
+    """
+    :param derived: keys the hook adds to the infos, besides the fields
+    """
+    layout = REGISTRY[(model, cmd)] = Layout(fmt, groups, fields, hook, derived, f'{model} 0x{cmd:02x}')
+    _DECODERS.setdefault(model, {})[cmd] = layout.decode
+
+
+def decoders(model):
+    """
+    :return: {cmd: decode(p, state)} of a model, empty for unknown models
+    """
+    return _DECODERS.get(model, _NONE)
+
+
+def decode(model, cmd, p, state):
+    """
+    Decode one 0x95 fragment.
+    :param state: dict kept per inverter, for values spread over fragments
+    :return: list of info dicts, or None if (model, cmd) is unknown
+    """
+    fn = _DECODERS.get(model, _NONE).get(cmd)
+    if fn is None:
+        return None
+    return fn(p, state)
+
+
+def measurement_keys(model):
+    """
+    All published keys ('1/voltage', '0/powerAC', ...) the emeter groups of
+    a model can carry, sorted.
+    """
+    keys = set()
+    for (m, cmd), layout in REGISTRY.items():
+        if m != model:
+            continue
+        keys.update(field_key(f) for f in layout.fields
+                    if f is not None and f.group and 'emeter' in f.group and f.name[0] != '_')
+        keys.update(layout.derived)
+    return sorted(keys)
+
+
+def _unknown_words(group, last='_uk8'):
+    """
+    Eight raw words; the old decoders named the last one _uk9 for some
+    fragments, which stays as it is a published key.
+    """
+    return tuple(Field(group, f'_uk{i}') for i in range(1, 8)) + (Field(group, last),)
+
+
+def _ratio(a, b):
+    return a / b if b else 0
+
+
+# HM-600, HM-700, HM-800 (original petersilie ahoy.py with renaming)
+
+def _hm600_cmd1(infos, state):
+    dc, ac = infos
+    ac['0/powerAC'] = dc['1/power'] + dc['2/power']
+    state['ptotal1hb'] = ac['_uk8'] * 65536
+
+
+def _hm600_cmd2(infos, state):
+    infos[1]['1/totalenergy'] += state.get('ptotal1hb', 0)  # just 16 bit?, is info in 2/uknown8 ?
+
+
+register('HM-600', 0x01, '>HHHHHHHH', ('emeter-dc', 'emeter'), (
+    Field('emeter', '_uk1'),
+    Field('emeter-dc', 'voltage', 1, 10),
+    Field('emeter-dc', 'current', 1, 100),
+    Field('emeter-dc', 'power', 1, 10),
+    Field('emeter-dc', 'voltage', 2, 10),
+    Field('emeter-dc', 'current', 2, 100),
+    Field('emeter-dc', 'power', 2, 10),
+    Field('emeter', '_uk8'),
+), _hm600_cmd1, ('0/powerAC',))
+
+register('HM-600', 0x02, '>HLHHHHH', ('emeter', 'emeter-dc'), (
+    Field('emeter-dc', 'totalenergy', 1),
+    Field('emeter-dc', 'totalenergy', 2),
+    Field('emeter-dc', 'todaysenergy', 1),
+    Field('emeter-dc', 'todaysenergy', 2),
+    Field('emeter', 'voltageAC', 0, 10),
+    Field('emeter', 'frequency', 0, 100),
+    Field('emeter', 'powerAC', 0, 10),
+), _hm600_cmd2)
+
+# responses to 0x80 0x03 (garbled data)
+for _cmd, _name in ((0x03, 'error3'), (0x04, 'error4'), (0x05, 'error5'),
+                    (0x06, 'error7'), (0x07, 'error8')):
+    register('HM-600', _cmd, '>HHHHHHHH', (_name,), _unknown_words(_name))
+
+register('HM-600', 0x84, '>HHHHHHHH', ('error132',), _unknown_words('error132', '_uk9'))
+
+register('HM-600', 0x81, '>', ('error129',), ())
+
+register('HM-600', 0x83, '>HHHHHH', ('emeter',), (
+    Field('emeter', '_uk1'),
+    Field('emeter', 'currentAC', 0, 100),
+    Field('emeter', '_uk3'),
+    Field('emeter', 'temperature', 0, 10),
+    Field('emeter', '_uk5'),
+    Field('emeter', '_uk6'),
+))
+
+
+# HM-1200, HM-1500 (based on lumapu https://www.mikrocontroller.net/topic/525778?page=single#7038756)
+# voltages are guessed to be dc like with hm-600
+
+def _hm1200_cmd1(infos, state):
+    state['ptotal2hb'] = infos[0]['_uk8'] * 65536
+
+
+def _hm1200_cmd2(infos, state):
+    dd = infos[0]
+    dd['2/totalenergy'] += state.get('ptotal2hb', 0)
+    dd['3/voltage'] = _ratio(dd['3/power'], dd['3/current'])  # hack where is it
+    i4 = state['i4'] = dd['4/current']
+    p4 = state.get('p4', 0)
+    if i4 == 0:
+        dd['4/voltage'] = 0
+        dd['4/power'] = 0
+    elif p4 != 0:
+        dd['4/voltage'] = p4 / i4
+
+
+def _hm1200_cmd3(infos, state):
+    dd = infos[0]
+    p4 = state['p4'] = dd['4/power']  # where is voltage channel 2+3, 3 cannot be calculated with single message
+    i4 = state.get('i4', 0)
+    if p4 == 0:
+        dd['4/voltage'] = 0
+        dd['4/current'] = 0
+    elif i4 != 0:
+        dd['4/voltage'] = p4 / i4
+
+
+def _hm1200_cmd132(infos, state):
+    dd = infos[0]
+    dd['0/voltageAC'] = _ratio(dd['0/powerAC'], dd['0/currentAC'])
+
+
+register('HM-1200', 0x01, '>HHHHHHLH', ('emeter-dc',), (
+    Field('emeter-dc', '_uk1'),
+    Field('emeter-dc', 'voltage', 1, 10),
+    Field('emeter-dc', 'current', 1, 100),
+    Field('emeter-dc', 'current', 2, 10),
+    Field('emeter-dc', 'power', 1, 10),
+    Field('emeter-dc', 'power', 2, 10),
+    Field('emeter-dc', 'totalenergy', 1),
+    Field('emeter-dc', '_uk8'),
+), _hm1200_cmd1)
+
+register('HM-1200', 0x02, '>LHHHHHHH', ('emeter-dc',), (
+    Field('emeter-dc', 'totalenergy', 2),
+    Field('emeter-dc', 'todaysenergy', 1),
+    Field('emeter-dc', 'todaysenergy', 2),
+    Field('emeter-dc', 'voltage', 2, 10),
+    Field('emeter-dc', 'current', 3, 100),
+    Field('emeter-dc', 'current', 4, 10),
+    Field('emeter-dc', 'power', 3, 10),
+    Field('emeter-dc', '_uk8'),
+), _hm1200_cmd2, ('3/voltage', '4/voltage'))
+
+register('HM-1200', 0x03, '>HLLHHHH', ('emeter-dc', 'emeter'), (
+    Field('emeter-dc', 'power', 4, 10),
+    Field('emeter-dc', 'totalenergy', 3),
+    Field('emeter-dc', 'totalenergy', 4),
+    Field('emeter-dc', 'todaysenergy', 3),
+    Field('emeter-dc', 'todaysenergy', 4),
+    Field('emeter', 'voltageAC', 0, 10),
+    Field('emeter', '_uk7'),
+), _hm1200_cmd3, ('4/voltage', '4/current'))
+
+register('HM-1200', 0x84, '>HHHHHH', ('emeter',), (
+    Field('emeter', 'frequency', 0, 100),
+    Field('emeter', 'powerAC', 0, 10),
+    Field('emeter', '_uk3'),
+    Field('emeter', 'currentAC', 0, 100),
+    Field('emeter', 'pctload', 0, 10),
+    Field('emeter', 'temperature', 0, 10),
+), _hm1200_cmd132, ('0/voltageAC',))
+
+
+# HM-300, HM-350, HM-400
+
+register('HM-300', 0x01, '>HHHHLHH', ('emeter-dc', 'emeter'), (
+    None,
+    Field('emeter-dc', 'voltage', 1, 10),
+    Field('emeter-dc', 'current', 1, 100),
+    Field('emeter-dc', 'power', 1, 10),
+    Field('emeter-dc', 'totalenergy', 1),
+    Field('emeter-dc', 'todaysenergy', 1),
+    Field('emeter', 'voltageAC', 0, 10),
+))
+
+for _cmd in (0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x81):
+    register('HM-300', _cmd, '>HHHHHHHH', (None,), _unknown_words(None, '_uk9'))
+
+register('HM-300', 0x82, '>HHHHHHHH', ('emeter',), (
+    Field('emeter', 'frequency', 0, 100),
+    Field('emeter', 'powerAC', 0, 10),
+    None,
+    Field('emeter', 'currentAC', 0, 100),
+    None,
+    Field('emeter', 'temperature', 0, 10),
+    None,
+    None,
+))
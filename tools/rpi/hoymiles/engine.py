@@ -0,0 +1,242 @@
+"""
+Event driven receive path for the nRF24.
+
+Instead of polling the RX FIFO and sleeping between empty reads, the engine
+waits on an asyncio event that a readiness source sets whenever the radio
+has something for us:
+
+- GpioIrq uses the nRF24 IRQ line (active low) through a libgpiod edge
+  event, registered as a reader on the event loop.
+- PollingReady checks available() from a timer on the event loop, for
+  setups without a wired IRQ pin and for non-hardware backends. The timer
+  only runs while receive() waits for a frame (the engine arms and
+  disarms its readiness source around the wait), so the SPI bus is left
+  alone between polling cycles.
+
+Channel hopping runs as a timer callback on the event loop: while nothing
+arrives, the radio moves to the next RX channel after its dwell time, and
+every received frame restarts the dwell on the channel that delivered it.
+The engine keeps track of how long it listened on each channel, and
+reports every dwell while hopping as an 'rx wait' span to the profiler.
+"""
+import asyncio
+
+from .timing import NULL
+
+
+class PollingReady:
+    """
+    Readiness source without IRQ line: checks radio.available() every
+    `interval` seconds on the event loop, while armed.
+    """
+
+    def __init__(self, radio, interval=0.001):
+        self.radio = radio
+        self.interval = interval
+        self._loop = None
+        self._check = None
+        self._handle = None
+
+    def start(self, loop, callback):
+        def check():
+            if self.radio.available():
+                callback()
+            self._handle = loop.call_later(self.interval, check)
+        self._loop = loop
+        self._check = check
+
+    def arm(self):
+        if self._handle is None and self._loop is not None:
+            self._handle = self._loop.call_later(self.interval, self._check)
+
+    def disarm(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def stop(self):
+        self.disarm()
+        self._loop = None
+
+
+class GpioIrq:
+    """
+    Readiness source driven by the falling edge of the nRF24 IRQ pin.
+
+    Only 'RX data ready' is routed to the pin; the status flags are cleared
+    on every edge, the FIFO itself is drained by the engine.
+    """
+
+    def __init__(self, radio, pin, chip='/dev/gpiochip0'):
+        import gpiod    # python3-libgpiod, only needed when an IRQ pin is configured
+
+        self.radio = radio
+        self._loop = None
+        self._callback = None
+        radio.maskIRQ(True, True, False)    # tx_ok, tx_fail masked; rx_ready active
+        if hasattr(gpiod, 'request_lines'):
+            # libgpiod >= 2
+            from gpiod.line import Edge
+            self._request = gpiod.request_lines(
+                chip, consumer='ahoy',
+                config={pin: gpiod.LineSettings(edge_detection=Edge.FALLING)})
+            self._fd = self._request.fd
+            self._read_events = self._request.read_edge_events
+        else:
+            line = gpiod.Chip(chip).get_line(pin)
+            line.request(consumer='ahoy', type=gpiod.LINE_REQ_EV_FALLING_EDGE)
+            self._request = line
+            self._fd = line.event_get_fd()
+            self._read_events = line.event_read
+
+    def start(self, loop, callback):
+        self._loop = loop
+        self._callback = callback
+        loop.add_reader(self._fd, self._on_edge)
+
+    def _on_edge(self):
+        self._read_events()
+        self.radio.whatHappened()   # clears RX_DR, releases the IRQ line
+        self._callback()
+
+    # edges are reported whether anyone waits or not
+    def arm(self):
+        pass
+
+    def disarm(self):
+        pass
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+
+
+class RxEngine:
+    def __init__(self, radio, ready, profiler=NULL):
+        self.radio = radio
+        self.ready = ready
+        self.profiler = profiler
+        self.channel = None
+        self._event = None
+        self._loop = None
+        self._hop = None        # (channels, index, dwells) while hopping
+        self._hop_handle = None
+        self._listened = {}     # channel -> seconds
+        self._tuned_at = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self.ready.start(self._loop, self._event.set)
+
+    def stop(self):
+        self.stop_hopping()
+        self.ready.stop()
+
+    def tune(self, channel):
+        radio = self.radio
+        radio.stopListening()
+        radio.setChannel(channel)
+        radio.startListening()
+        self._account()
+        self.channel = channel
+
+    def _account(self):
+        now = self._loop.time()
+        if self.channel is not None and self._tuned_at is not None:
+            self._listened[self.channel] = self._listened.get(self.channel, 0.0) + now - self._tuned_at
+            if self._hop is not None:
+                # the event loop clock is time.monotonic()
+                self.profiler.span(('rx wait', self.channel), int(self._tuned_at * 1e9), int(now * 1e9))
+        self._tuned_at = now
+
+    def exposure(self):
+        """
+        :return: {channel: seconds listened} since the last call
+        """
+        self._account()
+        listened = self._listened
+        self._listened = {}
+        return listened
+
+    def hop(self, channels, dwell, start=0):
+        """
+        Listen on channels[start] and move on to the next channel whenever
+        nothing arrived for its dwell time.
+        :param dwell: seconds, for all channels or as a list per channel
+        """
+        self.stop_hopping()
+        if not isinstance(dwell, (list, tuple)):
+            dwell = [dwell] * len(channels)
+        self._hop = (channels, start % len(channels), dwell)
+        self.tune(channels[self._hop[1]])
+        self._hop_handle = self._loop.call_later(dwell[self._hop[1]], self._next_channel)
+
+    def stop_hopping(self):
+        if self._hop is not None:
+            self._account()
+        if self._hop_handle is not None:
+            self._hop_handle.cancel()
+            self._hop_handle = None
+        self._hop = None
+
+    def _next_channel(self):
+        channels, i, dwell = self._hop
+        i = (i + 1) % len(channels)
+        self._hop = (channels, i, dwell)
+        self.tune(channels[i])
+        self._hop_handle = self._loop.call_later(dwell[i], self._next_channel)
+
+    def _stay(self):
+        # a frame arrived: give the current channel another full dwell
+        if self._hop_handle is not None:
+            self._hop_handle.cancel()
+            channels, i, dwell = self._hop
+            self._hop_handle = self._loop.call_later(dwell[i], self._next_channel)
+
+    def transmit(self, channel, address, payload):
+        """
+        Send one frame and go back to listening on the current RX channel.
+        Hopping is held while the radio is in TX mode.
+        """
+        radio = self.radio
+        radio.stopListening()  # put radio in TX mode
+        radio.setChannel(channel)
+        radio.openWritingPipe(address)
+        status = radio.write(payload)
+        if self.channel is not None:
+            radio.setChannel(self.channel)
+        radio.startListening()
+        self._stay()
+        return status
+
+    async def receive(self, timeout):
+        """
+        Wait for the next frame.
+        :return: (payload, rx channel), or None if nothing arrived within
+                 timeout seconds
+        """
+        radio = self.radio
+        event = self._event
+        deadline = self._loop.time() + timeout
+        while True:
+            has_payload, pipe_number = radio.available_pipe()
+            if has_payload:
+                size = radio.getDynamicPayloadSize()
+                payload = radio.read(size)
+                self._stay()
+                return payload, self.channel
+            # the readiness callbacks run on this loop, nothing can set the
+            # event between the FIFO check above and clearing it here
+            event.clear()
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return None
+            self.ready.arm()
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.ready.disarm()
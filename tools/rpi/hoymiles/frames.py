@@ -0,0 +1,137 @@
+"""
+Addressing and request frames for the DTU side.
+
+A 0x80 request (27 bytes):
+
+    0x15  dst(4)  src(4)  0x80  subtype 0x00  ts(4)  00 00 00 05 00 00 00 00  crc16(2)  crc8
+
+crc16 (modbus) covers subtype .. the 8 trailing bytes, crc8 everything
+before it. A refetch of fragment n (11 bytes) is
+
+    0x15  dst(4)  src(4)  0x80+n  crc8
+
+FrameBuilder computes everything that does not depend on the time stamp
+once per inverter: the address bytes, a request template and all refetch
+frames. A request then only patches the time stamp into the template and
+updates the CRCs: the crc16 runs over the 4 time stamp bytes only, starting
+from the state after the constant bytes before them and mapping the state
+through the constant bytes after them with two lookup tables (the CRC is
+linear in its state). The crc16 of a time stamp is the same for all
+inverters and is remembered.
+
+The CRC-8 uses the polynomial x^8+1, which makes it the XOR of all bytes
+(x^8 = 1 modulo the polynomial); it can be continued from the value of a
+known prefix. Both CRCs are crcmod functions, the same ones the simulator
+and the receive path use.
+"""
+import struct
+
+import crcmod
+import crcmod.predefined
+
+REQUEST = 0x80
+SUBTYPE = 0x0b
+_TAIL = b'\x00\x00\x00\x05\x00\x00\x00\x00'
+_TS = 12                # offset of the time stamp in a request
+_CRC16 = 24             # offset of the crc16, the crc8 follows
+
+_ts_pack = struct.Struct('>L').pack
+
+
+def hm_addr(serial):
+    """
+    The 4 bytes the HM devices use in their messages to address each other:
+    the last 8 digits of the serial number, read as BCD.
+    """
+    return struct.pack('>L', int(str(serial)[-8:], base=16))
+
+
+def esb_addr(serial):
+    """
+    The NRF24 'enhanced shockburst' address (5 bytes) of a serial number.
+
+    The NRF library expects these in LSB to MSB order, even though the
+    transceiver itself will then output them in MSB-to-LSB order over the
+    air. The inverters use the HM address in reverse byte order followed
+    by 0x01.
+    """
+    return b'\x01' + hm_addr(serial)
+
+
+# CRC-16/MODBUS (reflected 0x8005, init 0xffff) and the CRC-8 (x^8+1) over
+# bytes-like objects; crcmod's C extension, the second argument continues
+# from an earlier state
+crc16 = crcmod.predefined.mkPredefinedCrcFun('modbus')
+crc8 = crcmod.mkCrcFun(0x101, initCrc=0, xorOut=0)
+
+
+def _crc16_suffix(suffix):
+    """
+    Tables hi, lo and constant c such that
+    crc16(suffix, s) == hi[s >> 8] ^ lo[s & 0xff] ^ c for every state s.
+    """
+    c = crc16(suffix, 0)
+    hi = tuple(crc16(suffix, b << 8) ^ c for b in range(256))
+    lo = tuple(crc16(suffix, b) ^ c for b in range(256))
+    return hi, lo, c
+
+
+class _Inverter:
+    __slots__ = ('esb', 'request', 'prefix_crc8', 'ts', 'refetch')
+
+
+class FrameBuilder:
+    def __init__(self, dtu_serial, subtype=SUBTYPE, max_fragments=16):
+        self.src = hm_addr(dtu_serial)
+        self.subtype = subtype
+        self.max_fragments = max_fragments
+        self._inverters = {}
+        self._crc16 = (None, 0)     # (time stamp, crc16 of the request payload)
+        self._crc16_head = crc16(bytes((subtype, 0)))
+        self._crc16_tail = _crc16_suffix(_TAIL)
+
+    def add(self, serial):
+        inv = _Inverter()
+        dst = hm_addr(serial)
+        head = b'\x15' + dst + self.src
+        inv.esb = esb_addr(serial)
+        inv.request = bytearray(head + bytes((REQUEST, self.subtype, 0)) + bytes(4) + _TAIL + bytes(3))
+        inv.prefix_crc8 = crc8(inv.request)     # all but time stamp and crc16
+        inv.ts = None
+        head_crc8 = crc8(head)
+        inv.refetch = tuple(head + bytes((0x80 + n, head_crc8 ^ (0x80 + n)))
+                            for n in range(self.max_fragments + 1))
+        self._inverters[str(serial)] = inv
+
+    def esb_addr(self, serial):
+        return self._inverters[serial].esb
+
+    def request(self, serial, ts):
+        """
+        :return: the 0x80 request for time stamp ts; a buffer owned by the
+                 builder, valid until the next request to the same inverter
+        """
+        inv = self._inverters[serial]
+        if inv.ts != ts:
+            buf = inv.request
+            ts_bytes = _ts_pack(ts)
+            buf[_TS:_TS + 4] = ts_bytes
+            ts_crc, crc = self._crc16
+            if ts_crc != ts:
+                hi, lo, c = self._crc16_tail
+                state = crc16(ts_bytes, self._crc16_head)
+                crc = hi[state >> 8] ^ lo[state & 0xff] ^ c
+                self._crc16 = (ts, crc)
+            crc_hi = crc >> 8
+            crc_lo = crc & 0xff
+            buf[_CRC16] = crc_hi
+            buf[_CRC16 + 1] = crc_lo
+            buf[_CRC16 + 2] = crc8(ts_bytes, inv.prefix_crc8 ^ crc_hi ^ crc_lo)
+            inv.ts = ts
+        return inv.request
+
+    def refetch(self, serial, fragment):
+        """
+        :return: the request to resend fragment number `fragment` (1 based)
+        """
+        return self._inverters[serial].refetch[fragment]
@@ -0,0 +1,178 @@
+"""
+Line oriented output file with group commit and rotation.
+
+LogFile collects lines in memory and a writer thread commits them as one
+write when `batch_lines` lines are waiting or `commit_interval` seconds have
+passed since the first of them, whichever comes first. Durability modes:
+- 'os':    each commit is handed to the operating system (survives a crash
+           of ahoy.py, not a power loss)
+- 'fsync': each commit is also fsync'ed to the storage
+
+The file is rotated when a commit would make it larger than `max_bytes`
+and/or at the first commit of a new day. Rotated files are renamed to
+<path>.<YYYY-MM-DD> (plus .1, .2, ... if there are more on that day) and
+compressed with gzip in the background; with `keep` set, only that many
+rotated files are kept.
+
+A commit that fails (disk full, rotation not possible, ...) is logged and
+its lines are dropped and counted; the writer goes on with the next one,
+so the lines waiting in memory stay bounded by what one commit takes.
+"""
+import os
+import glob
+import gzip
+import shutil
+import logging
+import threading
+import time
+from collections import deque
+from datetime import date
+
+DURABILITY = ('os', 'fsync')
+
+log = logging.getLogger('ahoy.logfile')
+
+
+class LogFile:
+    def __init__(self, path, commit_interval=5.0, batch_lines=100, durability='os',
+                 max_bytes=0, daily=False, compress=True, keep=0):
+        if durability not in DURABILITY:
+            raise ValueError(f'unknown durability {durability!r}, use one of {", ".join(DURABILITY)}')
+        self.path = path
+        self.commit_interval = commit_interval
+        self.batch_lines = batch_lines
+        self.durability = durability
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.compress = compress
+        self.keep = keep
+        self.commits = 0
+        self.errors = 0
+        self.dropped = 0    # lines lost to failed commits
+        self._lines = deque()
+        self._first_ns = None
+        self._wake = threading.Condition()
+        self._stop = False
+        self._open()
+        self._compressing = deque()
+        self._thread = threading.Thread(target=self._run, name='logfile', daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        self._file = open(self.path, 'ab', buffering=0)
+        self._size = self._file.tell()
+        if self._size:
+            self._day = date.fromtimestamp(os.path.getmtime(self.path))
+        else:
+            self._day = date.today()
+
+    def write(self, line):
+        """
+        Queue one line (without the line break) for the next commit.
+        """
+        with self._wake:
+            self._lines.append(line)
+            if self._first_ns is None:
+                # the writer starts the commit_interval timer
+                self._first_ns = time.monotonic_ns()
+                self._wake.notify()
+            elif len(self._lines) >= self.batch_lines:
+                self._wake.notify()
+
+    def close(self):
+        """
+        Commit what is left, stop the writer and wait for running compressions.
+        """
+        with self._wake:
+            self._stop = True
+            self._wake.notify()
+        self._thread.join()
+        self._file.close()
+        for t in list(self._compressing):
+            t.join()
+
+    def _due(self):
+        if not self._lines:
+            return None
+        if len(self._lines) >= self.batch_lines:
+            return 0.0
+        return max(0.0, self.commit_interval - (time.monotonic_ns() - self._first_ns) / 1e9)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._stop:
+                    wait = self._due()
+                    if wait == 0.0:
+                        break
+                    self._wake.wait(wait)
+                lines = self._lines
+                self._lines = deque()
+                self._first_ns = None
+                stop = self._stop
+            if lines:
+                try:
+                    self._commit(('\n'.join(lines) + '\n').encode())
+                except Exception:
+                    self.errors += 1
+                    self.dropped += len(lines)
+                    log.exception("could not write %d lines to %s", len(lines), self.path)
+            if stop:
+                return
+
+    def _commit(self, data):
+        if self._file.closed:
+            # a rotation failed half way
+            self._open()
+        today = date.today()
+        if self._size and ((self.daily and today != self._day)
+                           or (self.max_bytes and self._size + len(data) > self.max_bytes)):
+            self._rotate()
+        self._file.write(data)
+        if self.durability == 'fsync':
+            os.fsync(self._file.fileno())
+        self._size += len(data)
+        self._day = today
+        self.commits += 1
+
+    def _rotate(self):
+        self._file.close()
+        base = f'{self.path}.{self._day.isoformat()}'
+        target = base
+        n = 0
+        while os.path.exists(target) or os.path.exists(target + '.gz'):
+            n += 1
+            target = f'{base}.{n}'
+        os.rename(self.path, target)
+        self._open()
+        if self.compress:
+            t = threading.Thread(target=self._compress, args=(target,), name='logfile-gzip', daemon=True)
+            self._compressing.append(t)
+            t.start()
+        else:
+            self._expire()
+
+    def _compress(self, path):
+        try:
+            with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.rename(path + '.gz.tmp', path + '.gz')
+            os.remove(path)
+            self._expire()
+        except Exception:
+            # the rotated file stays as it is
+            self.errors += 1
+            log.exception("could not compress %s", path)
+        finally:
+            self._compressing.remove(threading.current_thread())
+
+    def _expire(self):
+        if not self.keep:
+            return
+        rotated = [p for p in glob.glob(glob.escape(self.path) + '.*') if not p.endswith('.tmp')]
+        rotated.sort(key=os.path.getmtime)
+        for p in rotated[:-self.keep]:
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,76 @@
+"""
+Logging for ahoy.py.
+
+Records of the 'ahoy' logger go through a queue to a listener thread,
+which formats and writes them; the radio and output loops only pay for
+creating the record. Arguments are formatted lazily, and only for records
+that pass the level: pass Hex(payload) instead of a hex string.
+
+Two formats: 'text' (time stamp and message, like ahoy.py always printed)
+and 'json', one object per line with time, level, message and the
+`fields` passed as extra={'fields': {...}}.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime
+
+
+class Hex:
+    """
+    Bytes shown as hex, formatted only when the record is written.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return ' '.join(f'{b:02x}' for b in self.data)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # the listener formats; the arguments are immutable or not touched
+        # after logging
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(message)s')
+
+    def formatTime(self, record, datefmt=None):
+        return datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        d = {'ts': record.created, 'level': record.levelname, 'msg': record.getMessage()}
+        fields = getattr(record, 'fields', None)
+        if fields:
+            d.update(fields)
+        if record.exc_info:
+            d['exc'] = self.formatException(record.exc_info)
+        return json.dumps(d, default=str)
+
+
+def setup(level='INFO', format='text', stream=None, name='ahoy'):
+    """
+    (Re)configure the logger `name` to go through a queue to a listener
+    thread writing to stream (stdout by default). Call again in a forked
+    process, the listener thread does not survive the fork.
+    :return: the listener, stop() it to write out what is queued
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if format == 'json' else TextFormatter())
+    listener = logging.handlers.QueueListener(records, handler)
+    logger = logging.getLogger(name)
+    logger.handlers = [_QueueHandler(records)]
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    listener.start()
+    return listener
@@ -0,0 +1,170 @@
+"""
+Metrics in the Prometheus text format, served on http://<host>:<port>/metrics.
+
+Counters, gauges and histograms with labels, kept in plain dicts so that
+updating them from the output loop costs a dict lookup and an addition.
+The HTTP server runs in a daemon thread and only reads them. Gauges can also
+be functions, evaluated on every scrape (e.g. the MQTT queue depth), and
+so can counters kept elsewhere.
+"""
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds, suits response times of a few ms as well as slow decodes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(v):
+    if v == float('inf'):
+        return '+Inf'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(v)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), fn=None):
+        """
+        :param fn: if given, called on every scrape instead of keeping values;
+                   returns the value, or {label values: value} with labels
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.fn = fn
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        values = self.values
+        if self.fn is not None:
+            values = self.fn()
+            if not isinstance(values, dict):
+                values = {(): values}
+        lines = self._header()
+        # sorted() copies the dict in one C call, safe against the output
+        # loop adding label values at the same time
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f'{self.name}{_labels(self.labels, labels)} {_number(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        h = self.values.get(labels)
+        if h is None:
+            # per bucket counts (plus +Inf), sum
+            h = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        h[0][bisect.bisect_left(self.buckets, value)] += 1
+        h[1] += value
+
+    def render(self):
+        lines = self._header()
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), list(counts)):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=(), fn=None):
+        return self._add(Counter(name, help, labels, fn))
+
+    def gauge(self, name, help, labels=(), fn=None):
+        return self._add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Serves registry.render() on /metrics from a daemon thread.
+    """
+
+    def __init__(self, registry, port=9100, host=''):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', CONTENT_TYPE)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
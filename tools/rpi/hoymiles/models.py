@@ -0,0 +1,31 @@
+"""
+Inverter model table.
+
+The first four digits of a serial number identify the model family. Adding
+support for a new model is a matter of adding a row to MODELS (and, if its
+payload layout differs, registering its decoders in hoymiles.decoders).
+"""
+
+# serial prefix, model, number of 0x95 fragments per response
+MODELS = (
+    ('1161', 'HM-1200', 4),   # HM-1500        Thomas B (tnombody), peter l, lukasp
+    ('1121', 'HM-300', 2),    # HM-350, HM-400 marcel, franz, (mpolak 350+700), avr-herbi
+    ('1141', 'HM-600', 3),    # HM-700, HM-800 petersilie, Martin P. (mpolak77), carsten B, golf2010, jan-jonas s, lpb
+    ('1060', 'MI-1000', 2),
+    ('1061', 'MI-1200', 4),   # MI-1500
+    ('1020', 'MI-250', 2),
+    ('1021', 'MI-300', 2),
+    ('1040', 'MI-500', 2),
+)
+
+_by_prefix = {prefix: (model, fragments) for prefix, model, fragments in MODELS}
+
+
+def ser_to_type(s):
+    """
+    Look up an inverter serial number.
+    :return: (model, radio key, number of response fragments); the model is ''
+             for unknown serials.
+    """
+    model, fragments = _by_prefix.get(s[:4], ('', 1))
+    return (model, s[4:], fragments)
@@ -0,0 +1,460 @@
+"""
+MQTT publishing of decoded readings.
+
+Publishing modes (any combination):
+- 'json':  one JSON document per inverter and completed cycle on
+           <prefix>/<serial>, e.g.
+           {"ts": 1650000000.0, "emeter": {"0/powerAC": 21.7, ...},
+            "emeter-dc": {"1/voltage": 28.8, ...}}
+- 'group': one JSON document per emeter group and cycle on
+           <prefix>/<serial>/<group>
+- 'keys':  one message per measurement on <prefix>/<serial>/<group>/<key>,
+           as ahoy.py has always done
+
+Topic strings are built once per inverter, group and key and then reused.
+
+With a Deadband, a value (or a document) is only published again once it
+moved by more than the band of its field class (power, voltage, current,
+energy, temperature, frequency, load), absolute or relative to the last
+published value; every `keyframe` seconds an inverter's readings are all
+published regardless, so that new subscribers catch up.
+
+MqttOutput puts a bounded queue and an on-disk spool between the publisher
+and paho, so neither a slow nor an unreachable broker can block the radio
+loop or fill up the memory.
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+
+MODES = ('json', 'group', 'keys')
+RETRY_DELAY = 1.0   # seconds to wait after the broker did not take a message
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def emeter_groups(infos):
+    """
+    Merge the info dicts of one or more fragments into {group: {key: value}},
+    keeping only the emeter groups and published (non '_') keys.
+    """
+    groups = {}
+    for info in infos:
+        name = info.get('name')
+        if name is None or 'emeter' not in name:
+            continue
+        group = groups.setdefault(name, {})
+        for key, value in info.items():
+            if key != 'name' and key[0] != '_':
+                group[key] = value
+    return groups
+
+
+def field_class(key):
+    """
+    '1/power' -> 'power', '0/voltageAC' -> 'voltage', '2/totalenergy' -> 'energy'
+    """
+    name = key.rsplit('/', 1)[-1].lower()
+    if name.endswith('ac'):
+        name = name[:-2]
+    if name.endswith('energy'):
+        return 'energy'
+    if name == 'pctload':
+        return 'load'
+    return name
+
+
+class Deadband:
+    CLASSES = ('power', 'voltage', 'current', 'energy', 'temperature', 'frequency', 'load')
+
+    def __init__(self, bands=None, keyframe=300, clock=time.monotonic):
+        """
+        :param bands: {field class: band}, a band being a number (absolute)
+                      or a string like '2%' (relative); fields without a
+                      band are published on every change
+        :param keyframe: seconds between full publications per inverter
+        """
+        self.bands = {}
+        for cls, band in (bands or {}).items():
+            if cls not in self.CLASSES:
+                raise ValueError(f'unknown field class {cls!r}, use one of {", ".join(self.CLASSES)}')
+            self.bands[cls] = self.parse(band)
+        self.keyframe = keyframe
+        self.clock = clock
+        self.suppressed = 0
+        self._last = {}         # topic -> value, or {key: value} for documents
+        self._keyframes = {}    # serial -> time of the last keyframe
+        self._classes = {}      # key -> (absolute, relative) band
+
+    @staticmethod
+    def parse(band):
+        """
+        :return: (absolute, relative) band
+        """
+        if isinstance(band, str):
+            band = band.strip()
+            if band.endswith('%'):
+                return 0.0, float(band[:-1]) / 100
+        return float(band), 0.0
+
+    def _band(self, key):
+        band = self._classes.get(key)
+        if band is None:
+            band = self._classes[key] = self.bands.get(field_class(key), (0.0, 0.0))
+        return band
+
+    def _moved(self, key, old, new):
+        if old is None:
+            return True
+        try:
+            delta = abs(new - old)
+        except TypeError:
+            return new != old
+        absolute, relative = self._band(key)
+        return delta > absolute and delta > relative * abs(old)
+
+    def full(self, serial, complete=True):
+        """
+        Whether all of this cycle is to be published; a keyframe is only
+        counted for complete cycles, which carry the documents.
+        """
+        if not self.keyframe:
+            return False
+        now = self.clock()
+        last = self._keyframes.get(serial)
+        if last is not None and now - last < self.keyframe:
+            return False
+        if complete:
+            self._keyframes[serial] = now
+        return True
+
+    def value(self, topic, key, value, force=False):
+        """
+        :return: whether the value is to be published on topic
+        """
+        if force or self._moved(key, self._last.get(topic), value):
+            self._last[topic] = value
+            return True
+        self.suppressed += 1
+        return False
+
+    def document(self, topic, values, force=False):
+        """
+        :param values: {key: value} of the document
+        :return: whether the document is to be published on topic
+        """
+        last = self._last.get(topic)
+        if force or last is None or last.keys() != values.keys() or \
+                any(self._moved(key, last[key], value) for key, value in values.items()):
+            self._last[topic] = dict(values)
+            return True
+        self.suppressed += 1
+        return False
+
+
+class Publisher:
+    def __init__(self, client, modes=('json',), qos=0, retain=False, prefix='ahoy', deadband=None):
+        """
+        :param deadband: a Deadband to publish changes only, or None for all
+        """
+        for mode in modes:
+            if mode not in MODES:
+                raise ValueError(f'unknown mqtt mode {mode!r}, use one of {", ".join(MODES)}')
+        self.client = client
+        self.modes = frozenset(modes)
+        self.qos = qos
+        self.retain = retain
+        self.prefix = prefix
+        self.deadband = deadband
+        self._topics = {}
+
+    def topic(self, serial, group=None, key=None):
+        cache_key = (serial, group, key)
+        topic = self._topics.get(cache_key)
+        if topic is None:
+            topic = '/'.join(x for x in (self.prefix, serial, group, key) if x is not None)
+            self._topics[cache_key] = topic
+        return topic
+
+    def _publish(self, topic, payload):
+        self.client.publish(topic, payload, self.qos, self.retain)
+
+    def publish_cycle(self, serial, infos, ts=None, complete=True):
+        """
+        Publish the decoded infos of one inverter's polling cycle.
+        :param infos: info dicts of all valid fragments of the cycle
+        :param ts: unix time of the reading, added to the JSON documents
+        :param complete: False if fragments are missing; then only the
+                         per key topics get what was received
+        """
+        groups = emeter_groups(infos)
+        if not groups:
+            return
+        band = self.deadband
+        full = band is None or band.full(serial, complete)
+        if 'keys' in self.modes:
+            for group, values in groups.items():
+                for key in sorted(values):
+                    topic = self.topic(serial, group, key)
+                    if band is None or band.value(topic, key, values[key], full):
+                        self._publish(topic, values[key])
+        if not complete:
+            return
+        if 'group' in self.modes:
+            for group, values in groups.items():
+                topic = self.topic(serial, group)
+                if band is None or band.document(topic, values, full):
+                    doc = dict(values)
+                    if ts is not None:
+                        doc['ts'] = ts
+                    self._publish(topic, _dumps(doc))
+        if 'json' in self.modes:
+            topic = self.topic(serial)
+            if band is None or band.document(topic, {key: value for values in groups.values()
+                                                     for key, value in values.items()}, full):
+                doc = dict(groups)
+                if ts is not None:
+                    doc['ts'] = ts
+                self._publish(topic, _dumps(doc))
+
+
+class Spool:
+    """
+    Append-only file of messages that could not be sent, one JSON array
+    [topic, payload, qos, retain(, sequence number)] per line. The read
+    position is kept in <path>.pos, so a restart neither loses nor resends
+    spooled messages; once everything is read the file is truncated.
+
+    The position file is replaced atomically, and always written before the
+    data file is truncated: a crash in between leaves a position past the
+    end of the file, which is taken as 0 on the next start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pos_path = path + '.pos'
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+        try:
+            with open(self._pos_path) as f:
+                self._pos = int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            self._pos = 0
+        if self._pos > self._size:
+            self._pos = 0
+        self.earlier = self._size   # end of the messages spooled by earlier runs
+        self.count = 0      # messages appended since start
+
+    def append(self, msg):
+        line = (_dumps(msg) + '\n').encode()
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+            self.count += 1
+
+    def pending(self):
+        return self._size > self._pos
+
+    def read(self, n):
+        """
+        :return: up to n (message, position after it) pairs, for commit()
+        """
+        with self._lock:
+            msgs = []
+            with open(self.path, 'rb') as f:
+                f.seek(self._pos)
+                pos = self._pos
+                for line in f:
+                    if not line.endswith(b'\n') or len(msgs) >= n:
+                        break
+                    pos += len(line)
+                    msgs.append((json.loads(line), pos))
+            return msgs
+
+    def commit(self, pos):
+        """
+        Mark everything up to pos as sent.
+        """
+        with self._lock:
+            self._write_pos(pos)
+            if pos >= self._size:
+                self._file.truncate(0)
+                self._size = self.earlier = pos = 0
+                self._write_pos(pos)
+            self._pos = pos
+
+    def _write_pos(self, pos):
+        tmp = self._pos_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(pos))
+        os.replace(tmp, self._pos_path)
+
+    def close(self):
+        self._file.close()
+
+
+class MqttOutput:
+    """
+    Non-blocking MQTT output stage with the publish() signature of a paho
+    client, for use as Publisher(client=MqttOutput(...)).
+
+    - connects in the background and keeps reconnecting (paho connect_async)
+    - messages go to a bounded in-memory queue, drained by a worker thread
+    - while the broker is away or the queue is full, messages go to the
+      spool (if configured; otherwise they are dropped and counted)
+    - spooled messages are sent at most drain_rate per second once the
+      broker is back and the queue is empty
+    - after a message the broker did not take (paho's queue full, ...)
+      nothing is sent for RETRY_DELAY seconds
+    - of the retained messages on a topic only the newest one is sent: live
+      messages overtake the spool, and a stale spooled value would
+      otherwise replace the retained one at the broker. Retained messages
+      carry a sequence number for that; those spooled by an earlier run
+      are older than anything published since the start.
+    """
+
+    def __init__(self, client, host, port=1883, queue_size=1000, spool=None, drain_rate=50,
+                 keepalive=60):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.spool = spool
+        self.drain_rate = drain_rate
+        self.keepalive = keepalive
+        self.connected = False
+        self.dropped = 0
+        self.sent = 0
+        self.superseded = 0     # retained messages not sent, a newer one was published
+        self._seq = 0
+        self._newest = {}       # topic -> sequence number of its newest retained message
+        self._queue = deque()
+        self._wake = threading.Condition()
+        self._stop = False
+        self._thread = None
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.max_queued_messages_set(queue_size)
+        client.reconnect_delay_set(1, 60)
+
+    def start(self):
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        self.client.loop_start()
+        self._thread = threading.Thread(target=self._run, name='mqtt-output', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._wake:
+            self._stop = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self.spool is not None:
+            # keep what is still queued for the next run
+            while self._queue:
+                self.spool.append(self._queue.popleft())
+            self.spool.close()
+
+    def queue_depth(self):
+        return len(self._queue)
+
+    # paho callbacks run on paho's network thread; accept both callback API versions
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        with self._wake:
+            self.connected = not rc
+            self._wake.notify()
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.connected = False
+
+    def _overflow(self, msg):
+        if self.spool is not None:
+            self.spool.append(msg)
+        else:
+            self.dropped += 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        msg = [topic, payload, qos, retain]
+        if retain:
+            self._seq += 1
+            self._newest[topic] = self._seq
+            msg.append(self._seq)
+        if not self.connected or len(self._queue) >= self.queue_size:
+            self._overflow(msg)
+            return
+        with self._wake:
+            self._queue.append(msg)
+            self._wake.notify()
+
+    def _superseded(self, msg, earlier=False):
+        """
+        Whether a newer retained message was published on the topic of msg.
+        :param earlier: msg was spooled by an earlier run
+        """
+        if not msg[3]:
+            return False
+        newest = self._newest.get(msg[0])
+        if newest is None:
+            return False
+        return earlier or len(msg) < 5 or msg[4] != newest
+
+    def _send(self, msg):
+        if self.client.publish(*msg[:4]).rc:
+            return False
+        self.sent += 1
+        return True
+
+    def _has_work(self):
+        return self.connected and (self._queue or (self.spool is not None and self.spool.pending()))
+
+    def _run(self):
+        queue = self._queue
+        spool = self.spool
+        while True:
+            with self._wake:
+                while not self._stop and not self._has_work():
+                    self._wake.wait(1.0)
+                if self._stop:
+                    return
+            if queue:
+                msg = queue.popleft()
+                if self._superseded(msg):
+                    self.superseded += 1
+                elif not self._send(msg):
+                    self._overflow(msg)
+                    self._pause(RETRY_DELAY)
+                continue
+            # drain the spool, one second's worth of messages at a time; stop
+            # at the first message not taken
+            t_start = time.monotonic()
+            sent = 0
+            done = None
+            failed = False
+            for msg, pos in spool.read(self.drain_rate):
+                if self._superseded(msg, pos <= spool.earlier):
+                    self.superseded += 1
+                    done = pos
+                    continue
+                if not self.connected or not self._send(msg):
+                    failed = True
+                    break
+                done = pos
+                sent += 1
+            if done is not None:
+                spool.commit(done)
+            if failed or done is None:
+                self._pause(RETRY_DELAY)
+            else:
+                self._pause(sent / self.drain_rate - (time.monotonic() - t_start))
+
+    def _pause(self, seconds):
+        # like time.sleep, but ends early on stop()
+        if seconds > 0:
+            with self._wake:
+                self._wake.wait_for(lambda: self._stop, seconds)
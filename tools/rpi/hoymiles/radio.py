@@ -0,0 +1,113 @@
+"""
+Radio backends.
+
+ahoy.py talks to the radio only through the methods of Radio, which use the
+names of TMRh20's RF24 python wrapper. RF24Radio drives a real nRF24L01+;
+hoymiles.simulator.SimulatedRadio answers like a set of inverters would,
+without any hardware.
+"""
+
+
+class Radio:
+    """
+    Interface of a radio backend.
+    """
+
+    def begin(self):
+        return True
+
+    def configure(self, pa_level='low'):
+        """
+        Dynamic payloads, auto ack, 250 kbps, given PA level ('low'/'max').
+        """
+
+    def powerDown(self):
+        pass
+
+    def powerUp(self):
+        pass
+
+    def setChannel(self, channel):
+        raise NotImplementedError
+
+    def startListening(self):
+        raise NotImplementedError
+
+    def stopListening(self):
+        raise NotImplementedError
+
+    def openReadingPipe(self, pipe, address):
+        raise NotImplementedError
+
+    def openWritingPipe(self, address):
+        raise NotImplementedError
+
+    def write(self, payload):
+        raise NotImplementedError
+
+    def available(self):
+        raise NotImplementedError
+
+    def available_pipe(self):
+        """
+        :return: (has_payload, pipe_number)
+        """
+        raise NotImplementedError
+
+    def getDynamicPayloadSize(self):
+        raise NotImplementedError
+
+    def read(self, size):
+        raise NotImplementedError
+
+    def flush_rx(self):
+        raise NotImplementedError
+
+    def flush_tx(self):
+        raise NotImplementedError
+
+    def readiness(self):
+        """
+        Readiness source for hoymiles.engine.RxEngine (start, arm, disarm,
+        stop), or None to let the caller choose (IRQ pin or polling).
+        """
+        return None
+
+
+class RF24Radio(Radio):
+    """
+    nRF24L01+ through the RF24 python wrapper. The per-packet methods are the
+    wrapper's own bound methods, so this layer adds no call overhead.
+    """
+
+    def __init__(self, ce_pin=22, csn=0, spi_speed=1000000):
+        import RF24     # only needed with real hardware
+
+        self._RF24 = RF24
+        r = self.rf24 = RF24.RF24(ce_pin, csn, spi_speed)
+        self.begin = r.begin
+        self.powerDown = r.powerDown
+        self.powerUp = r.powerUp
+        self.setChannel = r.setChannel
+        self.startListening = r.startListening
+        self.stopListening = r.stopListening
+        self.openReadingPipe = r.openReadingPipe
+        self.openWritingPipe = r.openWritingPipe
+        self.write = r.write
+        self.available = r.available
+        self.available_pipe = r.available_pipe
+        self.getDynamicPayloadSize = r.getDynamicPayloadSize
+        self.read = r.read
+        self.flush_rx = r.flush_rx
+        self.flush_tx = r.flush_tx
+        self.maskIRQ = r.maskIRQ
+        self.whatHappened = r.whatHappened
+
+    def configure(self, pa_level='low'):
+        RF24 = self._RF24
+        r = self.rf24
+        r.enableDynamicPayloads()
+        r.setAutoAck(True)
+        r.setRetries(15, 2)
+        r.setPALevel(RF24.RF24_PA_MAX if pa_level == 'max' else RF24.RF24_PA_LOW)
+        r.setDataRate(RF24.RF24_250KBPS)
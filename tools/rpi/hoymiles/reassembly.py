@@ -0,0 +1,118 @@
+"""
+Reassembly of an inverter's 0x95 response fragments.
+
+An inverter answers a 0x80 request with fragments numbered 1..n in the
+low 7 bits of the cmd byte (p[9]); the last one is flagged with 0x80. The
+data bytes of all fragments (p[10:-1]) form one payload that ends with its
+CRC-16 (modbus, big endian). Every fragment carries a CRC-8 of its own.
+
+One Response per inverter collects the fragments of the current request:
+fragments from other senders, with a bad CRC-8 or received a second time
+(e.g. on another channel) are not taken. missing() tells which fragments
+to ask for again, and once complete() the CRC-16 of the whole payload is
+checked and all fragments are decoded in one go.
+"""
+from .frames import hm_addr, crc8, crc16
+from .decoders import decoders
+from .timing import NULL
+
+LAST = 0x80
+
+
+class Response:
+    def __init__(self, serial, model, fragments):
+        """
+        :param fragments: number of fragments the model usually sends, until
+                          the last fragment tells otherwise
+        """
+        self.serial = serial
+        self.model = model
+        self.addr = hm_addr(serial)
+        self.expected = fragments
+        self.decoders = decoders(model)
+        self.duplicates = 0
+        self.corrupted = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the fragments of the previous request.
+        """
+        self.fragments = {}     # fragment number -> dict with 'p' and reception details
+        self.last = None
+
+    def add(self, p, **details):
+        """
+        Take a received frame, with details (channel, time, ...) kept next to
+        it in self.fragments.
+        :return: True if it is a new fragment of this response
+        """
+        if len(p) < 11 or p[0] != 0x95 or p[1:5] != self.addr:
+            return False
+        if crc8(memoryview(p)[:-1]) != p[-1]:
+            self.corrupted += 1
+            return False
+        cmd = p[9]
+        n = cmd & 0x7f
+        if n == 0 or (self.last is not None and n > self.last):
+            return False
+        if n in self.fragments:
+            self.duplicates += 1
+            return False
+        if cmd & LAST:
+            self.last = n
+        details['p'] = p
+        self.fragments[n] = details
+        return True
+
+    def total(self):
+        """
+        Number of fragments of this response: known once the last one is
+        there, otherwise what the model usually sends (or one more than
+        received so far, if that is more).
+        """
+        if self.last is not None:
+            return self.last
+        return max(self.expected, max(self.fragments, default=0) + 1)
+
+    def missing(self):
+        """
+        :return: bitmap of the missing fragments, bit n-1 for fragment n
+        """
+        bits = (1 << self.total()) - 1
+        for n in self.fragments:
+            bits &= ~(1 << (n - 1))
+        return bits
+
+    def complete(self):
+        return self.last is not None and len(self.fragments) == self.last
+
+    def payload(self):
+        """
+        Data bytes of all fragments received so far, in order.
+        """
+        return b''.join(memoryview(self.fragments[n]['p'])[10:-1] for n in sorted(self.fragments))
+
+    def crc_ok(self):
+        """
+        Whether the response is complete and the CRC-16 over its payload matches.
+        """
+        if not self.complete():
+            return False
+        data = self.payload()
+        return len(data) >= 2 and crc16(memoryview(data)[:-2]) == int.from_bytes(data[-2:], 'big')
+
+    def decode(self, state, profiler=NULL):
+        """
+        Decode the fragments received so far, in order.
+        :return: {fragment number: info dicts}; None for unknown layouts
+        """
+        infos = {}
+        decoders = self.decoders
+        for n in sorted(self.fragments):
+            p = self.fragments[n]['p']
+            t0 = profiler.start()
+            fn = decoders.get(p[9])
+            infos[n] = None if fn is None else fn(p, state)
+            profiler.stop(('decode', self.model, p[9]), t0)
+        return infos
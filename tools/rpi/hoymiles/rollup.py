@@ -0,0 +1,210 @@
+"""
+Recent history of every inverter and measurement, at several resolutions.
+
+Every inverter has a History holding, per resolution, a ring of fixed-size
+buckets: one row per bucket and one column per measurement key ('1/power',
+'0/powerAC', ...), with count, minimum, maximum, sum and last value in
+flat arrays. A reading is rolled into the current bucket of every
+resolution as it comes in (the bucket is found once per resolution, then
+it is one array update per value), so memory is allocated up front and
+never grows with run time, and a query walks the buckets of one resolution
+and key only:
+
+    rollups = Rollups(((60, 180), (900, 96), (3600, 168)))
+    rollups.add('114174608145', time.time(), {'0/powerAC': 211.3, ...})
+    for start, lo, hi, mean, last, count in rollups.query('114174608145', '0/powerAC', 900):
+        ...
+
+With the default resolutions (3 hours of minutes, a day of quarter hours
+and a week of hours) that is about 16 kB per inverter and key.
+
+Readings come in on the output loop while queries come from other threads
+(hoymiles.api); a new key replaces the arrays of every ring, so Rollups
+takes one lock for adding and querying.
+"""
+import threading
+from array import array
+
+# (bucket width in seconds, number of buckets)
+DEFAULT_RESOLUTIONS = ((60, 180), (900, 96), (3600, 168))
+
+
+class _Ring:
+    __slots__ = ('width', 'size', 'cols', 'slot', 'count', 'lo', 'hi', 'sum', 'last', 'latest', '_zeros')
+
+    def __init__(self, width, size, cols=0):
+        self.width = width
+        self.size = size
+        self.cols = 0
+        self.slot = array('q', [-1]) * size     # bucket number held by each row
+        self.count = array('I')
+        self.lo = array('d')
+        self.hi = array('d')
+        self.sum = array('d')
+        self.last = array('d')
+        self.latest = -1
+        self._zeros = array('I')
+        self.resize(cols)
+
+    def resize(self, cols):
+        """
+        Make room for more columns, keeping what the rows hold.
+        """
+        old = self.cols
+        if cols <= old:
+            return
+        if self.latest < 0:
+            # nothing added yet, nothing to keep
+            self.count = array('I', [0]) * (cols * self.size)
+            for name in ('lo', 'hi', 'sum', 'last'):
+                setattr(self, name, array('d', [0.0]) * (cols * self.size))
+            self.cols = cols
+            self._zeros = array('I', [0]) * cols
+            return
+        pad_i = array('I', [0]) * (cols - old)
+        pad_d = array('d', [0.0]) * (cols - old)
+        for name in ('count', 'lo', 'hi', 'sum', 'last'):
+            a = getattr(self, name)
+            pad = pad_i if name == 'count' else pad_d
+            grown = array(a.typecode)
+            for row in range(self.size):
+                grown += a[row * old:(row + 1) * old]
+                grown += pad
+            setattr(self, name, grown)
+        self.cols = cols
+        self._zeros = array('I', [0]) * cols
+
+    def add(self, t, cells):
+        """
+        :param cells: [(column, value)]
+        """
+        b = int(t // self.width)
+        i = b % self.size
+        cols = self.cols
+        base = i * cols
+        if self.slot[i] != b:
+            if b < self.latest - self.size + 1:
+                return      # older than the ring
+            self.slot[i] = b
+            self.count[base:base + cols] = self._zeros
+        if b > self.latest:
+            self.latest = b
+        count = self.count
+        lo = self.lo
+        hi = self.hi
+        total = self.sum
+        last = self.last
+        for col, value in cells:
+            j = base + col
+            if count[j]:
+                count[j] += 1
+                if value < lo[j]:
+                    lo[j] = value
+                if value > hi[j]:
+                    hi[j] = value
+                total[j] += value
+            else:
+                count[j] = 1
+                lo[j] = hi[j] = total[j] = value
+            last[j] = value
+
+    def query(self, col, since=None, until=None):
+        if self.latest < 0:
+            return []
+        last = self.latest if until is None else min(self.latest, int(until // self.width))
+        first = last - self.size + 1
+        if since is not None:
+            first = max(first, int(since // self.width))
+        width = self.width
+        size = self.size
+        cols = self.cols
+        slot = self.slot
+        count = self.count
+        out = []
+        for b in range(first, last + 1):
+            i = b % size
+            j = i * cols + col
+            if slot[i] == b and count[j]:
+                n = count[j]
+                out.append((b * width, self.lo[j], self.hi[j], self.sum[j] / n, self.last[j], n))
+        return out
+
+
+class History:
+    """
+    The rings of one inverter, one per resolution.
+    """
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS):
+        self.rings = {width: _Ring(width, size) for width, size in resolutions}
+        self.columns = {}   # key -> column
+
+    def add(self, t, values):
+        columns = self.columns
+        cells = []
+        for key, value in values.items():
+            col = columns.get(key)
+            if col is None:
+                col = columns[key] = len(columns)
+            cells.append((col, value))
+        for ring in self.rings.values():
+            # new keys cost one copy of the ring per reading, not per key
+            ring.resize(len(columns))
+            ring.add(t, cells)
+
+    def query(self, key, width, since=None, until=None):
+        """
+        :param width: one of the resolutions (bucket width in seconds)
+        :param since, until: unix times limiting the buckets
+        :return: [(bucket start, min, max, mean, last, count)], oldest first,
+                 for the buckets that got readings
+        """
+        col = self.columns.get(key)
+        if col is None:
+            return []
+        return self.rings[width].query(col, since, until)
+
+
+class Rollups:
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS, fields=None):
+        """
+        :param resolutions: ((bucket width in seconds, number of buckets), ...)
+        :param fields: keys to keep ('0/powerAC', ...), None for all
+        """
+        self.resolutions = tuple((int(width), int(size)) for width, size in resolutions)
+        self.fields = frozenset(fields) if fields else None
+        self.inverters = {}     # serial -> History
+        self._lock = threading.Lock()
+
+    def add(self, serial, t, values):
+        """
+        Roll a reading in.
+        :param t: unix time of the reading
+        :param values: {key: value} of one cycle
+        """
+        if self.fields is not None:
+            values = {key: value for key, value in values.items() if key in self.fields}
+        with self._lock:
+            history = self.inverters.get(serial)
+            if history is None:
+                history = self.inverters[serial] = History(self.resolutions)
+            history.add(t, values)
+
+    def serials(self):
+        with self._lock:
+            return sorted(self.inverters)
+
+    def keys(self, serial):
+        with self._lock:
+            history = self.inverters.get(serial)
+            return sorted(history.columns) if history is not None else []
+
+    def query(self, serial, key, width, since=None, until=None):
+        """
+        See History.query; an empty list for unknown inverters and keys.
+        """
+        with self._lock:
+            history = self.inverters.get(serial)
+            if history is None:
+                return []
+            return history.query(key, width, since, until)
@@ -0,0 +1,125 @@
+"""
+Deadline ordered polling scheduler.
+
+Every inverter has a next-due time; the earliest one sits on top of a heap,
+so picking the next inverter costs O(log n) no matter how large the fleet is.
+Inverters that do not answer are retried once after half their interval (as
+ahoy.py always did) and then backed off exponentially, up to max_backoff
+intervals, so dead or sleeping inverters don't eat the airtime of the ones
+that answer. A single answer resets the backoff.
+
+`scale` stretches all delays, e.g. at dusk (see hoymiles.sun); wake()
+makes every inverter due again with its backoff forgotten, e.g. once the
+first one answers in the morning.
+"""
+import heapq
+import time
+
+
+class Inverter:
+    __slots__ = ('serial', 'interval_ns', 'due_ns', 'failures', 'seq')
+
+    def __init__(self, serial, interval_ns, due_ns):
+        self.serial = serial
+        self.interval_ns = interval_ns
+        self.due_ns = due_ns
+        self.failures = 0
+        self.seq = 0
+
+
+class Scheduler:
+    def __init__(self, max_backoff=16, clock=time.monotonic_ns):
+        self.clock = clock
+        self.max_backoff = max_backoff
+        self.inverters = {}
+        self._heap = []
+        self._seq = 0
+        self.lag_ns = 0     # how late the last inverter handed out was
+        self.scale = 1      # factor for all delays
+
+    def __len__(self):
+        return len(self.inverters)
+
+    def add(self, serial, interval, due_ns=None):
+        """
+        Register an inverter polled every interval seconds; by default it is
+        due right away.
+        """
+        if due_ns is None:
+            due_ns = self.clock()
+        inv = Inverter(serial, int(interval * 1e9), due_ns)
+        self.inverters[serial] = inv
+        self._push(inv)
+
+    def remove(self, serial):
+        # lazily dropped from the heap by next()
+        del self.inverters[serial]
+
+    def _push(self, inv):
+        # entries carry a sequence number: the oldest one for an inverter wins
+        # on equal deadlines, and outdated heap entries can be recognised
+        self._seq += 1
+        inv.seq = self._seq
+        heapq.heappush(self._heap, (inv.due_ns, inv.seq, inv.serial))
+
+    def peek(self):
+        """
+        :return: (serial, due_ns) of the next inverter without removing it,
+                 or None if nothing is scheduled
+        """
+        heap = self._heap
+        while heap:
+            due_ns, seq, serial = heap[0]
+            inv = self.inverters.get(serial)
+            if inv is not None and inv.seq == seq:
+                return serial, due_ns
+            heapq.heappop(heap)
+        return None
+
+    def next(self):
+        """
+        Take the inverter with the earliest deadline off the queue. It stays
+        off until done() reports the outcome of its poll.
+        :return: (serial, due_ns) or None
+        """
+        top = self.peek()
+        if top is not None:
+            heapq.heappop(self._heap)
+            self.lag_ns = max(0, self.clock() - top[1])
+        return top
+
+    def done(self, serial, responded, now_ns=None):
+        """
+        Schedule the next poll of an inverter taken by next().
+        """
+        inv = self.inverters.get(serial)
+        if inv is None:
+            return
+        if now_ns is None:
+            now_ns = self.clock()
+        if responded:
+            inv.failures = 0
+            # stay on the grid of the previous deadline, but never queue up
+            # a backlog of polls after a long pause
+            due_ns = max(inv.due_ns + int(inv.interval_ns * self.scale), now_ns)
+        else:
+            inv.failures += 1
+            if inv.failures == 1:
+                delay = inv.interval_ns // 2
+            else:
+                delay = inv.interval_ns * min(2 ** (inv.failures - 2), self.max_backoff)
+            due_ns = now_ns + int(delay * self.scale)
+        inv.due_ns = due_ns
+        self._push(inv)
+
+    def wake(self, now_ns=None):
+        """
+        Make all inverters due by now_ns and forget their failures.
+        """
+        if now_ns is None:
+            now_ns = self.clock()
+        for inv in self.inverters.values():
+            inv.failures = 0
+            if inv.due_ns > now_ns:
+                inv.due_ns = now_ns
+                self._push(inv)
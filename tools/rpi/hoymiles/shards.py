@@ -0,0 +1,102 @@
+"""
+Assignment of inverters to radios.
+
+Inverters listed for a radio stay with it, the others are spread over the
+radios, the one with the fewest inverters first. With quality sharding
+every radio polls an inverter of another radio now and then (a probe),
+and for every radio and inverter a moving average of how much of the
+responses arrived is kept. An inverter moves to a radio that does clearly
+better than its current one, as long as that radio doesn't get more than
+its share of the fleet plus one.
+
+The radio loops run in threads of their own and poll only the inverters
+they own; `version` changes whenever the assignment does.
+"""
+import math
+import threading
+
+
+class Shards:
+    def __init__(self, radios, serials, fixed=None, quality=False, probe_every=10,
+                 alpha=0.2, margin=0.1):
+        """
+        :param radios: radio names
+        :param fixed: {serial: radio} for inverters that must stay with a radio
+        :param probe_every: with quality sharding, a radio probes after every
+                            probe_every cycles of its own
+        :param margin: how much better (share of fragments received) another
+                       radio must do before an inverter moves
+        """
+        fixed = fixed or {}
+        self.radios = list(radios)
+        self.quality = quality and len(self.radios) > 1
+        self.probe_every = probe_every
+        self.alpha = alpha
+        self.margin = margin
+        self.fixed = set(fixed)
+        self.owner = {}
+        self.score = {}         # (radio, serial) -> moving average of the share received
+        self.version = 0
+        self.cap = math.ceil(len(serials) / len(self.radios)) + 1
+        self._lock = threading.Lock()
+        self._cycles = dict.fromkeys(self.radios, 0)
+        self._probed = {}       # (radio, serial) -> cycle of the last probe
+        for serial in serials:
+            radio = fixed.get(serial)
+            if radio is None:
+                radio = min(self.radios, key=self._load)
+            self.owner[serial] = radio
+
+    def _load(self, radio):
+        return sum(1 for r in self.owner.values() if r == radio)
+
+    def owned(self, radio):
+        with self._lock:
+            return [serial for serial, r in self.owner.items() if r == radio]
+
+    def probe(self, radio):
+        """
+        Called once per polling cycle of a radio.
+        :return: an inverter of another radio to poll now, or None
+        """
+        if not self.quality:
+            return None
+        with self._lock:
+            self._cycles[radio] += 1
+            cycle = self._cycles[radio]
+            if cycle % self.probe_every:
+                return None
+            others = [s for s, r in self.owner.items() if r != radio and s not in self.fixed]
+            if not others:
+                return None
+            serial = min(others, key=lambda s: self._probed.get((radio, s), 0))
+            self._probed[(radio, serial)] = cycle
+            return serial
+
+    def report(self, radio, serial, received):
+        """
+        :param received: share of the response's fragments that arrived (0..1)
+        :return: the radio the inverter moved to, or None
+        """
+        with self._lock:
+            key = (radio, serial)
+            old = self.score.get(key)
+            self.score[key] = received if old is None else old + self.alpha * (received - old)
+            if self.quality:
+                return self._rebalance(serial)
+
+    def _rebalance(self, serial):
+        owner = self.owner[serial]
+        current = self.score.get((owner, serial))
+        if serial in self.fixed or current is None:
+            return None
+        best, best_score = owner, current + self.margin
+        for radio in self.radios:
+            score = self.score.get((radio, serial))
+            if radio != owner and score is not None and score > best_score and self._load(radio) < self.cap:
+                best, best_score = radio, score
+        if best == owner:
+            return None
+        self.owner[serial] = best
+        self.version += 1
+        return best
@@ -0,0 +1,273 @@
+"""
+In-process inverter simulator.
+
+SimulatedRadio implements the hoymiles.radio.Radio interface for a set of
+simulated HM-300, HM-600 and HM-1200 inverters. Requests built by
+hoymiles.frames (full 0x80 requests as well as refetch frames) are answered
+with correctly framed 0x95 fragments, laid out with the very same tables
+hoymiles.decoders uses for decoding, including the CRC-16 over the whole
+response and the CRC-8 of each fragment.
+
+Radio behaviour is deterministic for a given seed:
+- latency: delay between request and first fragment (plus up to `jitter`),
+  further fragments follow every `gap` seconds
+- loss: probability that a fragment is lost
+- channels: every fragment is sent on one of `channels`; each inverter
+  prefers one of them (weight `preference`) unless channel_weights is given.
+  A fragment is only received if the radio listens on its channel at the
+  moment it arrives and the 3 level RX FIFO has room.
+"""
+import heapq
+import random
+import struct
+import time
+from collections import deque
+
+from .models import ser_to_type
+from .decoders import REGISTRY
+from .radio import Radio
+from .frames import hm_addr, crc8, crc16
+
+
+# fragments of a complete response, the last one is flagged with 0x80
+RESPONSES = {
+    'HM-300': (0x01, 0x82),
+    'HM-600': (0x01, 0x02, 0x83),
+    'HM-1200': (0x01, 0x02, 0x03, 0x84),
+}
+
+_word_max = {'H': 0xffff, 'L': 0xffffffff, 'B': 0xff}
+
+
+class SimulatedInverter:
+    def __init__(self, serial, rng, peak_power=300.0):
+        model, radio_key, fragments = ser_to_type(serial)
+        if model not in RESPONSES:
+            raise ValueError(f'cannot simulate {serial} ({model or "unknown model"})')
+        self.serial = serial
+        self.model = model
+        self.addr = hm_addr(serial)
+        self.rng = rng
+        self.peak_power = peak_power
+        self.layouts = [(cmd, REGISTRY[(model, cmd)]) for cmd in RESPONSES[model]]
+        self.dc_channels = sorted({f.channel for cmd, layout in self.layouts
+                                   for f in layout.fields if f is not None and f.channel})
+        self.level = rng.uniform(0.3, 0.9)
+        self.total = {ch: rng.uniform(1e4, 6e4) for ch in self.dc_channels}
+        self.today = {ch: 0.0 for ch in self.dc_channels}
+        self.t_last = None
+        self.fragments = []
+
+    def _values(self, t):
+        """
+        Physical values of one response, keyed like the decoded infos.
+        """
+        rng = self.rng
+        self.level = min(1.0, max(0.0, self.level + rng.uniform(-0.05, 0.05)))
+        dt = 0 if self.t_last is None else t - self.t_last
+        self.t_last = t
+        v = {}
+        p_ac = 0.0
+        for ch in self.dc_channels:
+            p = self.peak_power * self.level * rng.uniform(0.9, 1.0)
+            u = rng.uniform(28.0, 34.0)
+            self.today[ch] += p * dt / 3600
+            self.total[ch] += p * dt / 3600
+            v[f'{ch}/power'] = p
+            v[f'{ch}/voltage'] = u
+            v[f'{ch}/current'] = p / u
+            v[f'{ch}/totalenergy'] = self.total[ch]
+            v[f'{ch}/todaysenergy'] = self.today[ch]
+            p_ac += p * 0.95
+        u_ac = rng.uniform(228.0, 234.0)
+        v['0/powerAC'] = p_ac
+        v['0/voltageAC'] = u_ac
+        v['0/currentAC'] = p_ac / u_ac
+        v['0/frequency'] = rng.uniform(49.95, 50.05)
+        v['0/temperature'] = 20 + 25 * self.level
+        v['0/pctload'] = 100 * self.level
+        return v
+
+    def respond(self, t, dtu):
+        """
+        Build all fragments of a fresh response.
+        :param dtu: HM address of the requester (bytes 5..8 of the request),
+                    the destination of the fragments
+        """
+        values = self._values(t)
+        chunks = []
+        for cmd, layout in self.layouts:
+            words = []
+            for f, kind in zip(layout.fields, layout.struct.format.lstrip('<>!=@')):
+                x = 0
+                if f is not None and f.channel is not None:
+                    x = values.get(f'{f.channel}/{f.name}', 0)
+                    x = int(round(x * f.scale)) if f.scale else int(x)
+                words.append(x % (_word_max[kind] + 1))
+            chunks.append(layout.struct.pack(*words))
+        chunks[-1] += struct.pack('>H', crc16(b''.join(chunks)))
+        self.fragments = []
+        for (cmd, layout), data in zip(self.layouts, chunks):
+            p = b'\x95' + self.addr + dtu + bytes([cmd]) + data
+            self.fragments.append(p + bytes([crc8(p)]))
+        return self.fragments
+
+
+class _SimReady:
+    """
+    Readiness source: wakes the receive engine when a fragment arrives.
+    """
+
+    def __init__(self, radio):
+        self.radio = radio
+        self._handles = []
+
+    def start(self, loop, callback):
+        clock = self.radio.clock
+
+        def notify(t):
+            self._handles = [h for h in self._handles if not h.cancelled()]
+            self._handles.append(loop.call_later(max(0.0, t - clock()), callback))
+        self.radio._notify = notify
+
+    # arrivals are scheduled whether anyone waits or not
+    def arm(self):
+        pass
+
+    def disarm(self):
+        pass
+
+    def stop(self):
+        self.radio._notify = None
+        for h in self._handles:
+            h.cancel()
+        self._handles = []
+
+
+class SimulatedRadio(Radio):
+    FIFO_DEPTH = 3
+
+    def __init__(self, serials, loss=0.0, latency=0.004, jitter=0.002, gap=0.003,
+                 channels=(3, 23, 61, 75, 83), channel_weights=None, preference=6,
+                 tx_channels=None, seed=0, clock=time.monotonic):
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.gap = gap
+        self.tx_channels = tx_channels
+        self.inverters = {}
+        self.weights = {}
+        for serial in serials:
+            inv = SimulatedInverter(serial, self.rng)
+            self.inverters[inv.addr] = inv
+            if channel_weights is not None:
+                w = dict(channel_weights)
+            else:
+                w = {ch: 1 for ch in channels}
+                w[self.rng.choice(channels)] = preference
+            self.weights[inv.addr] = (list(w.keys()), list(w.values()))
+        self.channel = None
+        self.listening = False
+        self.writing_addr = None
+        self.fifo = deque()
+        self._pending = []
+        self._seq = 0
+        self._notify = None
+        self.stats = {'tx': 0, 'answered': 0, 'sent': 0, 'lost': 0, 'missed': 0, 'overflow': 0, 'received': 0}
+
+    def readiness(self):
+        return _SimReady(self)
+
+    def _advance(self):
+        # deliver or drop everything that arrived up to now, judged by the
+        # channel the radio has been on since the last state change
+        now = self.clock()
+        pending = self._pending
+        while pending and pending[0][0] <= now:
+            t, seq, channel, payload = heapq.heappop(pending)
+            if not self.listening or channel != self.channel:
+                self.stats['missed'] += 1
+            elif len(self.fifo) >= self.FIFO_DEPTH:
+                self.stats['overflow'] += 1
+            else:
+                self.fifo.append(payload)
+
+    def setChannel(self, channel):
+        self._advance()
+        self.channel = channel
+
+    def startListening(self):
+        self._advance()
+        self.listening = True
+
+    def stopListening(self):
+        self._advance()
+        self.listening = False
+
+    def openReadingPipe(self, pipe, address):
+        pass
+
+    def openWritingPipe(self, address):
+        self.writing_addr = bytes(address)
+
+    def write(self, payload):
+        self._advance()
+        self.stats['tx'] += 1
+        payload = bytes(payload)
+        if len(payload) < 11 or payload[0] != 0x15 or crc8(payload[:-1]) != payload[-1]:
+            return True
+        if self.tx_channels is not None and self.channel not in self.tx_channels:
+            return True
+        inv = self.inverters.get(payload[1:5])
+        if inv is None or self.writing_addr != b'\x01' + inv.addr:
+            return True
+        now = self.clock()
+        mid = payload[9]
+        if mid == 0x80:
+            fragments = inv.respond(now, payload[5:9])
+        elif mid & 0x80 and 0 < mid & 0x7f <= len(inv.fragments):
+            fragments = [inv.fragments[(mid & 0x7f) - 1]]
+        else:
+            return True
+        self.stats['answered'] += 1
+        channels, weights = self.weights[inv.addr]
+        t = now + self.latency + self.rng.uniform(0, self.jitter)
+        for p in fragments:
+            self.stats['sent'] += 1
+            if self.rng.random() < self.loss:
+                self.stats['lost'] += 1
+            else:
+                channel = self.rng.choices(channels, weights)[0]
+                self._seq += 1
+                heapq.heappush(self._pending, (t, self._seq, channel, p))
+                if self._notify is not None:
+                    self._notify(t)
+            t += self.gap
+        return True
+
+    def available(self):
+        self._advance()
+        return len(self.fifo) > 0
+
+    def available_pipe(self):
+        self._advance()
+        return (len(self.fifo) > 0, 1)
+
+    def getDynamicPayloadSize(self):
+        return len(self.fifo[0]) if self.fifo else 0
+
+    def read(self, size):
+        self._advance()
+        if not self.fifo:
+            return b''
+        self.stats['received'] += 1
+        return self.fifo.popleft()[:size]
+
+    def flush_rx(self):
+        self._advance()
+        self.fifo.clear()
+
+    def flush_tx(self):
+        pass
@@ -0,0 +1,98 @@
+"""
+Sunrise and sunset from latitude and longitude, computed offline.
+
+sun_times() is the usual sunrise equation (solar mean anomaly, equation of
+the center, declination, hour angle for a solar altitude of -0.833
+degrees), the same approximation the Sonne.h of the HoyDtuSim firmware
+uses; it is good to a minute or two, plenty for knowing when the
+inverters have light.
+
+Daylight tells the radio loop what to do at a given time:
+
+- 'day' from `dawn` seconds before sunrise until sunset: poll as usual
+- 'dusk' for `dusk` seconds after sunset: poll slower, the intervals
+  doubling every `slowdown` seconds
+- 'night' after that: radio off until `dawn` seconds before the next
+  sunrise
+"""
+import math
+from datetime import datetime, timedelta, timezone
+
+_J2000 = 2451545.0          # Julian date of 2000-01-01 12:00 UTC
+_UNIX_EPOCH = 2440587.5     # Julian date of 1970-01-01 00:00 UTC
+_ORDINAL_JD = 1721424.5     # Julian date at 0:00 UTC of date.toordinal() 0
+
+
+def _sin(deg):
+    return math.sin(math.radians(deg))
+
+
+def sun_times(day, latitude, longitude):
+    """
+    :param day: a date (UTC)
+    :param longitude: degrees east
+    :return: (sunrise, sunset) as unix times; (None, None) if the sun stays
+             below the horizon, and the whole day if it stays above
+    """
+    n = math.ceil(day.toordinal() + _ORDINAL_JD - _J2000 + 0.0008)
+    j = n - longitude / 360                                     # mean solar noon
+    m = (357.5291 + 0.98560028 * j) % 360                       # mean anomaly
+    c = 1.9148 * _sin(m) + 0.02 * _sin(2 * m) + 0.0003 * _sin(3 * m)
+    ecliptic = (m + c + 180 + 102.9372) % 360
+    transit = _J2000 + j + 0.0053 * _sin(m) - 0.0069 * _sin(2 * ecliptic)
+    declination = math.asin(_sin(ecliptic) * _sin(23.4397))
+    phi = math.radians(latitude)
+    cos_hour = (_sin(-0.833) - math.sin(phi) * math.sin(declination)) / (math.cos(phi) * math.cos(declination))
+    if cos_hour > 1:
+        return None, None
+    if cos_hour < -1:
+        start = (day.toordinal() + _ORDINAL_JD - _UNIX_EPOCH) * 86400
+        return start, start + 86400
+    hour = math.degrees(math.acos(cos_hour)) / 360
+    return (transit - hour - _UNIX_EPOCH) * 86400, (transit + hour - _UNIX_EPOCH) * 86400
+
+
+class Daylight:
+    def __init__(self, latitude, longitude, dawn=1800, dusk=3600, slowdown=1200):
+        """
+        :param dawn: seconds before sunrise to start polling
+        :param dusk: seconds after sunset to keep polling, ever slower
+        :param slowdown: seconds after which the polling interval doubles at dusk
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.dawn = dawn
+        self.dusk = dusk
+        self.slowdown = slowdown
+        self._days = {}
+
+    def times(self, day):
+        t = self._days.get(day)
+        if t is None:
+            if len(self._days) > 8:
+                self._days.clear()
+            t = self._days[day] = sun_times(day, self.latitude, self.longitude)
+        return t
+
+    def phase(self, t):
+        """
+        :param t: unix time
+        :return: ('day', 1), ('dusk', interval factor) or ('night', unix
+                 time to wake up at)
+        """
+        today = datetime.fromtimestamp(t, timezone.utc).date()
+        days = [today + timedelta(days=d) for d in (-1, 0, 1, 2)]
+        for day in days[:3]:
+            sunrise, sunset = self.times(day)
+            if sunrise is not None and sunrise - self.dawn <= t < sunset:
+                return 'day', 1
+        for day in days[:3]:
+            sunrise, sunset = self.times(day)
+            if sunset is not None and sunset <= t < sunset + self.dusk:
+                return 'dusk', 2 ** ((t - sunset) / self.slowdown)
+        for day in days:
+            sunrise, sunset = self.times(day)
+            if sunrise is not None and sunrise - self.dawn > t:
+                return 'night', sunrise - self.dawn
+        # polar night: look again in a day
+        return 'night', t + 86400
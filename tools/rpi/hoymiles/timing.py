@@ -0,0 +1,160 @@
+"""
+Timing spans for the hot path (--profile).
+
+    t0 = profiler.start()
+    ...
+    profiler.stop(('decode', model, cmd), t0)
+
+A span name is a string or a tuple (stage, details...). Profiler adds the
+duration to per-name totals and, every `interval` seconds, report() logs
+a summary (logger 'ahoy.profile'): count, total, mean and max time per
+span and its share of the wall clock time. Spans come from the radio
+threads and the output loop at once; the totals are updated under a lock,
+which costs next to nothing as long as nobody else holds it. With a trace file, every span is also written as a
+Chrome trace event (chrome://tracing, ui.perfetto.dev), one track per
+stage.
+
+When profiling is off, the code uses NULL, whose methods do nothing; an
+instrumented stage then costs two method calls.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+clock = time.monotonic_ns
+log = logging.getLogger('ahoy.profile')
+
+
+def _label(name):
+    if isinstance(name, tuple):
+        return ' '.join(str(part) for part in name)
+    return name
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, interval=60, trace=None):
+        """
+        :param interval: seconds between summaries, 0 for one at close() only
+        :param trace: file name for Chrome trace events, or None
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._totals = {}           # name -> [count, total ns, max ns]
+        self._since = clock()
+        self._trace = None
+        self._events = []
+        if trace:
+            self._trace = open(trace, 'w')
+            self._trace.write('[')
+            self._trace.flush()     # nothing buffered to be duplicated by a fork()
+            self._tracks = {}       # stage -> Chrome tid
+            self._pid = os.getpid()
+            self._first = True
+
+    def start(self):
+        return clock()
+
+    def stop(self, name, t0):
+        self.span(name, t0, clock())
+
+    def span(self, name, t0, t1):
+        """
+        Account for a span that ran from t0 to t1 (monotonic ns).
+        """
+        d = t1 - t0
+        with self._lock:
+            t = self._totals.get(name)
+            if t is None:
+                self._totals[name] = [1, d, d]
+            else:
+                t[0] += 1
+                t[1] += d
+                if d > t[2]:
+                    t[2] = d
+            if self._trace is not None:
+                self._events.append((name, t0, d))
+
+    def summary(self, now=None, totals=None):
+        """
+        :return: the summary since the last one, as text
+        """
+        if now is None:
+            now = clock()
+        if totals is None:
+            totals = self._totals
+        wall = max(1, now - self._since)
+        lines = [f"profile over {wall/1e9:.1f} s:",
+                 f"  {'span':32s} {'count':>7s} {'total ms':>10s} {'mean us':>9s} {'max us':>9s} {'share':>6s}"]
+        for name, (count, total, longest) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+            lines.append(f"  {_label(name):32s} {count:7d} {total/1e6:10.1f} {total/count/1e3:9.1f}"
+                         f" {longest/1e3:9.1f} {100*total/wall:5.1f}%")
+        return '\n'.join(lines)
+
+    def report(self):
+        """
+        Log the summary and flush the trace if the interval is over.
+        """
+        now = clock()
+        if self.interval and now - self._since >= self.interval * 1e9:
+            self._report(now)
+
+    def _report(self, now):
+        with self._lock:
+            totals, self._totals = self._totals, {}
+            events, self._events = self._events, []
+        log.info("%s", self.summary(now, totals))
+        self._since = now
+        self._flush_trace(events)
+
+    def _flush_trace(self, events):
+        if self._trace is None:
+            return
+        out = []
+        for name, t0, d in events:
+            stage = name[0] if isinstance(name, tuple) else name
+            tid = self._tracks.get(stage)
+            if tid is None:
+                tid = self._tracks[stage] = len(self._tracks) + 1
+                out.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                            'args': {'name': stage}})
+            out.append({'name': _label(name), 'cat': stage, 'ph': 'X', 'pid': self._pid, 'tid': tid,
+                        'ts': t0 / 1e3, 'dur': d / 1e3})
+        for event in out:
+            if not self._first:
+                self._trace.write(',\n')
+            self._first = False
+            self._trace.write(json.dumps(event))
+        self._trace.flush()
+
+    def close(self):
+        self._report(clock())
+        if self._trace is not None:
+            self._trace.write('\n]\n')
+            self._trace.close()
+            self._trace = None
+
+
+class NullProfiler:
+    enabled = False
+
+    def start(self):
+        return 0
+
+    def stop(self, name, t0):
+        pass
+
+    def span(self, name, t0, t1):
+        pass
+
+    def report(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL = NullProfiler()
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from hoymiles.analyze import increments, load, daily, string_energy, strings, main
+from hoymiles.archive import ArchiveWriter
+
+S = 1000000000
+NAN = float('nan')
+
+
+def steps(values, start=None):
+    counter = np.array(values, dtype=float)[:, None]
+    if start is None:
+        start = np.zeros(len(values), dtype=bool)
+        start[0] = True
+    return increments(counter, np.array(start))[:, 0].tolist()
+
+
+def test_steady_counter():
+    assert steps([100, 110, 125, 125]) == [0, 10, 15, 0]
+
+
+def test_low_word_rollover():
+    assert steps([65530, 5, 20]) == [0, 11, 15]
+
+
+def test_counter_reset_counts_the_new_reading():
+    assert steps([5000, 5010, 10, 30]) == [0, 10, 10, 20]
+
+
+def test_missing_high_word():
+    # 70000 Wh: the high word (1) of the first fragment went missing for
+    # the second reading and came back for the third
+    assert steps([70000, 70000 - 65536 + 6, 70020, 70030]) == [0, 6, 14, 10]
+
+
+def test_missing_values_and_inverter_boundaries():
+    assert steps([100, NAN, 130, 5000, 5020], start=[True, False, False, True, False]) == [0, 0, 30, 0, 20]
+
+
+def ts(day, hour):
+    return int(datetime(2024, 6, day, hour).timestamp() * S)
+
+
+def write_archive(directory, days):
+    """
+    days: {serial: [(day, [(hour, power, (total1, total2), (today1, today2))])]}
+    """
+    archive = ArchiveWriter(str(directory))
+    for serial, readings in days.items():
+        for day, rows in readings:
+            for hour, power, totals, todays in rows:
+                values = {'0/powerAC': power}
+                for ch, (total, today) in enumerate(zip(totals, todays), 1):
+                    values[f'{ch}/totalenergy'] = total
+                    values[f'{ch}/todaysenergy'] = today
+                archive.append(serial, 'HM-600', ts(day, hour), values)
+    archive.close()
+
+
+def test_yield_per_day(tmp_path):
+    write_archive(tmp_path, {'114174608145': [
+        (1, [(8, 100.0, (65000, 2000), (0, 0)), (12, 400.0, (65300, 2250), (300, 250)),
+             (18, 50.0, (65500, 2400), (500, 400))]),
+        # the 16 bit low word of string 1 rolls over in the morning
+        (2, [(8, 90.0, (65510, 2400), (10, 0)), (12, 380.0, (100, 2500), (136, 100))]),
+    ]})
+    report = daily(load(str(tmp_path)))
+    assert [(r['day'], r['yield'], r['yield_daily_counters'], r['peak_power']) for r in report] == [
+        ('2024-06-01', 900.0, 900.0, 400.0),
+        ('2024-06-02', 236.0, 236.0, 380.0),
+    ]
+
+
+def test_days_and_serials_can_be_selected(tmp_path):
+    write_archive(tmp_path, {
+        '114174608145': [(day, [(12, 100.0, (day * 10, 0), (0, 0))]) for day in (1, 2, 3)],
+        '114174608146': [(2, [(12, 100.0, (0, 0), (0, 0))])],
+    })
+    readings = load(str(tmp_path), ['114174608145'], '2024-06-02', '2024-06-03')
+    assert len(readings) == 2
+    assert readings.day.astype(str).tolist() == ['2024-06-02', '2024-06-03']
+    assert len(load(str(tmp_path))) == 4
+
+
+def test_under_performing_string(tmp_path):
+    rows = lambda e1, e2: [(8, 0.0, (0, 0), (0, 0)), (18, 0.0, (e1, e2), (0, 0))]
+    write_archive(tmp_path, {
+        '114174608145': [(1, rows(1000, 1000))],
+        '114174608146': [(1, rows(1000, 500))],
+    })
+    readings = load(str(tmp_path))
+    energy, present = string_energy(readings)
+    assert energy[:, :2].tolist() == [[1000, 1000], [1000, 500]]
+    assert present.tolist() == [[True, True, False, False]] * 2
+    report = strings(readings.serials, energy, present, threshold=0.8)
+    assert [(r['serial'], r['channel'], r['ratio'], r['low']) for r in report] == [
+        ('114174608145', 1, 1.0, False), ('114174608145', 2, 1.0, False),
+        ('114174608146', 1, 1.0, False), ('114174608146', 2, 0.5, True),
+    ]
+
+
+def test_command(tmp_path, capsys):
+    write_archive(tmp_path, {'114174608145': [(1, [(8, 10.0, (0, 0), (0, 0)), (9, 20.0, (5, 5), (5, 5))])]})
+    assert main(['-a', str(tmp_path), '--json']) == 0
+    assert '"yield": 10.0' in capsys.readouterr().out
+    assert main(['-a', str(tmp_path), '--from', '2024-07-01']) == 1
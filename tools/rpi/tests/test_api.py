@@ -0,0 +1,80 @@
+import json
+import http.client
+
+import pytest
+
+from hoymiles.api import Snapshots, ApiServer
+from hoymiles.rollup import Rollups
+
+READING = {'emeter': {'0/powerAC': 21.7}, 'emeter-dc': {'1/voltage': 28.8}}
+
+
+def test_snapshot_documents():
+    snapshots = Snapshots()
+    assert snapshots.get('114174608145') is None
+    assert snapshots.get()[1] == b'{}'
+    snapshots.update('114174608145', 'HM-600', 1650000000.0, READING)
+    etag, body = snapshots.get('114174608145')
+    assert json.loads(body) == dict(READING, serial='114174608145', model='HM-600', ts=1650000000.0)
+    snapshots.update('112122222222', 'HM-300', 1650000001.0, {'emeter': {'0/powerAC': 5.0}})
+    all_etag, all_body = snapshots.get()
+    assert list(json.loads(all_body)) == ['112122222222', '114174608145']
+    assert snapshots.get() == (all_etag, all_body)
+    snapshots.update('112122222222', 'HM-300', 1650000006.0, {'emeter': {'0/powerAC': 6.0}})
+    assert snapshots.get()[0] != all_etag
+    assert snapshots.get('114174608145')[0] == etag
+
+
+@pytest.fixture
+def server():
+    snapshots = Snapshots()
+    snapshots.update('114174608145', 'HM-600', 1650000000.0, READING)
+    rollups = Rollups(((60, 10), (900, 4)))
+    for i in range(3):
+        rollups.add('114174608145', 60 * i, {'0/powerAC': float(i)})
+    server = ApiServer(snapshots, rollups, port=0, host='127.0.0.1')
+    server.start()
+    yield server
+    server.stop()
+
+
+def get(server, path, headers={}):
+    connection = http.client.HTTPConnection('127.0.0.1', server.httpd.server_address[1], timeout=5)
+    try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.getheader('ETag'), response.read()
+    finally:
+        connection.close()
+
+
+def test_latest_readings(server):
+    status, etag, body = get(server, '/api/inverters/114174608145')
+    assert status == 200 and etag
+    assert json.loads(body)['emeter']['0/powerAC'] == 21.7
+    status, etag_all, body = get(server, '/api/inverters')
+    assert status == 200 and list(json.loads(body)) == ['114174608145']
+
+
+def test_not_modified(server):
+    status, etag, body = get(server, '/api/inverters/114174608145')
+    assert get(server, '/api/inverters/114174608145', {'If-None-Match': etag}) == (304, etag, b'')
+    assert get(server, '/api/inverters/114174608145', {'If-None-Match': 'W/' + etag})[0] == 304
+    assert get(server, '/api/inverters/114174608145', {'If-None-Match': '"other"'})[0] == 200
+
+
+def test_history(server):
+    status, etag, body = get(server, '/api/history/114174608145/0/powerAC?since=60')
+    assert status == 200
+    doc = json.loads(body)
+    assert doc['resolution'] == 60 and doc['key'] == '0/powerAC'
+    assert doc['buckets'] == [[60, 1.0, 1.0, 1.0, 1.0, 1], [120, 2.0, 2.0, 2.0, 2.0, 1]]
+    status, etag, body = get(server, '/api/history/114174608145/0/powerAC?resolution=900')
+    assert json.loads(body)['buckets'] == [[0, 0.0, 2.0, 1.0, 2.0, 3]]
+
+
+def test_errors(server):
+    assert get(server, '/api/inverters/116111111111')[0] == 404
+    assert get(server, '/api/other')[0] == 404
+    assert get(server, '/api/history/114174608145/0/powerAC?resolution=5')[0] == 400
+    assert get(server, '/api/history/114174608145/0/powerAC?since=yesterday')[0] == 400
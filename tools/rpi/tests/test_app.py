@@ -0,0 +1,44 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from hoymiles.app import Ahoy, parse_args, main
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def make_app(tmp_path, config='', *args):
+    path = tmp_path / 'ahoy.conf'
+    path.write_text(config)
+    return Ahoy(parse_args(['-c', str(path), '-m', '0', *args]))
+
+
+def test_import_loads_no_driver_or_broker_client():
+    code = "import sys, hoymiles.app; print(','.join(m for m in ('paho', 'RF24', 'numpy') if m in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ''
+
+
+def test_settings_are_read_but_nothing_is_opened(tmp_path, capsys):
+    app = make_app(tmp_path, '[inverter]\nserial = 114174608145,112122222222\n[rollup]\nresolutions = 60:10\n')
+    assert app.l_inv_ser == ['114174608145', '112122222222']
+    assert app.rollups.resolutions == ((60, 10),)
+    assert app.radios == {}
+    assert app.mqtt_output is None and app.publisher is None and app.metrics_server is None
+    assert app.outFile is None and app.archive is None
+
+
+def test_radio_sections_inherit_from_radio(tmp_path, capsys):
+    app = make_app(tmp_path, '[radio]\nbackend = simulator\nloss = 0.2\n[radio.2]\nloss = 0.5\n')
+    assert app.radio_sections == ['radio', 'radio.2']
+    assert app.cfg.get('radio.2', 'backend') == 'simulator'
+    assert app.cfg.get('radio.2', 'loss') == '0.5'
+
+
+def test_analyze_subcommand(capsys):
+    with pytest.raises(SystemExit) as e:
+        main(['analyze', '--help'])
+    assert e.value.code == 0
+    assert 'usage' in capsys.readouterr().out
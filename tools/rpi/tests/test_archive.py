@@ -0,0 +1,118 @@
+import math
+import os
+
+import pytest
+
+from hoymiles.archive import (ArchiveWriter, SegmentWriter, Segment, INDEX_EVERY, MISSING_UINT,
+                              segment_name, segment_rows, segments)
+
+S = 1000000000
+KEYS = ['0/powerAC', '1/totalenergy']
+
+
+def write(path, n, t0=0):
+    writer = SegmentWriter(str(path), KEYS)
+    for i in range(n):
+        writer.append(t0 + i * S, {'0/powerAC': float(i), '1/totalenergy': 1000 + i})
+    writer.close()
+
+
+def test_rows_come_back_in_column_order(tmp_path):
+    path = tmp_path / 'day.ahc'
+    writer = SegmentWriter(str(path), KEYS)
+    writer.append(S, {'0/powerAC': 21.5, '1/totalenergy': 5})
+    writer.append(2 * S, {'1/totalenergy': -1})
+    writer.close()
+    segment = Segment(str(path))
+    assert segment.keys == KEYS
+    first, second = segment.iter_rows()
+    assert first == (S, 21.5, 5)
+    assert second[0] == 2 * S and math.isnan(second[1])
+    assert second[2] == MISSING_UINT
+    segment.close()
+
+
+@pytest.mark.parametrize('value, stored', [
+    (0, 0), (MISSING_UINT - 1, MISSING_UINT - 1), (1234.9, 1234),
+    (-5, MISSING_UINT), (MISSING_UINT, MISSING_UINT), (2 ** 32 + 7, MISSING_UINT),
+    (float('nan'), MISSING_UINT), (float('inf'), MISSING_UINT),
+])
+def test_counters_out_of_range_are_missing(tmp_path, value, stored):
+    path = tmp_path / 'day.ahc'
+    writer = SegmentWriter(str(path), KEYS)
+    writer.append(S, {'0/powerAC': 1.0, '1/totalenergy': value})
+    writer.close()
+    segment = Segment(str(path))
+    (row,) = segment.iter_rows()
+    assert row[2] == stored
+    segment.close()
+
+
+def test_time_ranges_use_the_index(tmp_path):
+    path = tmp_path / 'day.ahc'
+    n = 5 * INDEX_EVERY + 3
+    write(path, n)
+    assert os.path.getsize(tmp_path / 'day.idx') == 6 * 16
+    segment = Segment(str(path))
+    assert segment.rows == n == segment_rows(str(path))
+    assert segment.row_range(100 * S, 200 * S) == (100, 200)
+    assert segment.row_range(int(99.5 * S)) == (100, n)
+    assert segment.row_range(None, 0) == (0, 0)
+    assert segment.row_range(10 * n * S) == (n, n)
+    assert [r[0] for r in segment.iter_rows(3 * S, 6 * S)] == [3 * S, 4 * S, 5 * S]
+    segment.close()
+
+
+def test_reopening_continues_the_segment(tmp_path):
+    path = tmp_path / 'day.ahc'
+    write(path, 100)
+    write(path, 10, t0=100 * S)
+    segment = Segment(str(path))
+    assert [r[0] // S for r in segment.iter_rows()] == list(range(110))
+    assert segment.row_range(64 * S, 65 * S) == (64, 65)
+    segment.close()
+
+
+def test_torn_row_is_cut_off_on_reopening(tmp_path):
+    path = tmp_path / 'day.ahc'
+    idx = tmp_path / 'day.idx'
+    write(path, INDEX_EVERY + 1)
+    # crash in the middle of the last row, after its index entry was written
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 5)
+    with open(idx, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    write(path, 2, t0=1000 * S)
+    segment = Segment(str(path))
+    times = [r[0] // S for r in segment.iter_rows()]
+    assert times == list(range(INDEX_EVERY)) + [1000, 1001]
+    assert os.path.getsize(idx) == 2 * 16
+    assert segment.row_range(1000 * S) == (INDEX_EVERY, INDEX_EVERY + 2)
+    segment.close()
+
+
+def test_to_numpy(tmp_path):
+    np = pytest.importorskip('numpy')
+    path = tmp_path / 'day.ahc'
+    write(path, 10)
+    segment = Segment(str(path))
+    a = segment.to_numpy(2 * S, 5 * S)
+    assert a['ts'].tolist() == [2 * S, 3 * S, 4 * S]
+    assert a['0/powerAC'].dtype == np.float32
+    assert a['1/totalenergy'].tolist() == [1002, 1003, 1004]
+    del a
+    segment.close()
+
+
+def test_archive_writer_segments_per_inverter_and_day(tmp_path):
+    archive = ArchiveWriter(str(tmp_path))
+    t0 = 1650000000 * S
+    day = 86400 * S
+    for t in (t0, t0 + S, t0 + day):
+        archive.append('114174608145', 'HM-600', t, {'0/powerAC': 1.0})
+    archive.close()
+    paths = segments(str(tmp_path), '114174608145')
+    assert [os.path.basename(p) for p in paths] == [segment_name(t0) + '.ahc', segment_name(t0 + day) + '.ahc']
+    assert [segment_rows(p) for p in paths] == [2, 1]
+    assert segments(str(tmp_path), '114174608145', t0 + day) == paths[1:]
+    assert segments(str(tmp_path), '116111111111') == []
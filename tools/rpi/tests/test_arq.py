@@ -0,0 +1,112 @@
+import heapq
+import random
+
+import pytest
+
+from hoymiles.arq import RttEstimator, SelectiveRepeat, REQUEST, TRIES
+from hoymiles.frames import hm_addr
+from hoymiles.models import ser_to_type
+from hoymiles.reassembly import Response
+from hoymiles.simulator import SimulatedInverter
+
+SERIAL = '116111111111'     # HM-1200, four fragments
+DTU = '99978563412'
+
+
+def run_cycle(inverter, rtt, lose, tries=TRIES, latency=0.005, gap=0.003, deadline=1.0):
+    """
+    One polling cycle over a link in virtual time, as radio_loop runs it.
+    :param lose: lose(fragment number, times it was asked for) -> whether
+                 that answer is lost
+    :return: (response, arq, transmissions)
+    """
+    model, radio_key, fragments = ser_to_type(inverter.serial)
+    response = Response(inverter.serial, model, fragments)
+    answers = inverter.respond(0.0, hm_addr(DTU))
+    arrivals = []
+    sent = {}
+    asked = {}
+
+    def send(n, t):
+        sent[n] = sent.get(n, 0) + 1
+        for i, p in enumerate(answers if n == REQUEST else [answers[n - 1]]):
+            m = p[9] & 0x7f
+            asked[m] = asked.get(m, 0) + 1
+            if not lose(m, asked[m]):
+                heapq.heappush(arrivals, (t + latency + i * gap, p))
+
+    now = 0.0
+    send(REQUEST, now)
+    arq = SelectiveRepeat(response, rtt, now, tries=tries)
+    while now < deadline:
+        resend, wake = arq.due(now)
+        if wake is None:
+            break
+        for n in resend:
+            send(n, now)
+            arq.transmitted(n, now)
+        now = min(wake, arrivals[0][0]) if arrivals else wake
+        while arrivals and arrivals[0][0] <= now:
+            t, p = heapq.heappop(arrivals)
+            if response.add(p):
+                arq.received(p[9] & 0x7f, t)
+    return response, arq, sum(sent.values())
+
+
+def test_lossless_cycle_needs_one_request():
+    rtt = RttEstimator()
+    response, arq, transmissions = run_cycle(SimulatedInverter(SERIAL, random.Random(1)), rtt, lambda n, k: False)
+    assert response.crc_ok()
+    assert transmissions == 1
+    assert abs(rtt.srtt - 0.005) < 1e-9
+
+
+def test_only_missing_fragments_are_refetched():
+    # fragments 2 and 4 are lost once
+    response, arq, transmissions = run_cycle(SimulatedInverter(SERIAL, random.Random(1)), RttEstimator(),
+                                             lambda n, k: n in (2, 4) and k == 1)
+    assert response.crc_ok()
+    assert sorted(n for n in arq.sent if n != REQUEST) == [2, 4]
+    assert transmissions == 3
+
+
+@pytest.mark.parametrize('loss', [0.15, 0.5])
+def test_cycles_complete_under_loss(loss):
+    # 0.5 is about what a link loses when the answers come on other
+    # channels than the one listened on
+    rng = random.Random(7)
+    inverter = SimulatedInverter(SERIAL, rng)
+    rtt = RttEstimator()
+    complete = 0
+    for _ in range(500):
+        response, arq, transmissions = run_cycle(inverter, rtt, lambda n, k: rng.random() < loss)
+        complete += response.crc_ok()
+    assert complete >= 495
+
+
+def test_silent_inverter_gets_as_many_requests_as_a_fragment():
+    response, arq, transmissions = run_cycle(SimulatedInverter(SERIAL, random.Random(1)), RttEstimator(),
+                                             lambda n, k: True, tries=5, deadline=10.0)
+    assert arq.failed
+    assert not response.fragments
+    assert transmissions == 5
+
+
+def test_cycle_is_given_up_when_a_fragment_used_its_tries():
+    response, arq, transmissions = run_cycle(SimulatedInverter(SERIAL, random.Random(1)), RttEstimator(),
+                                             lambda n, k: n == 3, tries=4, deadline=10.0)
+    assert arq.failed
+    assert len(arq.sent[3]) == 4
+    assert 3 not in response.fragments
+
+
+def test_rtt_ignores_answers_to_retransmissions():
+    rtt = RttEstimator()
+    rtt.sample(0.005)
+    response = Response(SERIAL, 'HM-1200', 4)
+    arq = SelectiveRepeat(response, rtt, 0.0)
+    arq.transmitted(2, 0.1)
+    arq.transmitted(2, 0.2)
+    arq.received(2, 0.21)
+    assert rtt.srtt == 0.005
+    assert RttEstimator().rto() == 0.03
@@ -0,0 +1,74 @@
+import pytest
+
+from hoymiles import capture
+from hoymiles.capture import CaptureWriter, CaptureReader, FrameRing, KIND_TX, KIND_RX, KIND_SEGMENT, NO_CHANNEL
+
+S = 1000000000
+
+
+def clocks(monkeypatch, wall_ns, mono_ns):
+    monkeypatch.setattr(capture.time, 'time_ns', lambda: wall_ns)
+    monkeypatch.setattr(capture.time, 'monotonic_ns', lambda: mono_ns)
+
+
+def test_records_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / 'radio.cap'
+    clocks(monkeypatch, 1000 * S, 5 * S)
+    writer = CaptureWriter(path)
+    writer.tx(6 * S, 3, '114174608145', bytearray(b'\x15request'))
+    writer.rx(6 * S + 4000000, 3, 40, '114174608145', b'\x95answer')
+    writer.close()
+    reader = CaptureReader(path)
+    records = list(reader)
+    assert [(r.t_ns, r.kind, r.ch_tx, r.ch_rx, r.serial, bytes(r.payload)) for r in records] == [
+        (6 * S, KIND_TX, 3, NO_CHANNEL, '114174608145', b'\x15request'),
+        (6 * S + 4000000, KIND_RX, 3, 40, '114174608145', b'\x95answer'),
+    ]
+    assert reader.wall_ns(6 * S) == 1001 * S
+
+
+def test_appended_run_has_its_own_anchors(tmp_path, monkeypatch):
+    path = tmp_path / 'radio.cap'
+    clocks(monkeypatch, 1000 * S, 5 * S)
+    writer = CaptureWriter(path)
+    writer.tx(6 * S, 3, '1', b'a')
+    writer.close()
+    # the next run, after a reboot: the monotonic clock started over
+    clocks(monkeypatch, 2000 * S, 2 * S)
+    writer = CaptureWriter(path)
+    writer.tx(3 * S, 3, '1', b'b')
+    writer.close()
+    reader = CaptureReader(path)
+    walls = [(r.kind, reader.wall_ns(r.t_ns)) for r in reader]
+    assert walls == [(KIND_TX, 1001 * S), (KIND_SEGMENT, 2000 * S), (KIND_TX, 2001 * S)]
+
+
+def test_truncated_last_record_is_skipped(tmp_path):
+    path = tmp_path / 'radio.cap'
+    writer = CaptureWriter(path)
+    writer.tx(1, 3, '1', b'complete')
+    writer.tx(2, 3, '1', b'torn off')
+    writer.close()
+    path.write_bytes(path.read_bytes()[:-3])
+    assert [bytes(r.payload) for r in CaptureReader(path)] == [b'complete']
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+
+def test_ring_keeps_the_last_frames(tmp_path):
+    ring = FrameRing(3)
+    request = bytearray(b'req')
+    for i in range(5):
+        request[0] = i
+        ring.tx(i, 3, '1', request)
+        ring.rx(i, 3, 40, '1', b'ans%d' % i)
+    assert len(ring) == 3
+    path = tmp_path / 'dump.cap'
+    assert ring.dump(path) == 3
+    frames = [(r.t_ns, r.kind, bytes(r.payload)) for r in CaptureReader(path)]
+    assert frames == [(3, KIND_RX, b'ans3'), (4, KIND_TX, b'\x04eq'), (4, KIND_RX, b'ans4')]
@@ -0,0 +1,56 @@
+from hoymiles.channels import HopPlanner
+
+SERIAL = '114174608145'
+CHANNELS = [3, 23, 40, 61, 75]
+
+
+def test_successes_raise_the_rate_and_failures_lower_it():
+    planner = HopPlanner(CHANNELS, seed=1)
+    before = planner.rates(SERIAL, 3)
+    assert len(set(before.values())) == 1
+    planner.plan(SERIAL, 3)
+    planner.update(SERIAL, 3, {61: 0.01, 40: 0.01}, [(61, 4000000), (61, 7000000)])
+    after = planner.rates(SERIAL, 3)
+    assert after[61] > before[61]
+    assert after[40] < before[40]
+    assert after[3] == before[3]
+    # other TX channels learn on their own
+    assert planner.rates(SERIAL, 23) == before
+
+
+def test_failing_channel_is_picked_first_less_often():
+    planner = HopPlanner(CHANNELS, seed=7)
+    first = {ch: 0 for ch in CHANNELS}
+    for cycle in range(300):
+        channels, dwells = planner.plan(SERIAL, 3)
+        first[channels[0]] += 1
+        # every channel gets listened to; 40 never delivers, 61 always does
+        exposure = {ch: 0.005 for ch in CHANNELS}
+        received = [(61, 5000000)]
+        if channels[0] not in (40, 61):
+            received.append((channels[0], 5000000))
+        planner.update(SERIAL, 3, exposure, received)
+    assert first[40] < 10
+    assert first[61] > max(first[ch] for ch in CHANNELS if ch != 61)
+    assert sum(first.values()) == 300
+
+
+def test_plan_orders_and_sizes_the_dwells():
+    planner = HopPlanner(CHANNELS, dwell=0.005, min_dwell=0.002, max_dwell=0.02, seed=3)
+    for _ in range(50):
+        planner.plan(SERIAL, 3)
+        planner.update(SERIAL, 3, {ch: 0.005 for ch in CHANNELS}, [(75, 6000000), (75, 9000000)])
+    channels, dwells = planner.plan(SERIAL, 3)
+    assert sorted(channels) == CHANNELS
+    assert channels[0] == 75
+    # the first channel also covers the time until the response starts
+    assert abs(dwells[0] - 0.02 - 0.006) < 1e-9
+    assert all(0.002 <= d <= 0.02 for d in dwells[1:])
+
+
+def test_same_seed_same_plans():
+    plans = []
+    for _ in range(2):
+        planner = HopPlanner(CHANNELS, seed=11)
+        plans.append([planner.plan(SERIAL, 3)[0] for _ in range(20)])
+    assert plans[0] == plans[1]
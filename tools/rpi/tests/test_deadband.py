@@ -0,0 +1,98 @@
+from configparser import ConfigParser
+
+import pytest
+
+from hoymiles.mqtt import Deadband, Publisher, field_class
+
+SERIAL = '114174608145'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Client:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos, retain):
+        self.published.append((topic, payload))
+
+
+def cycle(power, voltage=230.0):
+    return [{'name': 'emeter', '0/powerAC': power, '0/voltageAC': voltage}]
+
+
+def test_bands_from_the_config():
+    cfg = ConfigParser()
+    cfg.read_string('[mqtt.deadband]\npower = 2%\nvoltage = 0.5\nenergy = 10\n')
+    band = Deadband(dict(cfg.items('mqtt.deadband', raw=True)))
+    assert band.bands == {'power': (0.0, 0.02), 'voltage': (0.5, 0.0), 'energy': (10.0, 0.0)}
+    assert Deadband.parse(' 5 % ') == (0.0, 0.05)
+    assert Deadband.parse(0.1) == (0.1, 0.0)
+    with pytest.raises(ValueError):
+        Deadband({'brightness': 1})
+
+
+def test_field_classes():
+    assert [field_class(k) for k in ('1/power', '0/powerAC', '0/voltageAC', '2/totalenergy',
+                                     '1/todaysenergy', '0/pctload', '0/frequency')] == \
+        ['power', 'power', 'voltage', 'energy', 'energy', 'load', 'frequency']
+
+
+def test_values_inside_the_band_are_suppressed():
+    band = Deadband({'power': '2%', 'voltage': 0.5}, keyframe=0)
+    assert band.value('t/p', '1/power', 100.0)
+    assert not band.value('t/p', '1/power', 101.9)
+    assert not band.value('t/p', '1/power', 98.1)
+    # measured from the last published value, not the last seen one
+    assert band.value('t/p', '1/power', 102.5)
+    assert band.value('t/v', '1/voltage', 30.0)
+    assert not band.value('t/v', '1/voltage', 30.5)
+    assert band.value('t/v', '1/voltage', 29.4)
+    # without a band every change goes out
+    assert band.value('t/f', '0/frequency', 50.0)
+    assert not band.value('t/f', '0/frequency', 50.0)
+    assert band.value('t/f', '0/frequency', 50.01)
+    assert band.suppressed == 4
+
+
+def test_document_goes_out_when_one_value_crosses():
+    band = Deadband({'power': 5}, keyframe=0)
+    assert band.document('t', {'a/power': 100.0, 'b/power': 50.0})
+    assert not band.document('t', {'a/power': 104.0, 'b/power': 46.0})
+    assert band.document('t', {'a/power': 104.0, 'b/power': 44.0})
+    # a new key is a change too
+    assert band.document('t', {'a/power': 104.0, 'b/power': 44.0, 'c/power': 1.0})
+
+
+def test_keyframes_publish_everything():
+    clock = Clock()
+    client = Client()
+    publisher = Publisher(client, ('json', 'keys'), deadband=Deadband({'power': 10}, keyframe=300, clock=clock))
+    publisher.publish_cycle(SERIAL, cycle(500.0))
+    assert len(client.published) == 3
+    client.published.clear()
+    clock.now = 60
+    publisher.publish_cycle(SERIAL, cycle(505.0))
+    assert client.published == []
+    clock.now = 120
+    publisher.publish_cycle(SERIAL, cycle(520.0))
+    assert [topic for topic, payload in client.published] == ['ahoy/114174608145/emeter/0/powerAC', 'ahoy/114174608145']
+    client.published.clear()
+    # an incomplete cycle does not count as the keyframe
+    clock.now = 300
+    publisher.publish_cycle(SERIAL, cycle(520.0), complete=False)
+    assert len(client.published) == 2
+    client.published.clear()
+    clock.now = 301
+    publisher.publish_cycle(SERIAL, cycle(520.0))
+    assert len(client.published) == 3
+    client.published.clear()
+    clock.now = 400
+    publisher.publish_cycle(SERIAL, cycle(520.0))
+    assert client.published == []
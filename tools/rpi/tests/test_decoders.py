@@ -0,0 +1,84 @@
+import struct
+
+import pytest
+
+from hoymiles.decoders import REGISTRY, Layout, Field, decode, decoders, measurement_keys
+
+
+def fragment(cmd, fmt, *words):
+    return bytes(9) + bytes([cmd]) + struct.pack(fmt, *words) + bytes(1)
+
+
+def test_hm600_values_and_power_sum():
+    state = {}
+    dc, ac = decode('HM-600', 0x01, fragment(0x01, '>HHHHHHHH', 7, 312, 845, 2637, 298, 901, 2685, 1), state)
+    assert dc == {'name': 'emeter-dc', '1/voltage': 31.2, '1/current': 8.45, '1/power': 263.7,
+                  '2/voltage': 29.8, '2/current': 9.01, '2/power': 268.5}
+    assert ac['name'] == 'emeter' and ac['_uk1'] == 7
+    assert ac['0/powerAC'] == pytest.approx(532.2)
+    assert state['ptotal1hb'] == 65536
+
+
+def test_high_word_carries_over_to_the_next_fragment():
+    state = {}
+    decode('HM-600', 0x01, fragment(0x01, '>HHHHHHHH', 0, 0, 0, 0, 0, 0, 0, 2), state)
+    ac, dc = decode('HM-600', 0x02, fragment(0x02, '>HLHHHHH', 100, 200, 3, 4, 2301, 5002, 5321), state)
+    assert dc['1/totalenergy'] == 100 + 2 * 65536
+    assert dc['2/totalenergy'] == 200
+    assert ac['0/voltageAC'] == 230.1 and ac['0/frequency'] == 50.02
+
+
+def test_hm1200_fourth_input_needs_two_fragments():
+    state = {}
+    words2 = (0, 0, 0, 300, 500, 70, 1500, 0)
+    words3 = (2100, 0, 0, 0, 0, 2300, 0)
+    dd, = decode('HM-1200', 0x02, fragment(0x02, '>LHHHHHHH', *words2), state)
+    assert '4/voltage' not in dd
+    dd, _ = decode('HM-1200', 0x03, fragment(0x03, '>HLLHHHH', *words3), state)
+    assert dd['4/voltage'] == pytest.approx(210.0 / 7.0)
+    assert '4/current' not in dd
+    dd, _ = decode('HM-1200', 0x03, fragment(0x03, '>HLLHHHH', 0, *words3[1:]), state)
+    assert dd['4/voltage'] == 0 and dd['4/current'] == 0
+
+
+def test_unknown_words_keep_their_published_names():
+    info, = decode('HM-600', 0x84, fragment(0x84, '>HHHHHHHH', *range(8)), {})
+    assert info['name'] == 'error132'
+    assert info['_uk9'] == 7 and '_uk8' not in info
+    info, = decode('HM-600', 0x03, fragment(0x03, '>HHHHHHHH', *range(8)), {})
+    assert info['_uk8'] == 7
+    info, = decode('HM-300', 0x02, fragment(0x02, '>HHHHHHHH', *range(8)), {})
+    assert 'name' not in info and info['_uk9'] == 7
+
+
+def test_unknown_model_or_cmd():
+    assert decode('HM-600', 0x42, bytes(27), {}) is None
+    assert decode('HM-9999', 0x01, bytes(27), {}) is None
+    assert decoders('HM-9999') == {}
+
+
+def test_decoders_by_cmd():
+    table = decoders('HM-300')
+    assert table[0x82] is REGISTRY[('HM-300', 0x82)].decode
+    assert set(table) == {cmd for model, cmd in REGISTRY if model == 'HM-300'}
+
+
+def test_measurement_keys():
+    keys = measurement_keys('HM-600')
+    assert '0/powerAC' in keys and '2/todaysenergy' in keys
+    assert not any(key.startswith('_') for key in keys)
+
+
+def test_layout_checks_the_format():
+    with pytest.raises(ValueError):
+        Layout('>HH', ('x',), (Field('x', 'a'),))
+
+
+def test_generated_code_shows_in_tracebacks():
+    def hook(infos, state):
+        raise KeyError('x')
+    layout = Layout('>H', ('x',), (Field('x', 'a'),), hook, name='test 0x01')
+    with pytest.raises(KeyError) as e:
+        layout.decode(fragment(0x01, '>H', 1), {})
+    assert e.traceback[1].path == '<decoder test 0x01>'
+    assert '_hook(infos, state)' in layout.source
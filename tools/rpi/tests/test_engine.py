@@ -0,0 +1,63 @@
+import asyncio
+
+from hoymiles.engine import RxEngine, PollingReady
+
+
+class FakeRadio:
+    """
+    An RX FIFO without IRQ line that counts how often it is asked.
+    """
+
+    def __init__(self):
+        self.fifo = []
+        self.checks = 0
+
+    def stopListening(self):
+        pass
+
+    def startListening(self):
+        pass
+
+    def setChannel(self, channel):
+        pass
+
+    def available(self):
+        self.checks += 1
+        return bool(self.fifo)
+
+    def available_pipe(self):
+        return bool(self.fifo), 1
+
+    def getDynamicPayloadSize(self):
+        return len(self.fifo[0])
+
+    def read(self, size):
+        return self.fifo.pop(0)
+
+
+def test_fifo_is_polled_only_while_waiting():
+    radio = FakeRadio()
+    engine = RxEngine(radio, PollingReady(radio, interval=0.001))
+
+    async def run():
+        engine.start()
+        engine.tune(40)
+        # between polling cycles
+        await asyncio.sleep(0.05)
+        idle = radio.checks
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.02, radio.fifo.append, b'\x95fragment')
+        received = await engine.receive(1.0)
+        waiting = radio.checks
+        nothing = await engine.receive(0.02)
+        await asyncio.sleep(0.05)
+        engine.stop()
+        return idle, received, waiting, nothing, radio.checks - waiting
+
+    idle, received, waiting, nothing, after = asyncio.run(run())
+    assert idle == 0
+    assert received == (b'\x95fragment', 40)
+    assert waiting >= 5
+    assert nothing is None
+    # the empty wait polled for 20 ms, nothing after it
+    assert after <= 30
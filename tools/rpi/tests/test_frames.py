@@ -0,0 +1,78 @@
+import struct
+
+import pytest
+
+from hoymiles.frames import FrameBuilder, hm_addr, esb_addr, crc8, crc16
+
+DTU = '99978563412'
+SERIALS = ['114174608145', '116111111111']
+
+
+def reference_crc16(data):
+    crc = 0xffff
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+    return crc
+
+
+def reference_crc8(data):
+    crc = 0
+    for b in data:
+        crc ^= b
+    return crc
+
+
+def reference_request(serial, ts, subtype=0x0b):
+    # the frame as ahoy.py has always put it together
+    payload = bytes((subtype, 0)) + struct.pack('>L', ts) + b'\x00\x00\x00\x05\x00\x00\x00\x00'
+    payload += struct.pack('>H', reference_crc16(payload))
+    packet = b'\x15' + hm_addr(serial) + hm_addr(DTU) + b'\x80' + payload
+    return packet + bytes((reference_crc8(packet),))
+
+
+def test_addresses():
+    assert hm_addr('114174608145') == b'\x74\x60\x81\x45'
+    assert esb_addr('114174608145') == b'\x01\x74\x60\x81\x45'
+
+
+def test_crcs():
+    data = bytes(range(40)) + b'ahoy'
+    assert crc16(data) == reference_crc16(data)
+    assert crc8(data) == reference_crc8(data)
+    assert crc16(data[20:], crc16(data[:20])) == crc16(data)
+    assert crc8(data[20:], crc8(data[:20])) == crc8(data)
+
+
+@pytest.mark.parametrize('ts', [0, 1, 1650000000, 0xffffffff])
+def test_request_matches_the_reference(ts):
+    builder = FrameBuilder(DTU)
+    for serial in SERIALS:
+        builder.add(serial)
+    for serial in SERIALS:
+        assert bytes(builder.request(serial, ts)) == reference_request(serial, ts)
+
+
+def test_request_buffer_is_updated_in_place():
+    builder = FrameBuilder(DTU)
+    builder.add(SERIALS[0])
+    first = builder.request(SERIALS[0], 1650000000)
+    assert builder.request(SERIALS[0], 1650000001) is first
+    assert bytes(first) == reference_request(SERIALS[0], 1650000001)
+    # the same time stamp again
+    assert bytes(builder.request(SERIALS[0], 1650000001)) == reference_request(SERIALS[0], 1650000001)
+
+
+def test_other_subtype():
+    builder = FrameBuilder(DTU, subtype=0x11)
+    builder.add(SERIALS[1])
+    assert bytes(builder.request(SERIALS[1], 1234)) == reference_request(SERIALS[1], 1234, 0x11)
+
+
+def test_refetch_frames():
+    builder = FrameBuilder(DTU)
+    builder.add(SERIALS[0])
+    for n in (1, 2, 16):
+        packet = b'\x15' + hm_addr(SERIALS[0]) + hm_addr(DTU) + bytes((0x80 + n,))
+        assert builder.refetch(SERIALS[0], n) == packet + bytes((reference_crc8(packet),))
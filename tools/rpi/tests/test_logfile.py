@@ -0,0 +1,132 @@
+import errno
+import gzip
+import logging
+import time
+from datetime import date
+
+import pytest
+
+from hoymiles import logfile
+from hoymiles.logfile import LogFile
+
+
+def wait_for(condition, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < t_end
+        time.sleep(0.01)
+
+
+def test_lines_are_committed_in_batches(tmp_path):
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=60, batch_lines=10)
+    for i in range(9):
+        out.write(f'line {i}')
+    time.sleep(0.1)
+    assert out.commits == 0 and path.read_text() == ''
+    out.write('line 9')
+    wait_for(lambda: out.commits == 1)
+    assert path.read_text().splitlines() == [f'line {i}' for i in range(10)]
+    out.write('line 10')
+    out.close()
+    assert out.commits == 2
+    assert len(path.read_text().splitlines()) == 11
+
+
+def test_commit_interval(tmp_path):
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=0.05, batch_lines=1000)
+    out.write('a')
+    out.write('b')
+    wait_for(lambda: out.commits == 1)
+    assert path.read_text() == 'a\nb\n'
+    out.close()
+
+
+def test_rotation_by_size_with_compression(tmp_path):
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=60, batch_lines=1, max_bytes=25, keep=2)
+    for i in range(4):
+        out.write(f'reading number {i}')     # 17 bytes
+        wait_for(lambda: out.commits == i + 1)
+    out.close()
+    today = date.today().isoformat()
+    assert path.read_text() == 'reading number 3\n'
+    rotated = sorted(p.name for p in tmp_path.iterdir() if p.name != 'ahoy.log')
+    # the oldest of the three rotated files is expired
+    assert rotated == [f'ahoy.log.{today}.1.gz', f'ahoy.log.{today}.2.gz']
+    with gzip.open(tmp_path / f'ahoy.log.{today}.2.gz', 'rt') as f:
+        assert f.read() == 'reading number 2\n'
+
+
+def test_daily_rotation(tmp_path, monkeypatch):
+    class Day(date):
+        current = date(2024, 6, 1)
+
+        @classmethod
+        def today(cls):
+            return cls.current
+
+    monkeypatch.setattr(logfile, 'date', Day)
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=60, batch_lines=1, daily=True, compress=False)
+    out.write('first day')
+    wait_for(lambda: out.commits == 1)
+    Day.current = date(2024, 6, 2)
+    out.write('second day')
+    out.close()
+    assert (tmp_path / 'ahoy.log.2024-06-01').read_text() == 'first day\n'
+    assert path.read_text() == 'second day\n'
+
+
+class FullDisk:
+    closed = False
+
+    def write(self, data):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    def close(self):
+        pass
+
+
+def test_failed_commit_is_reported_and_the_writer_goes_on(tmp_path, caplog):
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=60, batch_lines=2)
+    disk = out._file
+    out._file = FullDisk()
+    with caplog.at_level(logging.ERROR, logger='ahoy.logfile'):
+        out.write('lost 1')
+        out.write('lost 2')
+        wait_for(lambda: out.errors == 1)
+    assert out.dropped == 2
+    assert 'could not write 2 lines' in caplog.text
+    out._file = disk
+    out.write('kept 1')
+    out.write('kept 2')
+    wait_for(lambda: out.commits == 1)
+    out.close()
+    assert path.read_text() == 'kept 1\nkept 2\n'
+
+
+def test_failed_rotation_reopens_the_file(tmp_path, monkeypatch):
+    path = tmp_path / 'ahoy.log'
+    out = LogFile(str(path), commit_interval=60, batch_lines=1, max_bytes=10, compress=False)
+    out.write('0123456789')
+    wait_for(lambda: out.commits == 1)
+
+    def rename(src, dst):
+        raise PermissionError(errno.EACCES, 'Permission denied')
+
+    monkeypatch.setattr(logfile.os, 'rename', rename)
+    out.write('lost')
+    wait_for(lambda: out.errors == 1)
+    monkeypatch.undo()
+    out.write('rotated')
+    out.close()
+    assert path.read_text() == 'rotated\n'
+    assert out.dropped == 1
+
+
+def test_unknown_durability(tmp_path):
+    with pytest.raises(ValueError):
+        LogFile(str(tmp_path / 'ahoy.log'), durability='never')
@@ -0,0 +1,62 @@
+import io
+import json
+import logging
+import signal
+
+from hoymiles import logs
+from hoymiles.app import Ahoy, parse_args
+from hoymiles.capture import CaptureReader, KIND_TX, KIND_RX
+from hoymiles.logs import Hex
+
+
+def test_records_go_through_the_listener():
+    out = io.StringIO()
+    listener = logs.setup('info', stream=out, name='ahoy.test')
+    log = logging.getLogger('ahoy.test')
+    log.debug("not shown %s", Hex(b'\x00'))
+    log.info("frame %s", Hex(b'\x15\x74\xa8'))
+    listener.stop()
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(' frame 15 74 a8')
+
+
+def test_json_format():
+    out = io.StringIO()
+    listener = logs.setup('debug', 'json', stream=out, name='ahoy.test')
+    logging.getLogger('ahoy.test').debug("rx %s", Hex(b'\x95'), extra={'fields': {'ch_rx': 40, 'frame': Hex(b'\x95')}})
+    listener.stop()
+    record = json.loads(out.getvalue())
+    assert (record['level'], record['msg'], record['ch_rx'], record['frame']) == ('DEBUG', 'rx 95', 40, '95')
+
+
+def test_sigusr1_dumps_the_last_frames_in_order(tmp_path):
+    path = tmp_path / 'ahoy.conf'
+    path.write_text(f'[logging]\nring = 4\ndump_dir = {tmp_path}\n'
+                    '[inverter]\nserial = 114174608145\n[radio]\nbackend = simulator\n')
+    app = Ahoy(parse_args(['-c', str(path), '-m', '0']))
+    app.open_radios()
+    request = bytearray(b'req')
+    for i in range(5):
+        request[0] = i
+        app.ring.tx(i, 3, '114174608145', request)
+        app.ring.rx(i, 3, 40, '114174608145', b'ans%d' % i)
+    out = io.StringIO()
+    listener = logs.setup('info', stream=out)
+    try:
+        app.dump_frames(signal.SIGUSR1, None)
+    finally:
+        listener.stop()
+    dumps = list(tmp_path.glob('frames-*.cap'))
+    assert len(dumps) == 1
+    assert f'dumped 4 frames to {dumps[0]}' in out.getvalue()
+    frames = [(r.t_ns, r.kind, bytes(r.payload)) for r in CaptureReader(dumps[0])]
+    assert frames == [(3, KIND_TX, b'\x03eq'), (3, KIND_RX, b'ans3'), (4, KIND_TX, b'\x04eq'), (4, KIND_RX, b'ans4')]
+
+
+def test_sigusr1_without_a_ring(tmp_path):
+    path = tmp_path / 'ahoy.conf'
+    path.write_text(f'[logging]\nring = 0\ndump_dir = {tmp_path}\n[inverter]\nserial = 114174608145\n')
+    app = Ahoy(parse_args(['-c', str(path), '-m', '0']))
+    app.dump_frames(signal.SIGUSR1, None)
+    assert list(tmp_path.glob('frames-*.cap')) == []
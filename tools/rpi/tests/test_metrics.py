@@ -0,0 +1,67 @@
+import random
+from datetime import datetime
+
+from hoymiles.app import Ahoy, parse_args
+from hoymiles.frames import hm_addr
+from hoymiles.metrics import Registry
+from hoymiles.simulator import SimulatedInverter
+
+SERIAL = '116111111111'     # HM-1200, four fragments
+
+
+def test_exposition_format():
+    registry = Registry()
+    polls = registry.counter('ahoy_polls_total', 'Polling cycles started', ('inverter',))
+    polls.inc('114174608145')
+    polls.inc('114174608145', amount=2)
+    registry.gauge('ahoy_queue', 'Messages waiting', fn=lambda: 3)
+    registry.gauge('ahoy_label', 'Escaping', ('name',)).set(0.5, 'a"b\\c\nd')
+    latency = registry.histogram('ahoy_latency_seconds', 'Latency', buckets=(0.01, 0.1))
+    latency.observe(0.005)
+    latency.observe(0.05)
+    latency.observe(2.0)
+    assert registry.render() == '\n'.join([
+        '# HELP ahoy_polls_total Polling cycles started',
+        '# TYPE ahoy_polls_total counter',
+        'ahoy_polls_total{inverter="114174608145"} 3',
+        '# HELP ahoy_queue Messages waiting',
+        '# TYPE ahoy_queue gauge',
+        'ahoy_queue 3',
+        '# HELP ahoy_label Escaping',
+        '# TYPE ahoy_label gauge',
+        'ahoy_label{name="a\\"b\\\\c\\nd"} 0.5',
+        '# HELP ahoy_latency_seconds Latency',
+        '# TYPE ahoy_latency_seconds histogram',
+        'ahoy_latency_seconds_bucket{le="0.01"} 1',
+        'ahoy_latency_seconds_bucket{le="0.1"} 2',
+        'ahoy_latency_seconds_bucket{le="+Inf"} 3',
+        'ahoy_latency_seconds_sum 2.055',
+        'ahoy_latency_seconds_count 3',
+    ]) + '\n'
+
+
+def metric(text, name):
+    return {line.split(' ')[0]: float(line.split(' ')[1]) for line in text.splitlines()
+            if line.startswith(name + '{') or line.startswith(name + ' ')}
+
+
+def test_loss_ratio_counts_every_fragment_once(tmp_path, capsys):
+    path = tmp_path / 'ahoy.conf'
+    path.write_text(f'[inverter]\nserial = {SERIAL}\n')
+    app = Ahoy(parse_args(['-c', str(path), '-m', '0']))
+    app.open_metrics()
+    app.register_inverter(SERIAL)
+    fragments = SimulatedInverter(SERIAL, random.Random(1)).respond(0.0, hm_addr('99978563412'))
+    details = [{'p': p, 'ch_rx': 40, 'ch_tx': 3, 'time_rx': datetime.now(), 'latency': 5000000}
+               for p in fragments]
+    # the request went out twice, then fragment 3 was refetched and is still missing
+    stats = {'lag_ns': None, 'requested': 4 + 4 + 1, 'refetches': 1, 'receptions': [(40, 5000000)] * 3}
+    app.output_cycle('radio', SERIAL, details[:2] + details[3:], '', 3, [], [], stats)
+    # a complete cycle without repeats
+    stats = {'lag_ns': None, 'requested': 4, 'refetches': 0, 'receptions': [(40, 5000000)] * 4}
+    app.output_cycle('radio', SERIAL, details, '', 3, [], [], stats)
+    text = app.metrics.render()
+    label = f'{{inverter="{SERIAL}"}}'
+    assert metric(text, 'ahoy_fragments_requested_total') == {'ahoy_fragments_requested_total' + label: 13}
+    assert metric(text, 'ahoy_fragments_expected_total') == {'ahoy_fragments_expected_total' + label: 8}
+    assert metric(text, 'ahoy_fragment_loss_ratio') == {'ahoy_fragment_loss_ratio' + label: 1 / 8}
@@ -0,0 +1,178 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from hoymiles.mqtt import MqttOutput, Spool
+
+
+class FakeClient:
+    """
+    The part of a paho client MqttOutput uses; `up` says whether the broker
+    takes messages.
+    """
+
+    def __init__(self):
+        self.up = True
+        self.published = []
+
+    def max_queued_messages_set(self, n):
+        pass
+
+    def reconnect_delay_set(self, low, high):
+        pass
+
+    def connect_async(self, host, port, keepalive):
+        pass
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, 0 if self.up else 1)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos, retain):
+        if not self.up:
+            return SimpleNamespace(rc=4)
+        self.published.append((topic, payload, qos, retain))
+        return SimpleNamespace(rc=0)
+
+
+def wait_for(condition, timeout=5.0):
+    t_end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < t_end
+        time.sleep(0.01)
+
+
+def test_spool_keeps_its_position_over_a_restart(tmp_path):
+    path = str(tmp_path / 'spool')
+    spool = Spool(path)
+    for i in range(3):
+        spool.append(['t', i, 0, False])
+    msgs = spool.read(2)
+    assert [m for m, pos in msgs] == [['t', 0, 0, False], ['t', 1, 0, False]]
+    spool.commit(msgs[-1][1])
+    spool.close()
+    spool = Spool(path)
+    assert spool.earlier > 0
+    (msg, pos), = spool.read(10)
+    assert msg == ['t', 2, 0, False]
+    spool.commit(pos)
+    assert not spool.pending()
+    assert (tmp_path / 'spool').stat().st_size == 0
+    assert (tmp_path / 'spool.pos').read_text() == '0'
+
+
+def test_spool_position_past_the_end_is_taken_as_zero(tmp_path):
+    path = str(tmp_path / 'spool')
+    spool = Spool(path)
+    spool.append(['t', 1, 0, False])
+    spool.close()
+    # crashed after writing the position, before truncating
+    (tmp_path / 'spool.pos').write_text('1000')
+    assert Spool(path).read(10)[0][0] == ['t', 1, 0, False]
+    (tmp_path / 'spool.pos').write_text('garbage')
+    assert Spool(path).pending()
+
+
+def test_messages_go_to_the_spool_while_the_broker_is_away(tmp_path):
+    client = FakeClient()
+    client.up = False
+    spool = Spool(str(tmp_path / 'spool'))
+    output = MqttOutput(client, 'localhost', spool=spool, drain_rate=1000)
+    output.start()
+    for i in range(5):
+        output.publish('ahoy/1/power', i)
+    assert spool.count == 5 and output.dropped == 0
+    client.up = True
+    output._on_connect(client, None, {}, 0)
+    wait_for(lambda: len(client.published) == 5)
+    output.stop()
+    assert [m[1] for m in client.published] == [0, 1, 2, 3, 4]
+    assert not spool.pending()
+
+
+def test_without_spool_overflow_is_dropped():
+    client = FakeClient()
+    client.up = False
+    output = MqttOutput(client, 'localhost')
+    output.start()
+    output.publish('ahoy/1/power', 1)
+    output.stop()
+    assert output.dropped == 1 and client.published == []
+
+
+def test_stale_retained_messages_are_not_sent(tmp_path):
+    path = str(tmp_path / 'spool')
+    # left over from an earlier run
+    spool = Spool(path)
+    spool.append(['ahoy/1', 'old', 0, True, 7])
+    spool.append(['ahoy/2', 'only', 0, True, 8])
+    spool.close()
+    client = FakeClient()
+    client.up = False
+    spool = Spool(path)
+    output = MqttOutput(client, 'localhost', spool=spool, drain_rate=1000)
+    output.start()
+    output.publish('ahoy/1', 'spooled', retain=True)
+    output.publish('ahoy/1', 'newest', retain=True)
+    output.publish('ahoy/1/power', 'not retained')
+    output.publish('ahoy/1/power', 'not retained either')
+    client.up = True
+    output._on_connect(client, None, {}, 0)
+    wait_for(lambda: not spool.pending())
+    output.stop()
+    assert [m[1] for m in client.published] == ['only', 'newest', 'not retained', 'not retained either']
+    assert all(len(m) == 4 for m in client.published)
+    assert output.superseded == 2
+
+
+def test_queued_messages_are_spooled_on_stop(tmp_path):
+    client = FakeClient()
+    spool = Spool(str(tmp_path / 'spool'))
+    output = MqttOutput(client, 'localhost', spool=spool)
+    output._on_connect(client, None, {}, 0)
+    # not started: nothing drains the queue
+    output.publish('ahoy/1/power', 1)
+    assert output.queue_depth() == 1
+    output.stop()
+    assert [m for m, pos in Spool(str(tmp_path / 'spool')).read(10)] == [['ahoy/1/power', 1, 0, False]]
+
+
+class FullClient(FakeClient):
+    """
+    Connected, but paho's own queue is full.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    def publish(self, topic, payload, qos, retain):
+        self.attempts += 1
+        return SimpleNamespace(rc=15)
+
+
+@pytest.mark.parametrize('spooled', [False, True])
+def test_refused_messages_are_retried_after_a_pause(tmp_path, spooled):
+    client = FullClient()
+    spool = Spool(str(tmp_path / 'spool'))
+    output = MqttOutput(client, 'localhost', spool=spool, drain_rate=1000)
+    output.start()
+    for i in range(20):
+        output.publish('ahoy/1/power', i)
+    if spooled:
+        output.stop()
+        client = FullClient()
+        spool = Spool(str(tmp_path / 'spool'))
+        output = MqttOutput(client, 'localhost', spool=spool, drain_rate=1000)
+        output.start()
+    time.sleep(1.5)
+    output.stop()
+    assert 1 <= client.attempts <= 3
+    assert output.sent == 0
+    assert Spool(str(tmp_path / 'spool')).read(100)[-1][0][1] == 19
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from hoymiles.mqtt import Publisher, emeter_groups
+
+SERIAL = '114174608145'
+INFOS = [
+    {'name': 'emeter-dc', '1/voltage': 31.2, '1/power': 263.7, '2/voltage': 29.8, '2/power': 268.5},
+    {'name': 'emeter', '0/powerAC': 532.2, '_uk1': 7},
+    {'name': 'emeter', '0/voltageAC': 230.1, '0/frequency': 50.02},
+    {'name': 'error132', '_uk9': 1},
+]
+
+
+class Client:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos, retain):
+        self.published.append((topic, payload, qos, retain))
+
+
+def test_groups_of_a_cycle():
+    assert emeter_groups(INFOS) == {
+        'emeter-dc': {'1/voltage': 31.2, '1/power': 263.7, '2/voltage': 29.8, '2/power': 268.5},
+        'emeter': {'0/powerAC': 532.2, '0/voltageAC': 230.1, '0/frequency': 50.02},
+    }
+
+
+def test_one_document_per_inverter():
+    client = Client()
+    Publisher(client, ('json',), qos=1, retain=True).publish_cycle(SERIAL, INFOS, ts=1650000000.0)
+    (topic, payload, qos, retain), = client.published
+    assert (topic, qos, retain) == ('ahoy/' + SERIAL, 1, True)
+    assert json.loads(payload) == dict(emeter_groups(INFOS), ts=1650000000.0)
+
+
+def test_one_document_per_group():
+    client = Client()
+    Publisher(client, ('group',), prefix='pv').publish_cycle(SERIAL, INFOS, ts=5.0)
+    docs = {topic: json.loads(payload) for topic, payload, qos, retain in client.published}
+    assert docs == {
+        'pv/114174608145/emeter-dc': {'1/voltage': 31.2, '1/power': 263.7, '2/voltage': 29.8, '2/power': 268.5, 'ts': 5.0},
+        'pv/114174608145/emeter': {'0/powerAC': 532.2, '0/voltageAC': 230.1, '0/frequency': 50.02, 'ts': 5.0},
+    }
+
+
+def test_one_message_per_key():
+    client = Client()
+    Publisher(client, ('keys',)).publish_cycle(SERIAL, INFOS)
+    assert [(topic, payload) for topic, payload, qos, retain in client.published] == [
+        ('ahoy/114174608145/emeter-dc/1/power', 263.7),
+        ('ahoy/114174608145/emeter-dc/1/voltage', 31.2),
+        ('ahoy/114174608145/emeter-dc/2/power', 268.5),
+        ('ahoy/114174608145/emeter-dc/2/voltage', 29.8),
+        ('ahoy/114174608145/emeter/0/frequency', 50.02),
+        ('ahoy/114174608145/emeter/0/powerAC', 532.2),
+        ('ahoy/114174608145/emeter/0/voltageAC', 230.1),
+    ]
+
+
+def test_incomplete_cycle_only_goes_to_the_key_topics():
+    client = Client()
+    Publisher(client, ('json', 'group', 'keys')).publish_cycle(SERIAL, INFOS[:1], complete=False)
+    assert len(client.published) == 4
+    assert all(topic.count('/') == 4 for topic, payload, qos, retain in client.published)
+
+
+def test_nothing_to_publish():
+    client = Client()
+    Publisher(client, ('json',)).publish_cycle(SERIAL, INFOS[3:])
+    assert client.published == []
+
+
+def test_topics_are_built_once():
+    publisher = Publisher(Client(), ('keys',))
+    publisher.publish_cycle(SERIAL, INFOS)
+    topics = dict(publisher._topics)
+    publisher.publish_cycle(SERIAL, INFOS)
+    assert publisher._topics == topics
+    assert all(publisher.topic(*key) is topic for key, topic in topics.items())
+    assert publisher.topic('116111111111') == 'ahoy/116111111111'
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Publisher(Client(), ('xml',))
@@ -0,0 +1,85 @@
+import random
+
+from hoymiles.frames import crc8, hm_addr
+from hoymiles.reassembly import Response
+from hoymiles.simulator import SimulatedInverter
+
+SERIAL = '116111111111'     # HM-1200, four fragments
+DTU = '99978563412'
+
+
+def answers(serial=SERIAL):
+    return SimulatedInverter(serial, random.Random(3)).respond(0.0, hm_addr(DTU))
+
+
+def test_fragments_in_any_order():
+    response = Response(SERIAL, 'HM-1200', 4)
+    fragments = answers()
+    assert len(fragments) == 4
+    for p in reversed(fragments):
+        assert not response.complete()
+        assert response.add(p, channel=40)
+    assert response.complete() and response.crc_ok()
+    assert response.missing() == 0
+    assert response.fragments[2]['channel'] == 40
+
+
+def test_missing_bitmap():
+    response = Response(SERIAL, 'HM-1200', 4)
+    fragments = answers()
+    response.add(fragments[1])
+    assert response.missing() == 0b1101
+    # nothing says yet that fragment 5 isn't coming
+    response.add(fragments[3])
+    assert response.missing() == 0b0101
+    response.reset()
+    assert response.missing() == 0b1111
+
+
+def test_last_fragment_tells_the_total():
+    response = Response(SERIAL, 'HM-1200', 2)
+    fragments = answers()
+    response.add(fragments[2])
+    assert response.total() == 4
+    response.add(fragments[3])
+    assert response.total() == 4 and response.missing() == 0b0011
+
+
+def test_duplicates_and_corrupted_fragments_are_not_taken():
+    response = Response(SERIAL, 'HM-1200', 4)
+    p = answers()[0]
+    assert response.add(p)
+    assert not response.add(bytes(p))
+    bad = bytearray(p)
+    bad[12] ^= 0x10
+    assert not response.add(bytes(bad))
+    assert response.duplicates == 1 and response.corrupted == 1
+
+
+def test_frames_of_other_senders_are_ignored():
+    response = Response(SERIAL, 'HM-1200', 4)
+    assert not response.add(answers('114174608145')[0])
+    assert not response.add(b'\x95')
+    assert response.fragments == {}
+
+
+def test_payload_crc_is_checked():
+    response = Response(SERIAL, 'HM-1200', 4)
+    fragments = answers()
+    # a corrupted data byte with a matching CRC-8
+    bad = bytearray(fragments[1])
+    bad[12] ^= 0x10
+    bad[-1] = crc8(bad[:-1])
+    for p in fragments[:1] + [bytes(bad)] + fragments[2:]:
+        assert response.add(p)
+    assert response.complete() and not response.crc_ok()
+
+
+def test_decode_in_fragment_order():
+    response = Response(SERIAL, 'HM-1200', 4)
+    for p in reversed(answers()):
+        response.add(p)
+    infos = response.decode({})
+    assert list(infos) == [1, 2, 3, 4]
+    assert infos[4][0]['name'] == 'emeter' and '0/powerAC' in infos[4][0]
+    assert '4/voltage' in infos[3][0]
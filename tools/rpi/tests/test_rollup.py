@@ -0,0 +1,103 @@
+import threading
+
+from hoymiles.rollup import Rollups, _Ring
+
+SERIAL = '114174608145'
+
+
+def test_buckets_hold_min_max_mean_last_count():
+    rollups = Rollups(((60, 10),))
+    for t, power in ((0, 10.0), (20, 30.0), (40, 20.0), (60, 5.0)):
+        rollups.add(SERIAL, 1000 * 60 + t, {'0/powerAC': power})
+    assert rollups.query(SERIAL, '0/powerAC', 60) == [
+        (60000, 10.0, 30.0, 20.0, 20.0, 3),
+        (60060, 5.0, 5.0, 5.0, 5.0, 1),
+    ]
+
+
+def test_every_resolution_gets_the_reading():
+    rollups = Rollups(((60, 10), (900, 4)))
+    for i in range(30):
+        rollups.add(SERIAL, 60 * i, {'0/powerAC': float(i)})
+    assert len(rollups.query(SERIAL, '0/powerAC', 60)) == 10
+    assert rollups.query(SERIAL, '0/powerAC', 900) == [
+        (0, 0.0, 14.0, 7.0, 14.0, 15),
+        (900, 15.0, 29.0, 22.0, 29.0, 15),
+    ]
+
+
+def test_old_buckets_are_overwritten():
+    rollups = Rollups(((60, 3),))
+    for i in range(5):
+        rollups.add(SERIAL, 60 * i, {'0/powerAC': float(i)})
+    assert [b[0] for b in rollups.query(SERIAL, '0/powerAC', 60)] == [120, 180, 240]
+    # a reading older than the ring is dropped
+    rollups.add(SERIAL, 0, {'0/powerAC': 100.0})
+    assert [b[1] for b in rollups.query(SERIAL, '0/powerAC', 60)] == [2.0, 3.0, 4.0]
+
+
+def test_since_and_until():
+    rollups = Rollups(((60, 10),))
+    for i in range(10):
+        rollups.add(SERIAL, 60 * i, {'0/powerAC': float(i)})
+    assert [b[0] for b in rollups.query(SERIAL, '0/powerAC', 60, since=300, until=420)] == [300, 360, 420]
+
+
+def test_new_keys_keep_what_the_others_hold():
+    rollups = Rollups(((60, 4),))
+    rollups.add(SERIAL, 0, {'0/powerAC': 1.0})
+    rollups.add(SERIAL, 60, {'0/powerAC': 2.0, '1/power': 7.0})
+    assert [b[1] for b in rollups.query(SERIAL, '0/powerAC', 60)] == [1.0, 2.0]
+    assert rollups.query(SERIAL, '1/power', 60) == [(60, 7.0, 7.0, 7.0, 7.0, 1)]
+    assert rollups.keys(SERIAL) == ['0/powerAC', '1/power']
+
+
+def test_fields_and_unknown_names():
+    rollups = Rollups(((60, 4),), fields=['0/powerAC'])
+    rollups.add(SERIAL, 0, {'0/powerAC': 1.0, '1/power': 7.0})
+    assert rollups.keys(SERIAL) == ['0/powerAC']
+    assert rollups.query(SERIAL, '1/power', 60) == []
+    assert rollups.query('116111111111', '0/powerAC', 60) == []
+    assert rollups.serials() == [SERIAL]
+
+
+def test_queries_while_keys_are_added():
+    rollups = Rollups(((60, 50), (900, 10)))
+    errors = []
+    done = threading.Event()
+
+    def query():
+        try:
+            while not done.is_set():
+                for key in rollups.keys(SERIAL):
+                    for start, lo, hi, mean, last, count in rollups.query(SERIAL, key, 60):
+                        assert lo <= mean <= hi and count > 0
+        except Exception as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=query)
+    reader.start()
+    for i in range(3000):
+        rollups.add(SERIAL, 10 * i, {f'{i // 30}/power': float(i % 7), '0/powerAC': 1.0})
+    done.set()
+    reader.join()
+    assert not errors
+    assert len(rollups.keys(SERIAL)) == 101
+
+
+def test_new_keys_grow_each_ring_once_per_reading(monkeypatch):
+    grown = []
+    resize = _Ring.resize
+
+    def counting_resize(ring, cols):
+        if cols > ring.cols:
+            grown.append((ring.width, cols))
+        resize(ring, cols)
+
+    monkeypatch.setattr(_Ring, 'resize', counting_resize)
+    rollups = Rollups(((60, 10), (900, 4)))
+    rollups.add(SERIAL, 0, {f'{i}/power': float(i) for i in range(30)})
+    rollups.add(SERIAL, 60, {'0/power': 1.0, '7/voltage': 2.0, '8/voltage': 3.0})
+    assert grown == [(60, 30), (900, 30), (60, 32), (900, 32)]
+    assert rollups.query(SERIAL, '29/power', 900) == [(0, 29.0, 29.0, 29.0, 29.0, 1)]
+    assert rollups.query(SERIAL, '8/voltage', 60) == [(60, 3.0, 3.0, 3.0, 3.0, 1)]
@@ -0,0 +1,109 @@
+from hoymiles.scheduler import Scheduler
+
+S = 1000000000
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(**kwargs):
+    clock = Clock()
+    return Scheduler(clock=clock, **kwargs), clock
+
+
+def test_earliest_deadline_first():
+    sched, clock = make_scheduler()
+    sched.add('a', 10, due_ns=3 * S)
+    sched.add('b', 10, due_ns=1 * S)
+    sched.add('c', 10, due_ns=2 * S)
+    assert [sched.next()[0] for _ in range(3)] == ['b', 'c', 'a']
+    assert sched.next() is None
+
+
+def test_equal_deadlines_keep_the_order_of_adding():
+    sched, clock = make_scheduler()
+    for serial in 'xyz':
+        sched.add(serial, 10)
+    assert [sched.next()[0] for _ in range(3)] == ['x', 'y', 'z']
+
+
+def test_answering_inverter_stays_on_its_grid():
+    sched, clock = make_scheduler()
+    sched.add('a', 10)
+    sched.next()
+    clock.now = 2 * S
+    sched.done('a', True)
+    assert sched.peek() == ('a', 10 * S)
+    # after a long pause it is due right away, once
+    sched.next()
+    clock.now = 95 * S
+    sched.done('a', True)
+    assert sched.peek() == ('a', 95 * S)
+
+
+def test_lag():
+    sched, clock = make_scheduler()
+    sched.add('a', 10, due_ns=S)
+    clock.now = 3 * S
+    sched.next()
+    assert sched.lag_ns == 2 * S
+
+
+def test_silent_inverter_is_backed_off():
+    sched, clock = make_scheduler(max_backoff=4)
+    sched.add('a', 10)
+    delays = []
+    for _ in range(6):
+        serial, due_ns = sched.next()
+        clock.now = due_ns
+        sched.done('a', False)
+        delays.append((sched.peek()[1] - clock.now) // S)
+    assert delays == [5, 10, 20, 40, 40, 40]
+    sched.next()
+    sched.done('a', True)
+    assert sched.inverters['a'].failures == 0
+
+
+def test_scale_stretches_the_delays():
+    sched, clock = make_scheduler()
+    sched.add('a', 10)
+    sched.add('b', 10)
+    sched.scale = 3
+    sched.next()
+    sched.done('a', True)
+    sched.next()
+    sched.done('b', False)
+    assert sched.inverters['a'].due_ns == 30 * S
+    assert sched.inverters['b'].due_ns == 15 * S
+
+
+def test_wake_makes_everyone_due():
+    sched, clock = make_scheduler()
+    sched.add('a', 10)
+    sched.add('b', 10)
+    for _ in range(3):
+        for serial in 'ab':
+            sched.next()
+            sched.done(serial, False)
+    clock.now = 7 * S
+    sched.wake()
+    assert sched.peek() == ('a', 7 * S)
+    assert all(inv.failures == 0 for inv in sched.inverters.values())
+    assert [sched.next()[0] for _ in range(2)] == ['a', 'b']
+    assert sched.next() is None
+
+
+def test_removed_inverter_is_not_handed_out():
+    sched, clock = make_scheduler()
+    sched.add('a', 10)
+    sched.add('b', 10, due_ns=S)
+    sched.remove('a')
+    assert len(sched) == 1
+    assert sched.next() == ('b', S)
+    sched.done('a', True)
+    assert sched.next() is None
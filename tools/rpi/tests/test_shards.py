@@ -0,0 +1,66 @@
+import time
+
+from hoymiles.app import Ahoy, parse_args
+from hoymiles.frames import hm_addr
+from hoymiles.shards import Shards
+
+SERIALS = ['114174608145', '116111111111', '112122222222', '114100000001']
+
+
+def test_inverters_are_spread_over_the_radios():
+    shards = Shards(['radio', 'radio.2'], SERIALS)
+    assert shards.owned('radio') == ['114174608145', '112122222222']
+    assert shards.owned('radio.2') == ['116111111111', '114100000001']
+    assert shards.probe('radio') is None
+
+
+def test_listed_inverters_stay_with_their_radio():
+    shards = Shards(['radio', 'radio.2'], SERIALS, {'114174608145': 'radio.2', '116111111111': 'radio.2'}, quality=True)
+    assert shards.owned('radio.2') == ['114174608145', '116111111111']
+    assert shards.owned('radio') == ['112122222222', '114100000001']
+    for _ in range(10):
+        shards.report('radio.2', '114174608145', 0.0)
+        shards.report('radio', '114174608145', 1.0)
+    assert shards.owner['114174608145'] == 'radio.2'
+
+
+def test_probes_and_moves_to_the_better_radio():
+    shards = Shards(['radio', 'radio.2'], SERIALS, quality=True, probe_every=2, alpha=0.5)
+    probes = [shards.probe('radio.2') for _ in range(4)]
+    assert probes == [None, '114174608145', None, '112122222222']
+    shards.report('radio', '114174608145', 0.5)
+    assert shards.report('radio.2', '114174608145', 0.55) is None   # within the margin
+    assert shards.report('radio.2', '114174608145', 1.0) == 'radio.2'
+    assert shards.owner['114174608145'] == 'radio.2'
+    assert shards.version == 1
+    # no radio gets more than its share plus one
+    shards.report('radio', '112122222222', 0.0)
+    assert shards.report('radio.2', '112122222222', 1.0) is None
+    assert shards.owner['112122222222'] == 'radio'
+    assert len(shards.owned('radio.2')) == shards.cap == 3
+
+
+def test_two_simulated_radios_poll_their_own_inverters(tmp_path, capsys):
+    path = tmp_path / 'ahoy.conf'
+    path.write_text(f'[dtu]\nserial = 99978563412\n[inverter]\nserial = {",".join(SERIALS[:3])}\n'
+                    '[radio]\nbackend = simulator\nhopping = fixed\n'
+                    '[radio.2]\nserial = 116111111111\n')
+    app = Ahoy(parse_args(['-c', str(path), '-m', '0', '-i', '1']))
+    for serial in SERIALS[:3]:
+        app.register_inverter(serial)
+    app.open_radios()
+    assert app.shards.owned('radio.2') == ['116111111111']
+    app.start_radios()
+    cycles = []
+    t_end = time.monotonic() + 2.5
+    while time.monotonic() < t_end:
+        cycles.append(app.cycles.get(timeout=2))
+    app.stopping.set()
+    app.stop_radios()
+    owners = {}
+    for name, serial, fragments, *rest in cycles:
+        owners.setdefault(serial, set()).add(name)
+        # the fragments went to the response of the inverter polled
+        assert all(d['p'][1:5] == hm_addr(serial) for d in fragments)
+    assert owners == {'114174608145': {'radio'}, '112122222222': {'radio'}, '116111111111': {'radio.2'}}
+    assert sum(len(fragments) for name, serial, fragments, *rest in cycles) > len(cycles)
@@ -0,0 +1,78 @@
+from hoymiles.frames import FrameBuilder, hm_addr, esb_addr
+from hoymiles.reassembly import Response
+from hoymiles.simulator import SimulatedRadio
+
+DTU = '99978563412'
+SERIAL = '114174608145'     # HM-600, three fragments
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def poll(radio, clock, frame):
+    radio.openWritingPipe(esb_addr(SERIAL))
+    radio.stopListening()
+    radio.write(frame)
+    radio.startListening()
+    clock.now += 1.0
+    received = []
+    while radio.available():
+        received.append(radio.read(radio.getDynamicPayloadSize()))
+    return received
+
+
+def make_radio(**kwargs):
+    clock = Clock()
+    radio = SimulatedRadio([SERIAL], channel_weights={40: 1}, clock=clock, **kwargs)
+    radio.setChannel(40)
+    return radio, clock
+
+
+def test_replies_are_addressed_to_the_requester():
+    radio, clock = make_radio()
+    builder = FrameBuilder(DTU)
+    builder.add(SERIAL)
+    fragments = poll(radio, clock, builder.request(SERIAL, 1650000000))
+    assert len(fragments) == 3
+    for p in fragments:
+        assert p[0] == 0x95
+        assert p[1:5] == hm_addr(SERIAL)
+        assert p[5:9] == hm_addr(DTU)
+    response = Response(SERIAL, 'HM-600', 3)
+    for p in fragments:
+        response.add(p)
+    assert response.crc_ok()
+    # a refetch gets the same fragment again
+    assert poll(radio, clock, builder.refetch(SERIAL, 2)) == [fragments[1]]
+    # so does another DTU
+    other = FrameBuilder('99912345678')
+    other.add(SERIAL)
+    assert {bytes(p[5:9]) for p in poll(radio, clock, other.request(SERIAL, 1650000005))} == {hm_addr('99912345678')}
+
+
+def test_other_addresses_and_bad_frames_get_no_answer():
+    radio, clock = make_radio()
+    builder = FrameBuilder(DTU)
+    builder.add('116111111111')
+    builder.add(SERIAL)
+    assert poll(radio, clock, builder.request('116111111111', 1)) == []
+    frame = bytearray(builder.request(SERIAL, 1))
+    frame[-1] ^= 1
+    assert poll(radio, clock, frame) == []
+    assert radio.stats['answered'] == 0
+
+
+def test_loss_is_deterministic_for_a_seed():
+    counts = []
+    for _ in range(2):
+        radio, clock = make_radio(loss=0.5, seed=4)
+        builder = FrameBuilder(DTU)
+        builder.add(SERIAL)
+        counts.append([len(poll(radio, clock, builder.request(SERIAL, ts))) for ts in range(20)])
+    assert counts[0] == counts[1]
+    assert 0 < sum(counts[0]) < 60
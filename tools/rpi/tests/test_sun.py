@@ -0,0 +1,50 @@
+from datetime import date, datetime, timezone
+
+from hoymiles.sun import Daylight, sun_times
+
+BERLIN = 52.52, 13.405
+TROMSO = 69.65, 18.96
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_berlin_at_midsummer():
+    # 04:43 and 21:33 local (CEST) time
+    sunrise, sunset = sun_times(date(2024, 6, 21), *BERLIN)
+    assert abs(sunrise - utc(2024, 6, 21, 2, 43)) < 180
+    assert abs(sunset - utc(2024, 6, 21, 19, 33)) < 180
+
+
+def test_polar_night_and_midnight_sun():
+    assert sun_times(date(2024, 12, 21), *TROMSO) == (None, None)
+    assert sun_times(date(2024, 6, 21), *TROMSO) == (utc(2024, 6, 21), utc(2024, 6, 22))
+
+
+def test_phases_of_a_day():
+    daylight = Daylight(*BERLIN, dawn=1800, dusk=3600, slowdown=1200)
+    sunrise, sunset = daylight.times(date(2024, 6, 21))
+    assert daylight.phase(sunrise - 1801) == ('night', sunrise - 1800)
+    assert daylight.phase(sunrise - 1800) == ('day', 1)
+    assert daylight.phase(sunset - 1) == ('day', 1)
+    assert daylight.phase(sunset) == ('dusk', 1)
+    assert daylight.phase(sunset + 2400) == ('dusk', 4)
+    phase, wake = daylight.phase(sunset + 3600)
+    next_sunrise, _ = daylight.times(date(2024, 6, 22))
+    assert phase == 'night' and wake == next_sunrise - 1800
+
+
+def test_night_after_midnight_utc():
+    # 23:30 UTC is past midnight in Berlin; sunrise is the same UTC day
+    daylight = Daylight(*BERLIN)
+    sunrise, sunset = daylight.times(date(2024, 6, 22))
+    phase, wake = daylight.phase(utc(2024, 6, 21, 23, 30))
+    assert phase == 'night' and wake == sunrise - daylight.dawn
+
+
+def test_polar_night_looks_again_later():
+    daylight = Daylight(*TROMSO)
+    t = utc(2024, 12, 21, 12)
+    assert daylight.phase(t) == ('night', t + 86400)
+    assert Daylight(*TROMSO).phase(utc(2024, 6, 21, 0, 30)) == ('day', 1)
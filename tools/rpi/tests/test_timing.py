@@ -0,0 +1,49 @@
+import json
+import logging
+import threading
+
+from hoymiles.timing import Profiler, NULL
+
+
+def test_spans_from_several_threads_are_all_counted():
+    profiler = Profiler(interval=0)
+
+    def work():
+        for i in range(20000):
+            profiler.span(('decode', 'HM-600', 1), i, i + 10)
+            profiler.span('tx', i, i + 1)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler._totals[('decode', 'HM-600', 1)] == [80000, 800000, 10]
+    assert profiler._totals['tx'][0] == 80000
+
+
+def test_summary_goes_to_the_log(caplog):
+    profiler = Profiler(interval=0)
+    profiler.span(('decode', 'HM-600', 1), 0, 2000)
+    with caplog.at_level(logging.INFO, logger='ahoy.profile'):
+        profiler.close()
+    assert len(caplog.records) == 1
+    assert 'decode HM-600 1' in caplog.records[0].getMessage()
+    assert profiler._totals == {}
+
+
+def test_trace_holds_one_event_per_span(tmp_path):
+    path = tmp_path / 'trace.json'
+    profiler = Profiler(interval=0, trace=str(path))
+    profiler.span(('decode', 'HM-600', 1), 1000, 3000)
+    profiler.span('tx', 4000, 5000)
+    profiler.close()
+    events = [e for e in json.loads(path.read_text()) if e['ph'] == 'X']
+    assert [(e['name'], e['cat'], e['dur']) for e in events] == [('decode HM-600 1', 'decode', 2.0), ('tx', 'tx', 1.0)]
+
+
+def test_null_profiler_does_nothing():
+    assert NULL.start() == 0
+    NULL.stop('x', 0)
+    NULL.report()
+    assert not NULL.enabled